@@ -1,11 +1,12 @@
-from app.cores.database import books_collection, transactions_collection, members_collection
+from app.cores.database import books_collection, transactions_collection, members_collection, daily_stats_collection
+from app.cores.rollup import circulation_rollup
+from app.cores.analytics import analytics_engine
+from app.cores.kv_store import kv_store
+from app.cores.config import settings
 from app.schemas.ai_schema import ChatRequest, QueryRequest
 from datetime import datetime
 import uuid
 
-# Simple in-memory conversation storage (use Redis in production)
-conversations = {}
-
 async def chat_assistant(chat_data: ChatRequest):
     """Simple rule-based chat assistant for library queries"""
     message = chat_data.message.lower()
@@ -27,14 +28,12 @@ async def chat_assistant(chat_data: ChatRequest):
     else:
         response = "I'm here to help! You can ask me about library hours, borrowing policies, fines, renewals, or how to search for books."
     
-    # Store conversation
-    if conversation_id not in conversations:
-        conversations[conversation_id] = []
-    conversations[conversation_id].append({
+    # Store conversation; idle ones expire
+    await kv_store.append("conversation", conversation_id, {
         "user": chat_data.message,
         "assistant": response,
         "timestamp": datetime.utcnow()
-    })
+    }, settings.CONVERSATION_TTL_SECONDS, settings.CONVERSATION_MAX_TURNS)
     
     return {
         "response": response,
@@ -90,26 +89,43 @@ async def query_data(query_data: QueryRequest):
 
 async def get_analytics():
     """Get AI-powered analytics insights"""
+    if analytics_engine.ready:
+        # Precomputed by the analytics engine; refreshed in the background
+        return analytics_engine.payload
+    
     # Gather statistics
     total_books = await books_collection.count_documents({})
     available_books = await books_collection.count_documents({"available_copies": {"$gt": 0}})
-    total_transactions = await transactions_collection.count_documents({})
     active_borrows = await transactions_collection.count_documents({"status": "borrowed"})
     total_members = await members_collection.count_documents({})
     
     # Calculate utilization rate
     utilization_rate = (active_borrows / total_books * 100) if total_books > 0 else 0
     
-    # Get most popular category
-    pipeline = [
-        {"$group": {"_id": "$category", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}},
-        {"$limit": 1}
-    ]
-    
     most_popular_category = "N/A"
-    async for result in books_collection.aggregate(pipeline):
-        most_popular_category = result["_id"]
+    if circulation_rollup.ready:
+        # Totals and the most borrowed category from the daily rollup
+        total_transactions = 0
+        borrows_by_category = {}
+        async for row in daily_stats_collection.aggregate([
+            {"$group": {"_id": "$category", "borrows": {"$sum": "$borrows"}}}
+        ]):
+            total_transactions += row["borrows"]
+            borrows_by_category[row["_id"]] = row["borrows"]
+        if borrows_by_category:
+            most_popular_category = max(borrows_by_category, key=borrows_by_category.get)
+    else:
+        total_transactions = await transactions_collection.count_documents({})
+        
+        # Get most popular category
+        pipeline = [
+            {"$group": {"_id": "$category", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1}},
+            {"$limit": 1}
+        ]
+        
+        async for result in books_collection.aggregate(pipeline):
+            most_popular_category = result["_id"]
     
     # Generate insights
     insights = []
@@ -1,13 +1,14 @@
 from app.cores.database import users_collection, members_collection
 from app.schemas.auth_schema import UserRegister, UserLogin
-from app.utils.utils import hash_password, verify_password, create_access_token, generate_reset_token
+from app.cores.principal_cache import principal_cache
+from app.cores.password_hasher import password_hasher
+from app.cores.kv_store import kv_store
+from app.cores.config import settings
+from app.utils.utils import create_access_token, generate_reset_token
 from fastapi import HTTPException, status
 from datetime import datetime
 from bson import ObjectId
 
-# In-memory storage for reset tokens (in production, use Redis or database)
-reset_tokens = {}
-
 async def register_user(user_data: UserRegister):
     """Register a new user"""
     # Check if user already exists
@@ -30,7 +31,7 @@ async def register_user(user_data: UserRegister):
     # Create user document
     user_doc = {
         "email": user_data.email,
-        "password_hash": hash_password(user_data.password),
+        "password_hash": await password_hasher.hash(user_data.password),
         "full_name": user_data.full_name,
         "role": user_data.role,
         "is_active": True,
@@ -56,7 +57,7 @@ async def login_user(login_data: UserLogin):
         )
     
     # Verify password
-    if not verify_password(login_data.password, user["password_hash"]):
+    if not await password_hasher.verify(login_data.password, user["password_hash"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
@@ -102,10 +103,11 @@ async def forgot_password(email: str):
     
     # Generate reset token
     reset_token = generate_reset_token()
-    reset_tokens[reset_token] = {
-        "user_id": str(user["_id"]),
-        "expires_at": datetime.utcnow().timestamp() + 3600  # 1 hour expiry
-    }
+    await kv_store.set(
+        "reset_token", reset_token,
+        {"user_id": str(user["_id"])},
+        settings.RESET_TOKEN_EXPIRE_MINUTES * 60
+    )
     
     # TODO: Send email with reset token
     # For now, just return the token (in production, send via email)
@@ -117,31 +119,22 @@ async def forgot_password(email: str):
 
 async def reset_password(token: str, new_password: str):
     """Reset password using reset token"""
-    if token not in reset_tokens:
+    # Taking the token out makes it single-use even across workers
+    token_data = await kv_store.pop("reset_token", token)
+    if not token_data:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid or expired reset token"
         )
     
-    token_data = reset_tokens[token]
-    
-    # Check if token expired
-    if datetime.utcnow().timestamp() > token_data["expires_at"]:
-        del reset_tokens[token]
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Reset token has expired"
-        )
-    
     # Update password
-    new_hash = hash_password(new_password)
+    new_hash = await password_hasher.hash(new_password)
     await users_collection.update_one(
         {"_id": ObjectId(token_data["user_id"])},
         {"$set": {"password_hash": new_hash}}
     )
     
-    # Remove used token
-    del reset_tokens[token]
+    await principal_cache.invalidate(token_data["user_id"])
     
     return {"message": "Password reset successfully"}
 
@@ -1,12 +1,29 @@
 from app.cores.database import books_collection
 from app.schemas.book_schema import BookCreate, BookUpdate
 from app.cores.config import settings
+from app.utils.pagination import keyset_query, sort_spec, next_cursor, cached_count, encode_cursor, decode_cursor
+from app.cores.search_index import catalogue_index, find_ranked, top_hits, tokenize
+from app.cores.suggestion_index import suggestion_index
+from app.cores.vector_index import vector_index
+from app.cores.storage import get_storage, store_cover, COVER_FORMATS, STORAGE_BACKENDS
+from pymongo import ReturnDocument
 from fastapi import HTTPException, status, UploadFile
+from fastapi.responses import Response
 from bson import ObjectId
 from datetime import datetime
 from typing import Optional
-import shutil
-import os
+
+def _index_book(book: dict):
+    """Push a written book into the in-memory search indexes"""
+    catalogue_index.upsert(book)
+    suggestion_index.upsert(book)
+    vector_index.upsert(book)
+
+def _unindex_book(book_id: str):
+    """Drop a deleted book from the in-memory search indexes"""
+    catalogue_index.remove(book_id)
+    suggestion_index.remove(book_id)
+    vector_index.remove(book_id)
 
 async def add_book(book: BookCreate):
     """Add a new book to the library"""
@@ -25,6 +42,7 @@ async def add_book(book: BookCreate):
     }
     
     result = await books_collection.insert_one(book_doc)
+    _index_book(book_doc)
     return {
         "message": "Book added successfully",
         "book_id": str(result.inserted_id)
@@ -35,14 +53,16 @@ async def get_books(
     page_size: int = None,
     category: Optional[str] = None,
     author: Optional[str] = None,
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    include_total: bool = True
 ):
-    """List books with pagination and filters"""
+    """List books with pagination and filters (offset or keyset on _id via `cursor`)"""
     if page_size is None:
         page_size = settings.DEFAULT_PAGE_SIZE
     
     page_size = min(page_size, settings.MAX_PAGE_SIZE)
-    skip = (page - 1) * page_size
+    skip = 0 if cursor else (page - 1) * page_size
     
     # Build filter query
     query = {}
@@ -50,6 +70,42 @@ async def get_books(
         query["category"] = category
     if author:
         query["author"] = {"$regex": author, "$options": "i"}
+    # Ranked pages use a cursor holding the rank offset; a keyset cursor
+    # from the MongoDB path below keeps paging there
+    rank_offset = None
+    if cursor:
+        value, _ = decode_cursor(cursor)
+        if isinstance(value, int):
+            rank_offset = value
+    # Queries with no indexable words (e.g. only stopwords) use the regex path
+    if search and catalogue_index.ready and tokenize(search) and (not cursor or rank_offset is not None):
+        # Relevance-ranked results are paged by offset over the ranking
+        if rank_offset is not None:
+            skip = rank_offset
+        scores = catalogue_index.match(search)
+        if query:
+            ranked = [book_id for book_id, _ in top_hits(scores)]
+            books, total = await find_ranked(books_collection, ranked, query, skip, page_size, include_total)
+        else:
+            # Unfiltered: only the hits up to this page need sorting
+            ranked = [book_id for book_id, _ in top_hits(scores, skip + page_size)]
+            books, _ = await find_ranked(books_collection, ranked, skip=skip, limit=page_size)
+            total = len(scores) if include_total else None
+        following = None
+        if len(books) == page_size:
+            following = encode_cursor({"_id": books[-1]["_id"], "rank": skip + page_size}, "rank")
+        for book in books:
+            book["id"] = str(book.pop("_id"))
+        
+        return {
+            "books": books,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "total_pages": (total + page_size - 1) // page_size if total is not None else None,
+            "next_cursor": following
+        }
+    
     if search:
         query["$or"] = [
             {"title": {"$regex": search, "$options": "i"}},
@@ -58,21 +114,22 @@ async def get_books(
         ]
     
     # Get total count
-    total = await books_collection.count_documents(query)
+    total = await cached_count(books_collection, query) if include_total else None
     
     # Get paginated results
-    books = []
-    cursor = books_collection.find(query).skip(skip).limit(page_size)
-    async for book in cursor:
+    page_cursor = books_collection.find(keyset_query(query, "_id", 1, cursor)).sort(sort_spec("_id", 1))
+    books = await page_cursor.skip(skip).limit(page_size).to_list(length=page_size)
+    following = next_cursor(books, "_id", page_size)
+    for book in books:
         book["id"] = str(book.pop("_id"))
-        books.append(book)
     
     return {
         "books": books,
         "total": total,
         "page": page,
         "page_size": page_size,
-        "total_pages": (total + page_size - 1) // page_size
+        "total_pages": (total + page_size - 1) // page_size if total is not None else None,
+        "next_cursor": following
     }
 
 async def get_book_by_id(book_id: str):
@@ -110,17 +167,19 @@ async def update_book(book_id: str, book_update: BookUpdate):
             detail="No update data provided"
         )
     
-    result = await books_collection.update_one(
+    book = await books_collection.find_one_and_update(
         {"_id": ObjectId(book_id)},
-        {"$set": update_data}
+        {"$set": update_data},
+        return_document=ReturnDocument.AFTER
     )
     
-    if result.matched_count == 0:
+    if book is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Book not found"
         )
     
+    _index_book(book)
     return {"message": "Book updated successfully"}
 
 async def delete_book(book_id: str):
@@ -139,6 +198,7 @@ async def delete_book(book_id: str):
             detail="Book not found"
         )
     
+    _unindex_book(book_id)
     return {"message": "Book deleted successfully"}
 
 async def get_categories():
@@ -189,16 +249,7 @@ async def upload_book_with_image(
     # Handle file upload
     cover_image_path = None
     if cover_image:
-        # Create uploads directory if it doesn't exist
-        upload_dir = "uploads/covers"
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Save file
-        file_path = os.path.join(upload_dir, f"{isbn}_{cover_image.filename}")
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(cover_image.file, buffer)
-        
-        cover_image_path = file_path
+        cover_image_path = await store_cover(cover_image)
     
     # Create book
     book_data = BookCreate(
@@ -215,3 +266,21 @@ async def upload_book_with_image(
     
     return await add_book(book_data)
 
+async def get_cover(backend: str, location: str, if_none_match: Optional[str] = None):
+    """Serve a stored cover image"""
+    if backend not in STORAGE_BACKENDS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cover not found"
+        )
+    
+    # Covers are content-addressed (GridFS: by file ID), so they never change
+    headers = {
+        "ETag": f'"{location}"',
+        "Cache-Control": "public, max-age=31536000, immutable"
+    }
+    if if_none_match and headers["ETag"] in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    extension = location.rsplit(".", 1)[-1] if "." in location else None
+    return await get_storage(backend).response("covers", location, headers, media_type=COVER_FORMATS.get(extension))
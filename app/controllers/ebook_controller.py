@@ -1,9 +1,19 @@
-from app.cores.database import ebooks_collection, bookmarks_collection, fs, users_collection
+from app.cores.blobs import blob_store, blob_location
+from app.cores.bookmark_buffer import bookmark_buffer
+from app.cores.database import ebooks_collection, bookmarks_collection, users_collection, ebook_passages_collection
+from app.cores.fulltext import ebook_text_index, snippet
+from app.cores.storage import get_storage, content_disposition
 from fastapi import HTTPException, status, UploadFile
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response
 from bson import ObjectId
 from datetime import datetime
-import io
+from typing import Optional
+
+EBOOK_MEDIA_TYPES = {
+    "pdf": "application/pdf",
+    "epub": "application/epub+zip",
+    "mobi": "application/x-mobipocket-ebook"
+}
 
 async def list_ebooks(category: str = None):
     """List all e-books"""
@@ -22,13 +32,74 @@ async def list_ebooks(category: str = None):
         "total": len(ebooks)
     }
 
+async def search_ebook_text(user_id: str, query: str, ebook_id: Optional[str] = None, limit: int = 20):
+    """Search inside e-books; each hit names the e-book, page and a snippet"""
+    match = {"$text": {"$search": query}}
+    if ebook_id:
+        if not ObjectId.is_valid(ebook_id):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid e-book ID"
+            )
+        ebook = await ebooks_collection.find_one({"_id": ObjectId(ebook_id)}, {"sha256": 1})
+        if not ebook:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="E-book not found"
+            )
+        match["sha256"] = ebook.get("sha256")
+    
+    passages = await ebook_passages_collection.find(
+        match, {"sha256": 1, "page": 1, "text": 1, "score": {"$meta": "textScore"}}
+    ).sort([("score", {"$meta": "textScore"})]).limit(limit).to_list(length=limit)
+    
+    # Passages belong to the stored file; list every e-book sharing it
+    digests = list({p["sha256"] for p in passages})
+    ebooks_by_digest = {}
+    async for ebook in ebooks_collection.find(
+        {"sha256": {"$in": digests}, **({"_id": ObjectId(ebook_id)} if ebook_id else {})},
+        {"title": 1, "author": 1, "format": 1, "sha256": 1}
+    ):
+        ebooks_by_digest.setdefault(ebook["sha256"], []).append(ebook)
+    ebook_ids = [str(e["_id"]) for ebooks in ebooks_by_digest.values() for e in ebooks]
+    bookmarks = {
+        b["ebook_id"]: b["page_number"]
+        async for b in bookmarks_collection.find({"user_id": user_id, "ebook_id": {"$in": ebook_ids}})
+    }
+    # Page turns not flushed yet are newer than what is stored
+    for key in ebook_ids:
+        buffered = bookmark_buffer.get(user_id, key)
+        if buffered:
+            bookmarks[key] = buffered[0]
+    
+    results = []
+    for passage in passages:
+        for ebook in ebooks_by_digest.get(passage["sha256"], []):
+            ebook_key = str(ebook["_id"])
+            results.append({
+                "ebook_id": ebook_key,
+                "title": ebook["title"],
+                "author": ebook["author"],
+                # Same numbering as bookmarks: save it with POST /ebooks/{id}/bookmark?page_number=
+                "page_number": passage["page"],
+                "snippet": snippet(passage["text"], query),
+                "score": round(passage["score"], 3),
+                "bookmark_page": bookmarks.get(ebook_key)
+            })
+    
+    return {
+        "query": query,
+        "results": results,
+        "total": len(results)
+    }
+
 async def upload_ebook(
     title: str,
     author: str,
     category: str,
     file: UploadFile
 ):
-    """Upload an e-book file using GridFS"""
+    """Upload an e-book file to the configured storage backend"""
     # Validate file format
     allowed_formats = ["pdf", "epub", "mobi"]
     file_extension = file.filename.split(".")[-1].lower()
@@ -39,74 +110,109 @@ async def upload_ebook(
             detail=f"Invalid file format. Allowed: {', '.join(allowed_formats)}"
         )
     
-    # Read file content
-    file_content = await file.read()
-    file_size_mb = len(file_content) / (1024 * 1024)
-    
-    # Upload to GridFS
-    file_id = await fs.upload_from_stream(
-        file.filename,
-        file_content,
-        metadata={
-            "title": title,
-            "author": author,
-            "category": category,
-            "content_type": file.content_type
-        }
-    )
+    # Identical files are stored once and shared between e-books
+    blob, deduplicated = await blob_store.put(file)
+    backend, location = blob_location(blob)
+    file_size_mb = blob["size_bytes"] / (1024 * 1024)
     
     # Create e-book record
     ebook_doc = {
         "title": title,
         "author": author,
-        "file_id": str(file_id),
+        "file_id": location,
+        "storage": backend,
         "format": file_extension,
         "size_mb": round(file_size_mb, 2),
+        "size_bytes": blob["size_bytes"],
+        "sha256": blob["_id"],
         "category": category,
         "upload_date": datetime.utcnow()
     }
     
-    result = await ebooks_collection.insert_one(ebook_doc)
+    try:
+        result = await ebooks_collection.insert_one(ebook_doc)
+    except BaseException:
+        await blob_store.release(blob["_id"])
+        raise
+    
+    # A reused file already has its text indexed
+    if not deduplicated:
+        ebook_text_index.schedule(blob["_id"], file_extension)
     
     return {
         "message": "E-book uploaded successfully",
         "ebook_id": str(result.inserted_id),
-        "file_size_mb": ebook_doc["size_mb"]
+        "file_size_mb": ebook_doc["size_mb"],
+        "deduplicated": deduplicated
     }
 
-async def download_ebook(ebook_id: str):
-    """Download an e-book file"""
+async def delete_ebook(ebook_id: str):
+    """Delete an e-book, its bookmarks and (if no other e-book shares it) its file"""
     if not ObjectId.is_valid(ebook_id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid e-book ID"
         )
     
-    ebook = await ebooks_collection.find_one({"_id": ObjectId(ebook_id)})
+    ebook = await ebooks_collection.find_one_and_delete({"_id": ObjectId(ebook_id)})
     if not ebook:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="E-book not found"
         )
     
-    # Download from GridFS
-    try:
-        grid_out = await fs.open_download_stream(ObjectId(ebook["file_id"]))
-        file_content = await grid_out.read()
-        
-        # Return as streaming response
-        return StreamingResponse(
-            io.BytesIO(file_content),
-            media_type="application/octet-stream",
-            headers={
-                "Content-Disposition": f"attachment; filename={ebook['title']}.{ebook['format']}"
-            }
+    bookmark_buffer.discard_ebook(ebook_id)
+    await bookmarks_collection.delete_many({"ebook_id": ebook_id})
+    if ebook.get("sha256"):
+        await blob_store.release(ebook["sha256"])
+    else:
+        # Uploaded before deduplication: the file belongs to this e-book alone
+        await get_storage("gridfs").delete("ebooks", ebook["file_id"])
+    
+    return {"message": "E-book deleted successfully"}
+
+async def download_ebook(
+    ebook_id: str,
+    range_header: Optional[str] = None,
+    if_none_match: Optional[str] = None,
+    if_range: Optional[str] = None,
+    inline: bool = False
+):
+    """Stream an e-book file, honouring Range and conditional request headers"""
+    if not ObjectId.is_valid(ebook_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid e-book ID"
         )
-    except Exception as e:
+    
+    ebook = await ebooks_collection.find_one({"_id": ObjectId(ebook_id)})
+    if not ebook:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error downloading file"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="E-book not found"
         )
+    
+    # Stored files never change: the content digest (or, for files from
+    # before deduplication, the file ID) is a strong validator
+    etag = f'"{ebook.get("sha256") or ebook["file_id"]}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, max-age=86400"
+    }
+    
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    headers["Content-Disposition"] = content_disposition(f"{ebook['title']}.{ebook['format']}", inline)
+    storage = get_storage(ebook.get("storage", "gridfs"))
+    return await storage.response(
+        "ebooks",
+        ebook["file_id"],
+        headers,
+        media_type=EBOOK_MEDIA_TYPES.get(ebook["format"], "application/octet-stream"),
+        range_header=range_header,
+        if_range=if_range
+    )
 
 async def save_bookmark(user_id: str, ebook_id: str, page_number: int):
     """Save or update bookmark for an e-book"""
@@ -116,32 +222,8 @@ async def save_bookmark(user_id: str, ebook_id: str, page_number: int):
             detail="Invalid e-book ID"
         )
     
-    # Check if bookmark exists
-    existing = await bookmarks_collection.find_one({
-        "user_id": user_id,
-        "ebook_id": ebook_id
-    })
-    
-    if existing:
-        # Update existing bookmark
-        await bookmarks_collection.update_one(
-            {"_id": existing["_id"]},
-            {
-                "$set": {
-                    "page_number": page_number,
-                    "last_read": datetime.utcnow()
-                }
-            }
-        )
-    else:
-        # Create new bookmark
-        bookmark_doc = {
-            "user_id": user_id,
-            "ebook_id": ebook_id,
-            "page_number": page_number,
-            "last_read": datetime.utcnow()
-        }
-        await bookmarks_collection.insert_one(bookmark_doc)
+    # Page turns are coalesced in memory and flushed in batches
+    bookmark_buffer.save(user_id, ebook_id, page_number)
     
     return {
         "message": "Bookmark saved successfully",
@@ -150,6 +232,11 @@ async def save_bookmark(user_id: str, ebook_id: str, page_number: int):
 
 async def get_bookmark(user_id: str, ebook_id: str):
     """Get bookmark for an e-book"""
+    buffered = bookmark_buffer.get(user_id, ebook_id)
+    if buffered:
+        page_number, last_read = buffered
+        return {"page_number": page_number, "last_read": last_read}
+    
     bookmark = await bookmarks_collection.find_one({
         "user_id": user_id,
         "ebook_id": ebook_id
@@ -1,22 +1,27 @@
-from app.cores.database import fines_collection, transactions_collection, members_collection
+from app.cores.database import fines_collection, transactions_collection, members_collection, run_in_transaction
 from app.schemas.fine_schema import PayFineRequest, WaiveFineRequest
+from app.cores.loader import get_loader
 from app.cores.config import settings
+from app.utils.pagination import keyset_query, sort_spec, next_cursor, cached_count
 from fastapi import HTTPException, status
 from bson import ObjectId
+from pymongo.errors import PyMongoError
 from datetime import datetime
 
 async def list_fines(
     member_id: str = None,
     fine_status: str = None,
     page: int = 1,
-    page_size: int = None
+    page_size: int = None,
+    cursor: str = None,
+    include_total: bool = True
 ):
-    """List fines with filters"""
+    """List fines with filters (offset or keyset on created_at via `cursor`)"""
     if page_size is None:
         page_size = settings.DEFAULT_PAGE_SIZE
     
     page_size = min(page_size, settings.MAX_PAGE_SIZE)
-    skip = (page - 1) * page_size
+    skip = 0 if cursor else (page - 1) * page_size
     
     query = {}
     if member_id:
@@ -35,28 +40,62 @@ async def list_fines(
             )
         query["status"] = fine_status
     
-    total = await fines_collection.count_documents(query)
+    total = await cached_count(fines_collection, query) if include_total else None
     
-    fines = []
-    cursor = fines_collection.find(query).sort("created_at", -1).skip(skip).limit(page_size)
-    async for fine in cursor:
-        # Get member details
-        member = await members_collection.find_one({"_id": ObjectId(fine["member_id"])})
+    page_cursor = fines_collection.find(keyset_query(query, "created_at", -1, cursor)).sort(sort_spec("created_at", -1))
+    fines = await page_cursor.skip(skip).limit(page_size).to_list(length=page_size)
+    following = next_cursor(fines, "created_at", page_size)
+    
+    # Get member details for the whole page in one query
+    members = await get_loader().load_many(members_collection, [f["member_id"] for f in fines])
+    
+    for fine in fines:
+        member = members.get(fine["member_id"])
         
         fine["id"] = str(fine.pop("_id"))
         if member:
             fine["member_details"] = {
                 "membership_id": member["membership_id"]
             }
-        fines.append(fine)
     
     return {
         "fines": fines,
         "total": total,
         "page": page,
-        "page_size": page_size
+        "page_size": page_size,
+        "next_cursor": following
     }
 
+async def _settle_fine(fine: dict, update: dict, session):
+    """Move a pending fine to paid/waived and release it from the member's total"""
+    # Only a still-pending fine can be settled, so concurrent pay/waive
+    # requests cannot both subtract the amount
+    result = await fines_collection.update_one(
+        {"_id": fine["_id"], "status": "pending"},
+        {"$set": update},
+        session=session
+    )
+    if result.modified_count == 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Fine is no longer pending"
+        )
+    
+    try:
+        await members_collection.update_one(
+            {"_id": ObjectId(fine["member_id"])},
+            {"$inc": {"pending_fine_total": -fine["amount"]}},
+            session=session
+        )
+    except PyMongoError:
+        if session is None:
+            # No transaction to roll back, put the fine back to pending by hand
+            await fines_collection.update_one(
+                {"_id": fine["_id"], "status": update["status"]},
+                {"$set": {field: fine.get(field) for field in update}}
+            )
+        raise
+
 async def pay_fine(fine_id: str, payment_data: PayFineRequest):
     """Pay a fine"""
     if not ObjectId.is_valid(fine_id):
@@ -78,18 +117,12 @@ async def pay_fine(fine_id: str, payment_data: PayFineRequest):
             detail=f"Fine is already {fine['status']}"
         )
     
-    # Update fine status
-    await fines_collection.update_one(
-        {"_id": ObjectId(fine_id)},
-        {
-            "$set": {
-                "status": "paid",
-                "paid_at": datetime.utcnow(),
-                "payment_method": payment_data.payment_method,
-                "payment_reference": payment_data.payment_reference
-            }
-        }
-    )
+    await run_in_transaction(lambda session: _settle_fine(fine, {
+        "status": "paid",
+        "paid_at": datetime.utcnow(),
+        "payment_method": payment_data.payment_method,
+        "payment_reference": payment_data.payment_reference
+    }, session))
     
     return {
         "message": "Fine paid successfully",
@@ -118,17 +151,11 @@ async def waive_fine(fine_id: str, waive_data: WaiveFineRequest):
             detail=f"Fine is already {fine['status']}"
         )
     
-    # Update fine status
-    await fines_collection.update_one(
-        {"_id": ObjectId(fine_id)},
-        {
-            "$set": {
-                "status": "waived",
-                "waived_at": datetime.utcnow(),
-                "waive_reason": waive_data.reason
-            }
-        }
-    )
+    await run_in_transaction(lambda session: _settle_fine(fine, {
+        "status": "waived",
+        "waived_at": datetime.utcnow(),
+        "waive_reason": waive_data.reason
+    }, session))
     
     return {
         "message": "Fine waived successfully",
@@ -1,6 +1,9 @@
 from app.cores.database import members_collection, users_collection, transactions_collection
 from app.schemas.member_schema import MemberCreate, MemberUpdate
+from app.cores.loader import get_loader
+from app.cores.principal_cache import principal_cache
 from app.cores.config import settings
+from app.utils.pagination import keyset_query, sort_spec, next_cursor, cached_count
 from fastapi import HTTPException, status
 from bson import ObjectId
 from datetime import datetime, timedelta
@@ -19,21 +22,30 @@ async def generate_membership_id():
         if not existing:
             return membership_id
 
-async def list_members(page: int = 1, page_size: int = None):
-    """List all members with pagination"""
+async def list_members(
+    page: int = 1,
+    page_size: int = None,
+    cursor: str = None,
+    include_total: bool = True
+):
+    """List all members with pagination (offset or keyset via `cursor`)"""
     if page_size is None:
         page_size = settings.DEFAULT_PAGE_SIZE
     
     page_size = min(page_size, settings.MAX_PAGE_SIZE)
-    skip = (page - 1) * page_size
+    skip = 0 if cursor else (page - 1) * page_size
     
-    total = await members_collection.count_documents({})
+    total = await cached_count(members_collection, {}) if include_total else None
     
-    members = []
-    cursor = members_collection.find({}).skip(skip).limit(page_size)
-    async for member in cursor:
-        # Get user details
-        user = await users_collection.find_one({"_id": ObjectId(member["user_id"])})
+    page_cursor = members_collection.find(keyset_query({}, "_id", 1, cursor)).sort(sort_spec("_id", 1))
+    members = await page_cursor.skip(skip).limit(page_size).to_list(length=page_size)
+    following = next_cursor(members, "_id", page_size)
+    
+    # Get user details for the whole page in one query
+    users = await get_loader().load_many(users_collection, [m["user_id"] for m in members])
+    
+    for member in members:
+        user = users.get(member["user_id"])
         
         member["id"] = str(member.pop("_id"))
         if user:
@@ -41,14 +53,14 @@ async def list_members(page: int = 1, page_size: int = None):
                 "email": user["email"],
                 "full_name": user["full_name"]
             }
-        members.append(member)
     
     return {
         "members": members,
         "total": total,
         "page": page,
         "page_size": page_size,
-        "total_pages": (total + page_size - 1) // page_size
+        "total_pages": (total + page_size - 1) // page_size if total is not None else None,
+        "next_cursor": following
     }
 
 async def add_member(member_data: MemberCreate):
@@ -91,10 +103,14 @@ async def add_member(member_data: MemberCreate):
         "membership_start": datetime.utcnow(),
         "membership_end": datetime.utcnow() + timedelta(days=365),  # 1 year
         "max_books_allowed": max_books,
-        "is_active": True
+        "is_active": True,
+        "current_borrowed": 0,
+        "pending_fine_total": 0.0
     }
     
     result = await members_collection.insert_one(member_doc)
+    # The cached principal of this user has no member_id yet
+    await principal_cache.invalidate(member_data.user_id)
     
     return {
         "message": "Member added successfully",
@@ -131,13 +147,19 @@ async def update_member(member_id: str, member_update: MemberUpdate):
     
     return {"message": "Member updated successfully"}
 
-async def search_members(query: str, page: int = 1, page_size: int = None):
+async def search_members(
+    query: str,
+    page: int = 1,
+    page_size: int = None,
+    cursor: str = None,
+    include_total: bool = True
+):
     """Search members by name, email, or membership ID"""
     if page_size is None:
         page_size = settings.DEFAULT_PAGE_SIZE
     
     page_size = min(page_size, settings.MAX_PAGE_SIZE)
-    skip = (page - 1) * page_size
+    skip = 0 if cursor else (page - 1) * page_size
     
     # Search in members collection
     member_query = {
@@ -160,12 +182,15 @@ async def search_members(query: str, page: int = 1, page_size: int = None):
     if users:
         member_query["$or"].append({"user_id": {"$in": users}})
     
-    total = await members_collection.count_documents(member_query)
+    total = await cached_count(members_collection, member_query) if include_total else None
     
-    members = []
-    cursor = members_collection.find(member_query).skip(skip).limit(page_size)
-    async for member in cursor:
-        user = await users_collection.find_one({"_id": ObjectId(member["user_id"])})
+    page_cursor = members_collection.find(keyset_query(member_query, "_id", 1, cursor)).sort(sort_spec("_id", 1))
+    members = await page_cursor.skip(skip).limit(page_size).to_list(length=page_size)
+    following = next_cursor(members, "_id", page_size)
+    users = await get_loader().load_many(users_collection, [m["user_id"] for m in members])
+    
+    for member in members:
+        user = users.get(member["user_id"])
         
         member["id"] = str(member.pop("_id"))
         if user:
@@ -173,13 +198,13 @@ async def search_members(query: str, page: int = 1, page_size: int = None):
                 "email": user["email"],
                 "full_name": user["full_name"]
             }
-        members.append(member)
     
     return {
         "members": members,
         "total": total,
         "page": page,
-        "page_size": page_size
+        "page_size": page_size,
+        "next_cursor": following
     }
 
 async def get_member_profile(member_id: str):
@@ -1,12 +1,30 @@
-from app.cores.database import transactions_collection, fines_collection, books_collection
-from app.schemas.report_schema import ReportRequest
-from datetime import datetime
+from app.cores.database import (
+    transactions_collection, fines_collection, books_collection, members_collection, daily_stats_collection
+)
+from app.cores.config import settings
+from app.cores.loader import get_loader
+from app.cores.popularity import popularity, transactions_pipeline, WINDOWS
+from app.cores.rollup import circulation_rollup, start_of_day, WENT_OVERDUE
+from app.cores.jobs import report_jobs, JobQueueFull
+from app.schemas.report_schema import ReportRequest, ReportJobRequest
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from bson import ObjectId
+from datetime import datetime, timedelta
 from typing import Optional
 import csv
 import io
+import json
+import zlib
 
-async def borrowing_report(start_date: datetime = None, end_date: datetime = None):
-    """Generate borrowing statistics report"""
+# Time-bucket label formats for report series
+INTERVAL_FORMATS = {
+    "daily": "%Y-%m-%d",
+    "weekly": "%G-W%V",  # ISO week
+    "monthly": "%Y-%m"
+}
+
+def _date_match(field: str, start_date: datetime = None, end_date: datetime = None) -> dict:
     query = {}
     if start_date or end_date:
         date_query = {}
@@ -14,95 +32,278 @@ async def borrowing_report(start_date: datetime = None, end_date: datetime = Non
             date_query["$gte"] = start_date
         if end_date:
             date_query["$lte"] = end_date
-        query["borrow_date"] = date_query
+        query[field] = date_query
+    return query
+
+def _day_match(field: str, start_date: datetime = None, end_date: datetime = None, upper: datetime = None) -> dict:
+    """Match whole days from start_date's day through end_date's day, like the rollup"""
+    date_query = {"$type": "date"}
+    if start_date:
+        date_query["$gte"] = start_of_day(start_date)
+    if end_date:
+        date_query["$lt"] = start_of_day(end_date) + timedelta(days=1)
+    if upper and ("$lt" not in date_query or upper < date_query["$lt"]):
+        date_query["$lt"] = upper
+    return {field: date_query}
+
+def _count_if(condition) -> dict:
+    return {"$sum": {"$cond": [condition, 1, 0]}}
+
+async def _facet(collection, match: dict, group: dict, date_field: str, interval: Optional[str], distinct: str = None) -> dict:
+    """Run one $facet pass: overall totals plus an optional per-period series.
+    
+    `distinct` names an array field whose distinct values are counted into
+    totals and series rows as "unique_<field>".
+    """
+    period = {"$dateToString": {"format": INTERVAL_FORMATS[interval], "date": f"${date_field}"}} if interval else None
+    facets = {"totals": [{"$group": {"_id": None, **group}}]}
+    if interval:
+        facets["series"] = [{"$group": {"_id": period, **group}}, {"$sort": {"_id": 1}}]
+    if distinct:
+        facets["distinct"] = [
+            {"$unwind": f"${distinct}"},
+            {"$group": {"_id": f"${distinct}"}},
+            {"$count": "count"}
+        ]
+        if interval:
+            facets["series_distinct"] = [
+                {"$unwind": f"${distinct}"},
+                {"$group": {"_id": {"period": period, "value": f"${distinct}"}}},
+                {"$group": {"_id": "$_id.period", "count": {"$sum": 1}}}
+            ]
     
-    total_transactions = await transactions_collection.count_documents(query)
-    borrowed = await transactions_collection.count_documents({**query, "status": "borrowed"})
-    returned = await transactions_collection.count_documents({**query, "status": "returned"})
-    overdue = await transactions_collection.count_documents({**query, "status": "overdue"})
+    result = await collection.aggregate([{"$match": match}, {"$facet": facets}]).to_list(length=1)
+    result = result[0] if result else {}
+    totals = (result.get("totals") or [{}])[0]
+    series = [{"period": row.pop("_id"), **row} for row in result.get("series", [])]
+    
+    if distinct:
+        key = f"unique_{distinct}"
+        totals[key] = (result.get("distinct") or [{}])[0].get("count", 0)
+        per_period = {row["_id"]: row["count"] for row in result.get("series_distinct", [])}
+        for row in series:
+            row[key] = per_period.get(row["period"], 0)
+    return {"totals": totals, "series": series}
+
+def _rollup_sums(measures: dict) -> dict:
+    return {key: {"$sum": f"${measure}"} for key, measure in measures.items()}
+
+def _merge(*results, rename: dict = None) -> dict:
+    """Combine _facet results into one, joining series rows by period"""
+    rename = rename or {}
+    totals, series = {}, {}
+    for result in results:
+        for key, value in result["totals"].items():
+            if key != "_id":
+                totals[rename.get(key, key)] = value
+        for row in result["series"]:
+            merged = series.setdefault(row["period"], {"period": row["period"]})
+            for key, value in row.items():
+                merged[rename.get(key, key)] = value
+    return {"totals": totals, "series": [series[period] for period in sorted(series)]}
+
+async def borrowing_report(start_date: datetime = None, end_date: datetime = None, interval: Optional[str] = None):
+    """Generate borrowing statistics report"""
+    # Every event counts on the day it happened and the range covers whole
+    # days at both ends, whether it is read from the rollup or raw loans
+    now = datetime.utcnow()
+    if circulation_rollup.ready:
+        events = _merge(await _facet(
+            daily_stats_collection, _date_match("date", start_of_day(start_date) if start_date else None, end_date),
+            _rollup_sums({"total_transactions": "borrows", "returned": "returns", "overdue": "overdue"}),
+            "date", interval, distinct="borrower_ids"
+        ), rename={"unique_borrower_ids": "unique_borrowers"})
+    else:
+        events = _merge(
+            await _facet(
+                transactions_collection, _day_match("borrow_date", start_date, end_date),
+                {"total_transactions": {"$sum": 1}}, "borrow_date", interval, distinct="member_id"
+            ),
+            await _facet(
+                transactions_collection, _day_match("return_date", start_date, end_date),
+                {"returned": {"$sum": 1}}, "return_date", interval
+            ),
+            # Overdue is only known once the due date has passed
+            await _facet(
+                transactions_collection, _day_match("due_date", start_date, end_date, upper=now),
+                {"overdue": _count_if(WENT_OVERDUE)}, "due_date", interval
+            ),
+            rename={"unique_member_id": "unique_borrowers"}
+        )
+    
+    # Loans still out are a point-in-time figure, read from the (small,
+    # indexed) open set; nothing writes an "overdue" status, so derive it
+    live = await _facet(
+        transactions_collection,
+        {**_day_match("borrow_date", start_date, end_date), "status": {"$ne": "returned"}},
+        {"currently_borrowed": {"$sum": 1}, "overdue": _count_if({"$lt": ["$due_date", now]})}, "borrow_date", None
+    )
+    totals = events["totals"]
+    data = {
+        "total_transactions": totals.get("total_transactions", 0),
+        "currently_borrowed": live["totals"].get("currently_borrowed", 0),
+        "returned": totals.get("returned", 0),
+        "overdue": live["totals"].get("overdue", 0),
+        "unique_borrowers": totals.get("unique_borrowers", 0)
+    }
+    if interval:
+        series_keys = ("total_transactions", "returned", "overdue")
+        # Days with only fine activity have no borrowing figures
+        data["series"] = [
+            {
+                "period": row["period"],
+                **{key: row.get(key, 0) for key in series_keys},
+                "unique_borrowers": row.get("unique_borrowers", 0)
+            }
+            for row in events["series"]
+            if any(row.get(key) for key in series_keys)
+        ]
     
     return {
         "report_type": "borrowing",
         "period": {
             "start_date": start_date,
-            "end_date": end_date
-        },
-        "data": {
-            "total_transactions": total_transactions,
-            "currently_borrowed": borrowed,
-            "returned": returned,
-            "overdue": overdue
+            "end_date": end_date,
+            "interval": interval
         },
+        "data": data,
         "generated_at": datetime.utcnow()
     }
 
-async def fines_report(start_date: datetime = None, end_date: datetime = None):
+async def fines_report(start_date: datetime = None, end_date: datetime = None, interval: Optional[str] = None):
     """Generate fines statistics report"""
-    query = {}
-    if start_date or end_date:
-        date_query = {}
-        if start_date:
-            date_query["$gte"] = start_date
-        if end_date:
-            date_query["$lte"] = end_date
-        query["created_at"] = date_query
-    
-    total_fines = 0.0
-    pending_fines = 0.0
-    paid_fines = 0.0
-    waived_fines = 0.0
-    
-    async for fine in fines_collection.find(query):
-        total_fines += fine["amount"]
-        if fine["status"] == "pending":
-            pending_fines += fine["amount"]
-        elif fine["status"] == "paid":
-            paid_fines += fine["amount"]
-        elif fine["status"] == "waived":
-            waived_fines += fine["amount"]
+    # Issued/paid/waived are summed by the day they happened, over whole
+    # days, whether read from the rollup or raw fines
+    if circulation_rollup.ready:
+        events = _merge(await _facet(
+            daily_stats_collection, _date_match("date", start_of_day(start_date) if start_date else None, end_date),
+            _rollup_sums({"total_amount": "fines_issued", "paid_amount": "fines_paid", "waived_amount": "fines_waived"}),
+            "date", interval
+        ))
+    else:
+        events = _merge(
+            await _facet(
+                fines_collection, _day_match("created_at", start_date, end_date),
+                {"total_amount": {"$sum": "$amount"}}, "created_at", interval
+            ),
+            await _facet(
+                fines_collection, {**_day_match("paid_at", start_date, end_date), "status": "paid"},
+                {"paid_amount": {"$sum": "$amount"}}, "paid_at", interval
+            ),
+            await _facet(
+                fines_collection, {**_day_match("waived_at", start_date, end_date), "status": "waived"},
+                {"waived_amount": {"$sum": "$amount"}}, "waived_at", interval
+            )
+        )
+    
+    # The pending balance is read live from the indexed pending set
+    live = await _facet(
+        fines_collection,
+        {**_day_match("created_at", start_date, end_date), "status": "pending"},
+        {"pending_amount": {"$sum": "$amount"}}, "created_at", None
+    )
+    totals = {**events["totals"], **live["totals"]}
+    keys = ["total_amount", "pending_amount", "paid_amount", "waived_amount"]
+    series_keys = ["total_amount", "paid_amount", "waived_amount"]
+    
+    data = {key: round(float(totals.get(key) or 0.0), 2) for key in keys}
+    if interval:
+        # Days with only loan activity have no fine figures
+        data["series"] = [
+            {"period": row["period"], **{key: round(float(row.get(key) or 0.0), 2) for key in series_keys}}
+            for row in events["series"]
+            if any(row.get(key) for key in series_keys)
+        ]
     
     return {
         "report_type": "fines",
         "period": {
             "start_date": start_date,
-            "end_date": end_date
-        },
-        "data": {
-            "total_amount": total_fines,
-            "pending_amount": pending_fines,
-            "paid_amount": paid_fines,
-            "waived_amount": waived_fines
+            "end_date": end_date,
+            "interval": interval
         },
+        "data": data,
         "generated_at": datetime.utcnow()
     }
 
-async def popular_books_report(limit: int = 10):
+async def popular_books_report(limit: int = 10, window: str = "all"):
     """Generate popular books report"""
-    pipeline = [
-        {"$group": {"_id": "$book_id", "borrow_count": {"$sum": 1}}},
-        {"$sort": {"borrow_count": -1}},
-        {"$limit": limit}
-    ]
+    counts = popularity.top(window, limit)
+    if counts is None:
+        # Counters not loaded yet, aggregate transactions directly
+        results = await transactions_collection.aggregate(transactions_pipeline(window, limit)).to_list(length=limit)
+        counts = [(r["_id"], r["borrow_count"]) for r in results]
+    
+    # book_id is stored as a string; the loader converts it to an ObjectId
+    books = await get_loader().load_many(books_collection, [book_id for book_id, _ in counts])
     
     popular_books = []
-    async for result in transactions_collection.aggregate(pipeline):
-        book = await books_collection.find_one({"_id": result["_id"]})
+    for book_id, borrow_count in counts:
+        book = books.get(book_id)
         if book:
             popular_books.append({
                 "book_id": str(book["_id"]),
                 "title": book["title"],
                 "author": book["author"],
-                "borrow_count": result["borrow_count"]
+                "borrow_count": borrow_count
             })
     
     return {
         "report_type": "popular_books",
+        "window": window,
         "data": {
             "books": popular_books
         },
         "generated_at": datetime.utcnow()
     }
 
+# Reports that can run as background jobs, with the request fields each one takes
+REPORT_JOBS = {
+    "borrowing": (borrowing_report, ("start_date", "end_date", "interval")),
+    "fines": (fines_report, ("start_date", "end_date", "interval")),
+    "popular-books": (popular_books_report, ("limit", "window"))
+}
+for name, (run, _) in REPORT_JOBS.items():
+    report_jobs.register(name, run)
+
+async def submit_report_job(job_request: ReportJobRequest):
+    """Queue a report for background computation (or reuse an identical one)"""
+    if job_request.report not in REPORT_JOBS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Report must be one of: {', '.join(REPORT_JOBS)}"
+        )
+    if job_request.interval and job_request.interval not in INTERVAL_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Interval must be 'daily', 'weekly' or 'monthly'"
+        )
+    if job_request.window not in WINDOWS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Window must be one of: {', '.join(WINDOWS)}"
+        )
+    
+    fields = REPORT_JOBS[job_request.report][1]
+    params = {field: getattr(job_request, field) for field in fields}
+    try:
+        return await report_jobs.submit(job_request.report, params)
+    except JobQueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many reports queued, try again shortly"
+        )
+
+async def get_report_job(job_id: str):
+    """Get a report job's status, and its result once finished"""
+    job = await report_jobs.get(job_id)
+    if not job or job["report"] not in REPORT_JOBS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Report job not found or expired"
+        )
+    return job
+
 async def generate_custom_report(report_params: dict):
     """Generate custom report based on parameters"""
     # This is a flexible endpoint for custom reporting needs
@@ -136,3 +337,99 @@ async def export_report(report_data: dict, export_format: str = "csv"):
     
     # Default to JSON
     return report_data
+
+# Raw datasets available for streaming export: collection, date field, CSV columns
+EXPORT_DATASETS = {
+    "transactions": (transactions_collection, "borrow_date", [
+        "id", "member_id", "book_id", "borrow_date", "due_date", "return_date", "status", "fine_amount"
+    ]),
+    "fines": (fines_collection, "created_at", [
+        "id", "member_id", "transaction_id", "amount", "reason", "status",
+        "created_at", "paid_at", "payment_method", "payment_reference", "waived_at", "waive_reason"
+    ]),
+    "members": (members_collection, "membership_start", [
+        "id", "membership_id", "user_id", "phone", "address", "membership_type",
+        "membership_start", "membership_end", "max_books_allowed", "is_active",
+        "current_borrowed", "pending_fine_total"
+    ]),
+    "books": (books_collection, "created_at", [
+        "id", "isbn", "title", "author", "category", "publisher", "publication_year",
+        "total_copies", "available_copies", "created_at"
+    ])
+}
+
+# Bytes of output collected before a chunk is sent
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+def _export_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return str(value) if isinstance(value, ObjectId) else value
+
+async def _export_chunks(cursor, columns: list, export_format: str, compress: bool):
+    """Encode documents from `cursor` into CSV/NDJSON byte chunks, optionally gzipped"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    gzip = zlib.compressobj(wbits=31) if compress else None
+    
+    def drain():
+        data = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        return gzip.compress(data) if gzip else data
+    
+    if export_format == "csv":
+        writer.writerow(columns)
+    
+    async for doc in cursor:
+        doc = {"id": str(doc.pop("_id")), **doc}
+        if export_format == "csv":
+            writer.writerow([_export_value(doc.get(column)) for column in columns])
+        else:
+            buffer.write(json.dumps(doc, default=_export_value))
+            buffer.write("\n")
+        
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            chunk = drain()
+            if chunk:
+                yield chunk
+    
+    chunk = drain()
+    if gzip:
+        chunk += gzip.flush()
+    if chunk:
+        yield chunk
+
+async def export_dataset(
+    dataset: str,
+    start_date: datetime = None,
+    end_date: datetime = None,
+    export_format: str = "csv",
+    compress: bool = False
+):
+    """Stream raw documents of a dataset over a date range as CSV or NDJSON"""
+    if dataset not in EXPORT_DATASETS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Unknown export dataset"
+        )
+    
+    collection, date_field, columns = EXPORT_DATASETS[dataset]
+    cursor = collection.find(_date_match(date_field, start_date, end_date))
+    cursor = cursor.sort([(date_field, 1), ("_id", 1)]).batch_size(settings.EXPORT_BATCH_SIZE)
+    
+    filename = f"{dataset}_{datetime.utcnow():%Y%m%d%H%M%S}.{export_format}"
+    media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    if compress:
+        filename += ".gz"
+        media_type = "application/gzip"
+    
+    return StreamingResponse(
+        _export_chunks(cursor, columns, export_format, compress),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
@@ -1,4 +1,5 @@
 from app.cores.database import reservations_collection, books_collection, members_collection
+from app.cores.loader import get_loader
 from app.schemas.reservation_schema import ReservationCreate
 from fastapi import HTTPException, status
 from bson import ObjectId
@@ -24,12 +25,16 @@ async def list_reservations(member_id: str = None, book_id: str = None):
             )
         query["book_id"] = book_id
     
-    reservations = []
-    cursor = reservations_collection.find(query).sort("reservation_date", 1)
-    async for reservation in cursor:
-        # Get book and member details
-        book = await books_collection.find_one({"_id": ObjectId(reservation["book_id"])})
-        member = await members_collection.find_one({"_id": ObjectId(reservation["member_id"])})
+    reservations = await reservations_collection.find(query).sort("reservation_date", 1).to_list(length=None)
+    
+    # Get book and member details
+    loader = get_loader()
+    books = await loader.load_many(books_collection, [r["book_id"] for r in reservations])
+    members = await loader.load_many(members_collection, [r["member_id"] for r in reservations])
+    
+    for reservation in reservations:
+        book = books.get(reservation["book_id"])
+        member = members.get(reservation["member_id"])
         
         reservation["id"] = str(reservation.pop("_id"))
         if book:
@@ -41,7 +46,6 @@ async def list_reservations(member_id: str = None, book_id: str = None):
             reservation["member_details"] = {
                 "membership_id": member["membership_id"]
             }
-        reservations.append(reservation)
     
     return {
         "reservations": reservations,
@@ -161,21 +165,21 @@ async def get_reservation_queue(book_id: str):
             detail="Book not found"
         )
     
-    queue = []
-    cursor = reservations_collection.find({
+    queue = await reservations_collection.find({
         "book_id": book_id,
         "status": "active"
-    }).sort("queue_position", 1)
+    }).sort("queue_position", 1).to_list(length=None)
+    
+    members = await get_loader().load_many(members_collection, [r["member_id"] for r in queue])
     
-    async for reservation in cursor:
-        member = await members_collection.find_one({"_id": ObjectId(reservation["member_id"])})
+    for reservation in queue:
+        member = members.get(reservation["member_id"])
         
         reservation["id"] = str(reservation.pop("_id"))
         if member:
             reservation["member_details"] = {
                 "membership_id": member["membership_id"]
             }
-        queue.append(reservation)
     
     return {
         "book_id": book_id,
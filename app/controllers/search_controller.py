@@ -1,4 +1,11 @@
 from app.cores.database import books_collection, transactions_collection
+from app.cores.loader import get_loader
+from app.cores.search_index import catalogue_index, find_ranked, tokenize
+from app.cores.suggestion_index import suggestion_index
+from app.cores.vector_index import vector_index
+from app.cores.recommender import recommender
+from app.cores.popularity import popularity, transactions_pipeline
+from app.cores.config import settings
 from app.schemas.search_schema import AdvancedSearchRequest
 from fastapi import HTTPException, status
 from bson import ObjectId
@@ -37,6 +44,13 @@ async def advanced_search(search_params: AdvancedSearchRequest):
         book["id"] = str(book.pop("_id"))
         books.append(book)
     
+    # The substring regexes decide what matches; the index only orders
+    # title/author matches by relevance (index misses keep their place last)
+    text = " ".join(t for t in [search_params.title, search_params.author] if t)
+    if text and catalogue_index.ready:
+        scores = catalogue_index.match(text)
+        books.sort(key=lambda book: scores.get(book["id"], 0.0), reverse=True)
+    
     return {
         "books": books,
         "total": len(books)
@@ -47,6 +61,18 @@ async def get_suggestions(query: str, suggestion_type: str = "all"):
     if len(query) < 2:
         return {"suggestions": [], "type": suggestion_type}
     
+    if suggestion_index.ready:
+        # Served from memory, most borrowed first
+        suggestions = []
+        for field, group in [("title", "titles"), ("author", "authors"), ("category", "categories")]:
+            if suggestion_type in ["all", group]:
+                suggestions.extend(suggestion_index.suggest(query, field, 5))
+        
+        return {
+            "suggestions": list(dict.fromkeys(suggestions))[:10],
+            "type": suggestion_type
+        }
+    
     suggestions = []
     
     if suggestion_type in ["all", "titles"]:
@@ -75,58 +101,96 @@ async def get_suggestions(query: str, suggestion_type: str = "all"):
         "type": suggestion_type
     }
 
-async def get_ai_recommendations(member_id: str):
-    """Get personalized book recommendations (rule-based)"""
+async def get_ai_recommendations(member_id: str, limit: int = 10):
+    """Get personalized book recommendations from co-borrow neighbours"""
     if not ObjectId.is_valid(member_id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid member ID"
         )
     
-    # Get member's borrowing history
-    borrowed_books = []
-    async for transaction in transactions_collection.find({"member_id": member_id}):
-        book = await books_collection.find_one({"_id": ObjectId(transaction["book_id"])})
-        if book:
-            borrowed_books.append(book)
+    # Member's borrowing history, newest first
+    history = []
+    cursor = transactions_collection.find({"member_id": member_id}, {"book_id": 1}).sort("borrow_date", -1)
+    async for transaction in cursor:
+        history.append(transaction["book_id"])
     
-    if not borrowed_books:
+    if not history:
         # No history, recommend popular books
-        return await get_popular_books()
+        return await get_popular_books(limit)
     
-    # Get categories and authors from history
-    categories = list(set([book["category"] for book in borrowed_books if "category" in book]))
-    authors = list(set([book["author"] for book in borrowed_books if "author" in book]))
+    borrowed_ids = set(history)
+    recent = list(dict.fromkeys(history))[:settings.RECOMMENDATION_RECENT_LOANS]
     
-    # Find similar books
-    query = {
-        "$or": [
-            {"category": {"$in": categories}},
-            {"author": {"$in": authors}}
-        ]
-    }
+    if recommender.ready:
+        ranked = recommender.recommend(recent, borrowed_ids, limit)
+    else:
+        # Model not built yet, fall back to same category/author picks
+        ranked = await _similar_by_metadata(recent, borrowed_ids, limit)
+    
+    found = await get_loader().load_many(books_collection, recent + [book_id for book_id, _ in ranked])
+    recent_books = [found[book_id] for book_id in recent if book_id in found]
     
     recommendations = []
-    cursor = books_collection.find(query).limit(10)
-    async for book in cursor:
-        # Exclude already borrowed books
-        if str(book["_id"]) not in [str(b["_id"]) for b in borrowed_books]:
+    for book_id, score in ranked:
+        if book_id in found:
+            book = dict(found[book_id])
             book["id"] = str(book.pop("_id"))
+            book["recommendation_score"] = round(score, 4)
             recommendations.append(book)
     
     return {
         "recommendations": recommendations,
         "based_on": {
-            "categories": categories,
-            "authors": authors
+            "categories": list(dict.fromkeys(b["category"] for b in recent_books if b.get("category"))),
+            "authors": list(dict.fromkeys(b["author"] for b in recent_books if b.get("author")))
         }
     }
 
+async def _similar_by_metadata(recent: list, exclude: set, limit: int):
+    """Unranked books sharing a category or author with recent loans"""
+    books = (await get_loader().load_many(books_collection, recent)).values()
+    categories = list({book["category"] for book in books if book.get("category")})
+    authors = list({book["author"] for book in books if book.get("author")})
+    
+    query = {
+        "$or": [
+            {"category": {"$in": categories}},
+            {"author": {"$in": authors}}
+        ],
+        "_id": {"$nin": [ObjectId(i) for i in exclude if ObjectId.is_valid(i)]}
+    }
+    
+    ranked = []
+    async for book in books_collection.find(query, {"_id": 1}).limit(limit):
+        ranked.append((str(book["_id"]), 0.0))
+    return ranked
+
 async def semantic_search(query: str):
-    """Semantic search (simplified text-based version)"""
-    # In a full implementation, this would use vector embeddings
-    # For now, we'll do a comprehensive text search
+    """Semantic search over hashed TF-IDF embeddings of title, description and category"""
+    # Rank the whole catalogue first, then cut to the best 20. Vector
+    # similarity is preferred; BM25 covers the window before it is built.
+    # Queries with no indexable words (e.g. only stopwords) use the regexes
+    hits = None
+    if tokenize(query) and vector_index.ready:
+        hits = vector_index.search(query, k=20)
+    elif tokenize(query) and catalogue_index.ready:
+        hits = catalogue_index.search(query, limit=20)
+    
+    if hits is not None:
+        scores = dict(hits)
+        books, _ = await find_ranked(books_collection, [book_id for book_id, _ in hits])
+        for book in books:
+            book["id"] = str(book.pop("_id"))
+            book["relevance_score"] = round(scores[book["id"]], 4)
+        
+        return {
+            "books": books,
+            "query": query,
+            "total": len(books)
+        }
     
+    # Indexes not built yet, fall back to a comprehensive text search
     search_query = {
         "$or": [
             {"title": {"$regex": query, "$options": "i"}},
@@ -163,27 +227,28 @@ async def semantic_search(query: str):
         "total": len(books)
     }
 
-async def get_popular_books(limit: int = 10):
+async def get_popular_books(limit: int = 10, window: str = "all"):
     """Get most borrowed books"""
-    # Aggregate transactions to find most borrowed books
-    pipeline = [
-        {"$group": {"_id": "$book_id", "borrow_count": {"$sum": 1}}},
-        {"$sort": {"borrow_count": -1}},
-        {"$limit": limit}
-    ]
+    counts = popularity.top(window, limit)
+    if counts is None:
+        # Counters not loaded yet, aggregate transactions directly
+        counts = [
+            (result["_id"], result["borrow_count"])
+            async for result in transactions_collection.aggregate(transactions_pipeline(window, limit))
+        ]
     
-    popular_book_ids = []
-    async for result in transactions_collection.aggregate(pipeline):
-        popular_book_ids.append(result["_id"])
+    found = await get_loader().load_many(books_collection, [book_id for book_id, _ in counts])
     
     books = []
-    for book_id in popular_book_ids:
-        book = await books_collection.find_one({"_id": ObjectId(book_id)})
-        if book:
+    for book_id, borrow_count in counts:
+        if book_id in found:
+            book = dict(found[book_id])
             book["id"] = str(book.pop("_id"))
+            book["borrow_count"] = borrow_count
             books.append(book)
     
     return {
         "popular_books": books,
+        "window": window,
         "total": len(books)
     }
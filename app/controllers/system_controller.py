@@ -1,9 +1,15 @@
-from app.cores.database import system_settings_collection, users_collection, db
+from app.cores.database import system_settings_collection, users_collection
+from app.cores.health import health_monitor
+from app.cores.password_hasher import password_hasher
+from app.cores.snapshot import SNAPSHOT_TABLES, export_snapshot
+from app.cores.jobs import report_jobs, JobQueueFull
 from app.schemas.system_schema import SettingUpdate, StaffCreate
-from app.utils.utils import hash_password
 from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from bson import ObjectId
 from datetime import datetime
+from typing import List, Optional
 
 async def get_settings():
     """Get all system settings"""
@@ -47,30 +53,23 @@ async def update_settings(setting_data: SettingUpdate):
         "key": setting_data.key
     }
 
+async def liveness_check():
+    """Process is up and its event loop is not blocked (no database access)"""
+    result = health_monitor.liveness()
+    code = status.HTTP_200_OK if result["status"] == "ok" else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(jsonable_encoder(result), status_code=code)
+
 async def health_check():
-    """Check system health and database connectivity"""
-    try:
-        # Check database connection
-        await db.command("ping")
-        db_status = "healthy"
-    except Exception as e:
-        db_status = "unhealthy"
-    
-    # Get collection counts
-    collections_status = {}
-    try:
-        collections_status["users"] = await users_collection.count_documents({})
-        collections_status["books"] = await db["books"].count_documents({})
-        collections_status["transactions"] = await db["transactions"].count_documents({})
-    except Exception:
-        collections_status = {"error": "Unable to fetch counts"}
-    
-    return {
-        "status": "healthy" if db_status == "healthy" else "degraded",
-        "database": db_status,
-        "collections": collections_status,
-        "timestamp": datetime.utcnow()
-    }
+    """Ready to serve: MongoDB answered a (cached) ping"""
+    result = await health_monitor.readiness()
+    healthy = result["database"] == "healthy"
+    body = {"status": "healthy" if healthy else "unavailable", **result}
+    code = status.HTTP_200_OK if healthy else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(jsonable_encoder(body), status_code=code)
+
+async def health_diagnostics():
+    """Collection sizes, connection pool and missing indexes (cached)"""
+    return await health_monitor.diagnostics()
 
 async def list_staff():
     """List all staff members (admin and librarian)"""
@@ -106,7 +105,7 @@ async def add_staff(staff_data: StaffCreate):
     # Create staff user
     user_doc = {
         "email": staff_data.email,
-        "password_hash": hash_password(staff_data.password),
+        "password_hash": await password_hasher.hash(staff_data.password),
         "full_name": staff_data.full_name,
         "role": staff_data.role,
         "is_active": True,
@@ -120,3 +119,36 @@ async def add_staff(staff_data: StaffCreate):
         "user_id": str(result.inserted_id),
         "role": staff_data.role
     }
+
+async def _run_snapshot(tables: Optional[List[str]] = None, full: bool = False):
+    return await export_snapshot(tables, incremental=not full)
+
+report_jobs.register("snapshot", _run_snapshot)
+
+async def create_snapshot(tables: Optional[List[str]] = None, full: bool = False):
+    """Start a Parquet export for offline analytics as a background job"""
+    unknown = set(tables or []) - set(SNAPSHOT_TABLES)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown snapshot tables: {', '.join(sorted(unknown))}"
+        )
+    
+    # A request identical to a running export joins it; finished ones are not reused
+    try:
+        return await report_jobs.submit("snapshot", {"tables": sorted(tables) if tables else None, "full": full}, reuse_finished=False)
+    except JobQueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many jobs queued, try again shortly"
+        )
+
+async def get_snapshot_job(job_id: str):
+    """Get a snapshot job's status, and its result once finished"""
+    job = await report_jobs.get(job_id)
+    if not job or job["report"] != "snapshot":
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Snapshot job not found or expired"
+        )
+    return job
@@ -1,10 +1,23 @@
-from app.cores.database import transactions_collection, books_collection, members_collection, fines_collection
+from app.cores.database import (
+    transactions_collection, books_collection, members_collection, fines_collection,
+    book_popularity_collection, run_in_transaction
+)
+from app.cores.loader import get_loader
+from app.cores.search_index import catalogue_index, find_ranked, tokenize
+from app.cores.suggestion_index import suggestion_index
+from app.cores.popularity import borrow_updates
 from app.schemas.transaction_schema import BorrowRequest, ReturnRequest
 from app.utils.utils import calculate_fine
 from app.cores.config import settings
+from app.utils.pagination import keyset_query, sort_spec, next_cursor, cached_count
 from fastapi import HTTPException, status
 from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
 from datetime import datetime, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
 
 async def borrow_book(borrow_data: BorrowRequest):
     """Borrow a book"""
@@ -23,42 +36,90 @@ async def borrow_book(borrow_data: BorrowRequest):
             detail=eligibility["reason"]
         )
     
-    # Check book availability
-    book = await books_collection.find_one({"_id": ObjectId(borrow_data.book_id)})
-    if not book:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Book not found"
-        )
-    
-    if book["available_copies"] <= 0:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Book is not available"
-        )
-    
-    # Create transaction
+    borrow_date = datetime.utcnow()
     transaction_doc = {
         "member_id": borrow_data.member_id,
         "book_id": borrow_data.book_id,
-        "borrow_date": datetime.utcnow(),
-        "due_date": datetime.utcnow() + timedelta(days=settings.LOAN_PERIOD_DAYS),
+        "borrow_date": borrow_date,
+        "due_date": borrow_date + timedelta(days=settings.LOAN_PERIOD_DAYS),
         "return_date": None,
         "status": "borrowed",
         "fine_amount": 0.0
     }
     
-    result = await transactions_collection.insert_one(transaction_doc)
+    async def checkout(session):
+        # Reserve a copy and decrement in one conditional write, so two
+        # concurrent checkouts can never both take the last copy
+        book = await books_collection.find_one_and_update(
+            {"_id": ObjectId(borrow_data.book_id), "available_copies": {"$gt": 0}},
+            {"$inc": {"available_copies": -1}},
+            projection={"_id": 1},
+            session=session
+        )
+        if book is None:
+            return None
+        
+        member_reserved = False
+        try:
+            # Guard the limit again on the counter itself, in case another
+            # desk checked the same member out since the eligibility read
+            member = await members_collection.update_one(
+                {
+                    "_id": ObjectId(borrow_data.member_id),
+                    "$expr": {"$lt": [{"$ifNull": ["$current_borrowed", 0]}, "$max_books_allowed"]}
+                },
+                {"$inc": {"current_borrowed": 1}},
+                session=session
+            )
+            if member.matched_count == 0:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Maximum book limit reached ({eligibility['max_books_allowed']} books)"
+                )
+            member_reserved = True
+            
+            result = await transactions_collection.insert_one({**transaction_doc}, session=session)
+        except (HTTPException, PyMongoError):
+            if session is None:
+                # No transaction to roll back, undo the reservations by hand
+                await books_collection.update_one(
+                    {"_id": ObjectId(borrow_data.book_id)},
+                    {"$inc": {"available_copies": 1}}
+                )
+                if member_reserved:
+                    await members_collection.update_one(
+                        {"_id": ObjectId(borrow_data.member_id)},
+                        {"$inc": {"current_borrowed": -1}}
+                    )
+            raise
+        return result.inserted_id
+    
+    transaction_id = await run_in_transaction(checkout)
+    
+    if transaction_id is None:
+        # Only the failure path pays for a second read to tell the cases apart
+        if not await books_collection.count_documents({"_id": ObjectId(borrow_data.book_id)}, limit=1):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Book not found"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Book is not available"
+        )
     
-    # Update book availability
-    await books_collection.update_one(
-        {"_id": ObjectId(borrow_data.book_id)},
-        {"$inc": {"available_copies": -1}}
-    )
+    suggestion_index.record_borrow(borrow_data.book_id)
+    try:
+        await book_popularity_collection.bulk_write(
+            borrow_updates(borrow_data.book_id, borrow_date), ordered=False
+        )
+    except PyMongoError:
+        # The loan is already committed; a missed count only skews rankings
+        logger.exception("Failed to count borrow of book %s", borrow_data.book_id)
     
     return {
         "message": "Book borrowed successfully",
-        "transaction_id": str(result.inserted_id),
+        "transaction_id": str(transaction_id),
         "due_date": transaction_doc["due_date"]
     }
 
@@ -88,36 +149,80 @@ async def return_book(return_data: ReturnRequest):
     return_date = datetime.utcnow()
     fine_amount = calculate_fine(transaction["due_date"], return_date)
     
-    # Update transaction
-    await transactions_collection.update_one(
-        {"_id": ObjectId(return_data.transaction_id)},
-        {
-            "$set": {
-                "return_date": return_date,
-                "status": "returned",
-                "fine_amount": fine_amount
-            }
-        }
-    )
-    
-    # Update book availability
-    await books_collection.update_one(
-        {"_id": ObjectId(transaction["book_id"])},
-        {"$inc": {"available_copies": 1}}
-    )
-    
-    # Create fine record if applicable
-    if fine_amount > 0:
-        fine_doc = {
-            "transaction_id": return_data.transaction_id,
-            "member_id": transaction["member_id"],
-            "amount": fine_amount,
-            "reason": "Overdue return",
-            "status": "pending",
-            "created_at": datetime.utcnow(),
-            "paid_at": None
-        }
-        await fines_collection.insert_one(fine_doc)
+    async def check_in(session):
+        # The status guard makes the return idempotent: a second concurrent
+        # return of the same loan matches nothing and changes no counters
+        result = await transactions_collection.update_one(
+            {"_id": ObjectId(return_data.transaction_id), "status": {"$ne": "returned"}},
+            {
+                "$set": {
+                    "return_date": return_date,
+                    "status": "returned",
+                    "fine_amount": fine_amount
+                }
+            },
+            session=session
+        )
+        if result.modified_count == 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Book already returned"
+            )
+        
+        book_released = member_updated = False
+        try:
+            # Update book availability
+            await books_collection.update_one(
+                {"_id": ObjectId(transaction["book_id"])},
+                {"$inc": {"available_copies": 1}},
+                session=session
+            )
+            book_released = True
+            
+            # Update member circulation counters
+            await members_collection.update_one(
+                {"_id": ObjectId(transaction["member_id"])},
+                {"$inc": {"current_borrowed": -1, "pending_fine_total": fine_amount}},
+                session=session
+            )
+            member_updated = True
+            
+            # Create fine record if applicable
+            if fine_amount > 0:
+                fine_doc = {
+                    "transaction_id": return_data.transaction_id,
+                    "member_id": transaction["member_id"],
+                    "amount": fine_amount,
+                    "reason": "Overdue return",
+                    "status": "pending",
+                    "created_at": return_date,
+                    "paid_at": None
+                }
+                await fines_collection.insert_one(fine_doc, session=session)
+        except PyMongoError:
+            if session is None:
+                # No transaction to roll back, undo the check-in by hand
+                await transactions_collection.update_one(
+                    {"_id": ObjectId(return_data.transaction_id), "status": "returned"},
+                    {"$set": {
+                        "return_date": transaction.get("return_date"),
+                        "status": transaction["status"],
+                        "fine_amount": transaction.get("fine_amount", 0.0)
+                    }}
+                )
+                if book_released:
+                    await books_collection.update_one(
+                        {"_id": ObjectId(transaction["book_id"])},
+                        {"$inc": {"available_copies": -1}}
+                    )
+                if member_updated:
+                    await members_collection.update_one(
+                        {"_id": ObjectId(transaction["member_id"])},
+                        {"$inc": {"current_borrowed": 1, "pending_fine_total": -fine_amount}}
+                    )
+            raise
+    
+    await run_in_transaction(check_in)
     
     return {
         "message": "Book returned successfully",
@@ -128,14 +233,16 @@ async def return_book(return_data: ReturnRequest):
 async def get_transaction_history(
     member_id: str = None,
     page: int = 1,
-    page_size: int = None
+    page_size: int = None,
+    cursor: str = None,
+    include_total: bool = True
 ):
-    """Get transaction history"""
+    """Get transaction history (offset or keyset on borrow_date via `cursor`)"""
     if page_size is None:
         page_size = settings.DEFAULT_PAGE_SIZE
     
     page_size = min(page_size, settings.MAX_PAGE_SIZE)
-    skip = (page - 1) * page_size
+    skip = 0 if cursor else (page - 1) * page_size
     
     query = {}
     if member_id:
@@ -146,13 +253,17 @@ async def get_transaction_history(
             )
         query["member_id"] = member_id
     
-    total = await transactions_collection.count_documents(query)
+    total = await cached_count(transactions_collection, query) if include_total else None
+    
+    page_cursor = transactions_collection.find(keyset_query(query, "borrow_date", -1, cursor)).sort(sort_spec("borrow_date", -1))
+    transactions = await page_cursor.skip(skip).limit(page_size).to_list(length=page_size)
+    following = next_cursor(transactions, "borrow_date", page_size)
     
-    transactions = []
-    cursor = transactions_collection.find(query).sort("borrow_date", -1).skip(skip).limit(page_size)
-    async for transaction in cursor:
-        # Get book details
-        book = await books_collection.find_one({"_id": ObjectId(transaction["book_id"])})
+    # Get book details for the whole page in one query
+    books = await get_loader().load_many(books_collection, [t["book_id"] for t in transactions])
+    
+    for transaction in transactions:
+        book = books.get(transaction["book_id"])
         
         transaction["id"] = str(transaction.pop("_id"))
         if book:
@@ -160,13 +271,13 @@ async def get_transaction_history(
                 "title": book["title"],
                 "author": book["author"]
             }
-        transactions.append(transaction)
     
     return {
         "transactions": transactions,
         "total": total,
         "page": page,
-        "page_size": page_size
+        "page_size": page_size,
+        "next_cursor": following
     }
 
 async def get_overdue_transactions():
@@ -178,12 +289,16 @@ async def get_overdue_transactions():
         "due_date": {"$lt": current_date}
     }
     
-    transactions = []
-    cursor = transactions_collection.find(query).sort("due_date", 1)
-    async for transaction in cursor:
-        # Get member and book details
-        member = await members_collection.find_one({"_id": ObjectId(transaction["member_id"])})
-        book = await books_collection.find_one({"_id": ObjectId(transaction["book_id"])})
+    transactions = await transactions_collection.find(query).sort("due_date", 1).to_list(length=None)
+    
+    # Get member and book details
+    loader = get_loader()
+    members = await loader.load_many(members_collection, [t["member_id"] for t in transactions])
+    books = await loader.load_many(books_collection, [t["book_id"] for t in transactions])
+    
+    for transaction in transactions:
+        member = members.get(transaction["member_id"])
+        book = books.get(transaction["book_id"])
         
         # Calculate current fine
         current_fine = calculate_fine(transaction["due_date"], current_date)
@@ -201,8 +316,6 @@ async def get_overdue_transactions():
                 "title": book["title"],
                 "author": book["author"]
             }
-        
-        transactions.append(transaction)
     
     return {
         "overdue_transactions": transactions,
@@ -213,15 +326,26 @@ async def search_available_books(search: str = None, category: str = None):
     """Search for available books"""
     query = {"available_copies": {"$gt": 0}}
     
+    if category:
+        query["category"] = category
+    
+    # Queries with no indexable words (e.g. only stopwords) use the regex path
+    if search and catalogue_index.ready and tokenize(search):
+        ranked = [book_id for book_id, _ in catalogue_index.search(search)]
+        books, total = await find_ranked(books_collection, ranked, query)
+        for book in books:
+            book["id"] = str(book.pop("_id"))
+        return {
+            "available_books": books,
+            "total": total
+        }
+    
     if search:
         query["$or"] = [
             {"title": {"$regex": search, "$options": "i"}},
             {"author": {"$regex": search, "$options": "i"}}
         ]
     
-    if category:
-        query["category"] = category
-    
     books = []
     cursor = books_collection.find(query)
     async for book in cursor:
@@ -249,6 +373,11 @@ async def check_member_eligibility(member_id: str):
             detail="Member not found"
         )
     
+    # Members created before the counters existed are rebuilt once on first read
+    if "current_borrowed" not in member or "pending_fine_total" not in member:
+        await reconcile_member_counters(member_id)
+        member = await members_collection.find_one({"_id": ObjectId(member_id)})
+    
     # Check if member is active
     if not member.get("is_active", False):
         return {
@@ -271,11 +400,8 @@ async def check_member_eligibility(member_id: str):
             "pending_fines": 0.0
         }
     
-    # Count current borrowed books
-    current_borrowed = await transactions_collection.count_documents({
-        "member_id": member_id,
-        "status": "borrowed"
-    })
+    current_borrowed = member.get("current_borrowed", 0)
+    pending_fine_total = round(member.get("pending_fine_total", 0.0), 2)
     
     # Check book limit
     if current_borrowed >= member["max_books_allowed"]:
@@ -289,23 +415,14 @@ async def check_member_eligibility(member_id: str):
         }
     
     # Check pending fines
-    pending_fines_cursor = fines_collection.find({
-        "member_id": member_id,
-        "status": "pending"
-    })
-    
-    total_pending_fines = 0.0
-    async for fine in pending_fines_cursor:
-        total_pending_fines += fine["amount"]
-    
-    if total_pending_fines > 0:
+    if pending_fine_total > 0:
         return {
             "member_id": member_id,
             "is_eligible": False,
-            "reason": f"Pending fines: ${total_pending_fines:.2f}. Please clear fines before borrowing.",
+            "reason": f"Pending fines: ${pending_fine_total:.2f}. Please clear fines before borrowing.",
             "current_books_borrowed": current_borrowed,
             "max_books_allowed": member["max_books_allowed"],
-            "pending_fines": total_pending_fines
+            "pending_fines": pending_fine_total
         }
     
     # Member is eligible
@@ -317,3 +434,49 @@ async def check_member_eligibility(member_id: str):
         "max_books_allowed": member["max_books_allowed"],
         "pending_fines": 0.0
     }
+
+async def reconcile_member_counters(member_id: str = None):
+    """Rebuild current_borrowed and pending_fine_total from transactions and fines"""
+    transaction_match = {"status": "borrowed"}
+    fine_match = {"status": "pending"}
+    member_query = {}
+    if member_id:
+        transaction_match["member_id"] = member_id
+        fine_match["member_id"] = member_id
+        member_query["_id"] = ObjectId(member_id)
+    
+    borrowed = {}
+    async for result in transactions_collection.aggregate([
+        {"$match": transaction_match},
+        {"$group": {"_id": "$member_id", "count": {"$sum": 1}}}
+    ]):
+        borrowed[result["_id"]] = result["count"]
+    
+    pending = {}
+    async for result in fines_collection.aggregate([
+        {"$match": fine_match},
+        {"$group": {"_id": "$member_id", "total": {"$sum": "$amount"}}}
+    ]):
+        pending[result["_id"]] = result["total"]
+    
+    updated = 0
+    batch = []
+    async for member in members_collection.find(member_query, {"_id": 1}):
+        key = str(member["_id"])
+        batch.append(UpdateOne(
+            {"_id": member["_id"]},
+            {"$set": {
+                "current_borrowed": borrowed.get(key, 0),
+                "pending_fine_total": pending.get(key, 0.0)
+            }}
+        ))
+        if len(batch) >= 1000:
+            updated += (await members_collection.bulk_write(batch, ordered=False)).matched_count
+            batch = []
+    if batch:
+        updated += (await members_collection.bulk_write(batch, ordered=False)).matched_count
+    
+    return {
+        "message": "Member counters reconciled",
+        "members_updated": updated
+    }
@@ -0,0 +1,163 @@
+from app.cores.config import settings
+from app.cores.database import books_collection, members_collection, transactions_collection
+from datetime import datetime, timedelta
+from typing import Optional
+import numpy as np
+import pandas as pd
+import asyncio
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+DEAD_STOCK_SAMPLE = 20
+
+async def _columns(collection, query: dict, fields: list) -> dict:
+    """Read `fields` of every matching document into per-column lists"""
+    columns = {field: [] for field in ["_id"] + fields}
+    projection = {field: 1 for field in fields}
+    async for doc in collection.find(query, projection).batch_size(settings.ANALYTICS_BATCH_SIZE):
+        for field, values in columns.items():
+            values.append(doc.get(field))
+    columns["_id"] = [str(i) for i in columns["_id"]]
+    return columns
+
+def _rate(numerator, denominator) -> float:
+    return round(float(numerator) / float(denominator), 4) if denominator else 0.0
+
+def _compute(loans: dict, books: dict, members: dict, now: datetime, window_start: Optional[datetime]) -> dict:
+    """All dashboard metrics from columnar snapshots, vectorized with pandas"""
+    loans = pd.DataFrame(loans)
+    books = pd.DataFrame(books)
+    members = pd.DataFrame(members)
+    for column in ("borrow_date", "due_date", "return_date"):
+        loans[column] = pd.to_datetime(loans[column], errors="coerce")
+    books["category"] = books["category"].fillna("Unknown")
+    books["total_copies"] = pd.to_numeric(books["total_copies"], errors="coerce").fillna(1)
+    books["available_copies"] = pd.to_numeric(books["available_copies"], errors="coerce").fillna(0)
+    members["membership_type"] = members["membership_type"].fillna("unknown")
+
+    loans["category"] = loans["book_id"].map(books.set_index("_id")["category"]).fillna("Unknown")
+    loans["membership_type"] = loans["member_id"].map(members.set_index("_id")["membership_type"]).fillna("unknown")
+
+    # Open loans are pulled whatever their age; window metrics use the rest
+    in_window = loans["borrow_date"] >= window_start if window_start else loans["borrow_date"].notna()
+    window = loans[in_window]
+    active = loans["status"].ne("returned")
+
+    # Turnover: loans per copy held, by category
+    loans_by_category = window.groupby("category").size()
+    copies_by_category = books.groupby("category")["total_copies"].sum()
+    turnover = (loans_by_category.reindex(copies_by_category.index, fill_value=0) / copies_by_category.replace(0, np.nan))
+    turnover = turnover.fillna(0).round(3).sort_values(ascending=False)
+
+    # Loan duration in days for returned loans
+    duration = (window["return_date"] - window["borrow_date"]).dt.total_seconds().dropna() / 86400
+    duration = duration[duration >= 0]
+
+    # Overdue rate among loans already past their due date
+    matured = window[window["due_date"] < now]
+    late = matured["return_date"].isna() | (matured["return_date"] > matured["due_date"])
+    overdue_by_type = late.groupby(matured["membership_type"]).agg(["sum", "count"])
+
+    # Demand curves by borrow time (UTC)
+    weekday = window["borrow_date"].dt.dayofweek.value_counts().reindex(range(7), fill_value=0)
+    hour = window["borrow_date"].dt.hour.value_counts().reindex(range(24), fill_value=0)
+
+    # Dead stock: titles older than the window that nobody borrowed in it
+    borrowed = set(window["book_id"].dropna())
+    created = pd.to_datetime(books["created_at"], errors="coerce")
+    old_enough = created.isna() | (created < window_start) if window_start else pd.Series(True, index=books.index)
+    dead = books[~books["_id"].isin(borrowed) & old_enough]
+
+    active_borrows = int(active.sum())
+    total_books = len(books)
+    return {
+        "total_books": total_books,
+        "available_books": int((books["available_copies"] > 0).sum()),
+        "utilization_rate": round(active_borrows / total_books * 100, 2) if total_books else 0,
+        "active_borrows": active_borrows,
+        "total_members": len(members),
+        "most_popular_category": loans_by_category.idxmax() if len(loans_by_category) else "N/A",
+        "window_loans": len(window),
+        "turnover_by_category": turnover.to_dict(),
+        "loan_duration_days": {
+            "median": round(float(duration.median()), 2) if len(duration) else None,
+            "p90": round(float(duration.quantile(0.9)), 2) if len(duration) else None,
+            "returned_loans": len(duration)
+        },
+        "overdue_rate": _rate(late.sum(), len(matured)),
+        "overdue_rate_by_membership_type": {
+            membership_type: _rate(row["sum"], row["count"])
+            for membership_type, row in overdue_by_type.iterrows()
+        },
+        "demand_by_weekday": dict(zip(WEEKDAYS, weekday.astype(int).tolist())),
+        "demand_by_hour": {f"{h:02d}:00": int(n) for h, n in hour.items()},
+        "dead_stock": {
+            "count": len(dead),
+            "share": _rate(len(dead), total_books),
+            "by_category": dead.groupby("category").size().sort_values(ascending=False).astype(int).to_dict(),
+            "sample": [
+                {"book_id": row["_id"], "title": row["title"], "category": row["category"]}
+                for _, row in dead.sort_values("created_at", na_position="first").head(DEAD_STOCK_SAMPLE).iterrows()
+            ]
+        }
+    }
+
+def _insights(metrics: dict) -> list:
+    insights = []
+    if metrics["utilization_rate"] > 70:
+        insights.append("High book utilization! Consider expanding the collection.")
+    elif metrics["utilization_rate"] < 30:
+        insights.append("Low book utilization. Consider marketing campaigns to increase borrowing.")
+
+    if metrics["available_books"] < metrics["total_books"] * 0.2:
+        insights.append("Low book availability. Many books are currently borrowed.")
+
+    if metrics["overdue_rate"] > 0.2:
+        insights.append(f"{metrics['overdue_rate']:.0%} of loans come back late. Consider reminder emails before the due date.")
+
+    if metrics["dead_stock"]["share"] > 0.3:
+        insights.append(f"{metrics['dead_stock']['count']} titles were not borrowed in the analysis window. Consider weeding or promoting them.")
+
+    busiest = max(metrics["demand_by_weekday"], key=metrics["demand_by_weekday"].get) if metrics["window_loans"] else None
+    if busiest:
+        insights.append(f"{busiest} is the busiest day for checkouts; staff the desk accordingly.")
+    return insights
+
+class AnalyticsEngine:
+    """Dashboard metrics computed from columnar snapshots, served from memory.
+
+    Every ANALYTICS_REFRESH_SECONDS the engine reads the loans of the last
+    ANALYTICS_WINDOW_DAYS (plus any still open), the books and the members
+    column by column, computes all metrics with pandas in a worker thread
+    and swaps the result in. Requests only read the cached payload.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.payload: Optional[dict] = None
+
+    async def refresh(self):
+        """Re-read the snapshot and recompute every metric"""
+        now = datetime.utcnow()
+        window_start = now - timedelta(days=settings.ANALYTICS_WINDOW_DAYS) if settings.ANALYTICS_WINDOW_DAYS else None
+        loan_query = {"$or": [{"borrow_date": {"$gte": window_start}}, {"status": {"$ne": "returned"}}]} if window_start else {}
+
+        loans = await _columns(transactions_collection, loan_query, [
+            "book_id", "member_id", "borrow_date", "due_date", "return_date", "status"
+        ])
+        books = await _columns(books_collection, {}, [
+            "title", "category", "total_copies", "available_copies", "created_at"
+        ])
+        members = await _columns(members_collection, {}, ["membership_type"])
+        total_transactions = await transactions_collection.estimated_document_count()
+
+        metrics = await asyncio.to_thread(_compute, loans, books, members, now, window_start)
+        metrics["total_transactions"] = total_transactions
+        self.payload = {
+            "analytics": metrics,
+            "insights": _insights(metrics),
+            "window": {"start": window_start, "end": now},
+            "generated_at": now
+        }
+        self.ready = True
+
+analytics_engine = AnalyticsEngine()
@@ -0,0 +1,20 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+async def refresh_periodically(name: str, refresh, interval_seconds: int):
+    """Run `refresh()` now and then every `interval_seconds` (0 = once).
+
+    Failures are logged and retried on the next tick so one bad refresh
+    never kills the background task.
+    """
+    while True:
+        try:
+            await refresh()
+            logger.info("%s refreshed", name)
+        except Exception:
+            logger.exception("%s refresh failed", name)
+        if interval_seconds <= 0:
+            return
+        await asyncio.sleep(interval_seconds)
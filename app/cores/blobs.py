@@ -0,0 +1,177 @@
+from app.cores.config import settings
+from app.cores.database import ebook_blobs_collection, ebook_passages_collection, ebooks_collection, books_collection
+from app.cores.storage import COVER_URL_PREFIX, STORAGE_BACKENDS, get_storage, hash_upload
+from fastapi import HTTPException, status, UploadFile
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Tuple
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Stored files younger than this may belong to an upload still in flight
+ORPHAN_GRACE = timedelta(hours=1)
+
+def blob_location(blob: dict) -> Tuple[str, str]:
+    """(backend name, location) of a blob; blobs from before pluggable storage are GridFS file IDs"""
+    return blob.get("backend", "gridfs"), blob.get("location") or str(blob["file_id"])
+
+class BlobStore:
+    """Content-addressed, reference-counted e-book files.
+
+    Every distinct file is stored once, in the storage backend it was first
+    uploaded to, and recorded in the ebook_blobs collection under its
+    SHA-256 digest with the number of e-books pointing at it. Uploading a file that is already stored only
+    bumps the count; releasing the last reference deletes the file.
+    """
+
+    async def _acquire(self, digest: str):
+        return await ebook_blobs_collection.find_one_and_update(
+            {"_id": digest},
+            {"$inc": {"ref_count": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def put(self, file: UploadFile) -> Tuple[dict, bool]:
+        """Take a reference on the blob holding `file`, storing it if new.
+
+        Returns the blob and whether an existing copy was reused.
+        """
+        digest, size = await hash_upload(file, settings.EBOOK_MAX_UPLOAD_MB)
+        blob = await self._acquire(digest)
+        if blob:
+            return blob, True
+
+        storage = get_storage()
+        location = await storage.write("ebooks", file, digest, file.content_type)
+        blob = {
+            "_id": digest,
+            "backend": storage.name,
+            "location": location,
+            "size_bytes": size,
+            "ref_count": 1,
+            "created_at": datetime.utcnow()
+        }
+        try:
+            await ebook_blobs_collection.insert_one(blob)
+            return blob, False
+        except DuplicateKeyError:
+            # A concurrent upload of the same file won; use its copy
+            blob = await self._acquire(digest)
+            if blob is None or blob_location(blob) != (storage.name, location):
+                await storage.delete("ebooks", location)
+            if blob is None:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="File was modified concurrently, please retry the upload"
+                )
+            return blob, True
+
+    async def release(self, digest: str):
+        """Drop one reference; deletes the file when none are left"""
+        await ebook_blobs_collection.update_one({"_id": digest}, {"$inc": {"ref_count": -1}})
+        await self._delete_if_unreferenced(digest)
+
+    async def _delete_if_unreferenced(self, digest: str) -> bool:
+        # Conditional delete so a concurrent put() either keeps the blob alive
+        # or finds it gone and stores a fresh copy
+        blob = await ebook_blobs_collection.find_one_and_delete({"_id": digest, "ref_count": {"$lte": 0}})
+        if not blob:
+            return False
+        backend, location = blob_location(blob)
+        await get_storage(backend).delete("ebooks", location)
+        await ebook_passages_collection.delete_many({"sha256": digest})
+        return True
+
+    async def adopt_legacy(self) -> int:
+        """Hash e-books uploaded before deduplication and register their files as blobs.
+
+        Duplicates among them are pointed at a single copy and the extra
+        GridFS files deleted. Returns the number of e-books adopted.
+        """
+        gridfs = get_storage("gridfs")
+        adopted = 0
+        async for ebook in ebooks_collection.find({"sha256": {"$exists": False}, "file_id": {"$exists": True}}):
+            file_id = ebook["file_id"]
+            digest = hashlib.sha256()
+            size = 0
+            try:
+                async for chunk in gridfs.read("ebooks", file_id):
+                    digest.update(chunk)
+                    size += len(chunk)
+            except HTTPException:
+                logger.warning("E-book %s points at missing file %s", ebook["_id"], file_id)
+                continue
+            digest = digest.hexdigest()
+
+            blob = await self._acquire(digest)
+            if blob is None:
+                blob = {
+                    "_id": digest,
+                    "backend": "gridfs",
+                    "location": file_id,
+                    "size_bytes": size,
+                    "ref_count": 1,
+                    "created_at": datetime.utcnow()
+                }
+                await ebook_blobs_collection.insert_one(blob)
+            backend, location = blob_location(blob)
+            await ebooks_collection.update_one({"_id": ebook["_id"]}, {"$set": {
+                "file_id": location,
+                "storage": backend,
+                "sha256": digest,
+                "size_bytes": blob["size_bytes"]
+            }})
+            if (backend, location) != ("gridfs", file_id):
+                await gridfs.delete("ebooks", file_id)
+            adopted += 1
+        return adopted
+
+    async def collect_garbage(self) -> dict:
+        """Recount references from the ebooks collection and delete what is unreferenced.
+
+        Fixes counts left wrong by interrupted requests and removes stored
+        e-book and cover files that nothing points at. Meant for maintenance
+        windows: uploads running meanwhile may be miscounted.
+        """
+        counts = {row["_id"]: row["count"] async for row in ebooks_collection.aggregate([
+            {"$match": {"sha256": {"$type": "string"}}},
+            {"$group": {"_id": "$sha256", "count": {"$sum": 1}}}
+        ])}
+
+        recounted = deleted_blobs = 0
+        async for blob in ebook_blobs_collection.find({}, {"ref_count": 1}):
+            actual = counts.get(blob["_id"], 0)
+            if actual != blob["ref_count"]:
+                await ebook_blobs_collection.update_one({"_id": blob["_id"]}, {"$set": {"ref_count": actual}})
+                recounted += 1
+            if actual == 0 and await self._delete_if_unreferenced(blob["_id"]):
+                deleted_blobs += 1
+
+        # Files nothing points at: left behind by interrupted uploads
+        referenced = defaultdict(set)
+        async for blob in ebook_blobs_collection.find({}):
+            backend, location = blob_location(blob)
+            referenced[backend].add(location)
+        async for ebook in ebooks_collection.find({"file_id": {"$exists": True}}, {"file_id": 1, "storage": 1}):
+            referenced[ebook.get("storage", "gridfs")].add(ebook["file_id"])
+        covers = defaultdict(set)
+        async for book in books_collection.find({"cover_image": {"$regex": f"^{COVER_URL_PREFIX}"}}, {"cover_image": 1}):
+            backend, _, location = book["cover_image"][len(COVER_URL_PREFIX):].partition("/")
+            covers[backend].add(location)
+
+        cutoff = datetime.utcnow() - ORPHAN_GRACE
+        deleted_files = 0
+        for backend in STORAGE_BACKENDS:
+            storage = get_storage(backend)
+            deleted_files += await storage.sweep("ebooks", referenced[backend], cutoff)
+            deleted_files += await storage.sweep("covers", covers[backend], cutoff)
+
+        if recounted or deleted_blobs or deleted_files:
+            logger.info("Blob GC: %d recounted, %d blobs and %d orphan files deleted", recounted, deleted_blobs, deleted_files)
+        return {"recounted": recounted, "deleted_blobs": deleted_blobs, "deleted_orphan_files": deleted_files}
+
+blob_store = BlobStore()
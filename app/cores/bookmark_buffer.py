@@ -0,0 +1,117 @@
+from app.cores.config import settings
+from app.cores.database import bookmarks_collection
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class BookmarkBuffer:
+    """Write-behind buffer for reading positions.
+
+    Clients save a bookmark on every page turn. Saves only record the
+    latest page per (user, e-book) in memory; every
+    BOOKMARK_FLUSH_INTERVAL_MS, or as soon as BOOKMARK_FLUSH_MAX_ENTRIES
+    are pending, they go to MongoDB in one unordered bulk_write of upserts.
+    Reads check the buffer first. Each upsert only applies if it is newer
+    than what is stored, so flushes from several workers cannot move a
+    bookmark backwards; the unique (user_id, ebook_id) index turns the
+    losing upserts into ignored duplicate-key errors.
+    """
+
+    def __init__(self):
+        self._pending: Dict[Tuple[str, str], Tuple[int, datetime]] = {}
+        # Batch being written: still served to readers until it lands
+        self._inflight: Dict[Tuple[str, str], Tuple[int, datetime]] = {}
+        # E-books deleted while their bookmarks were in flight
+        self._discarded: Set[str] = set()
+        self._flushing: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._runner: Optional[asyncio.Task] = None
+
+    def save(self, user_id: str, ebook_id: str, page_number: int) -> datetime:
+        """Buffer a bookmark; returns its timestamp"""
+        last_read = datetime.utcnow()
+        self._pending[(user_id, ebook_id)] = (page_number, last_read)
+        if len(self._pending) >= settings.BOOKMARK_FLUSH_MAX_ENTRIES and (self._flushing is None or self._flushing.done()):
+            self._flushing = asyncio.create_task(self.flush())
+        return last_read
+
+    def get(self, user_id: str, ebook_id: str) -> Optional[Tuple[int, datetime]]:
+        """(page_number, last_read) of a bookmark not yet flushed, or None"""
+        key = (user_id, ebook_id)
+        return self._pending.get(key) or self._inflight.get(key)
+
+    def discard_ebook(self, ebook_id: str):
+        """Forget unflushed bookmarks of a deleted e-book"""
+        for key in [key for key in self._pending if key[1] == ebook_id]:
+            del self._pending[key]
+        # A write already sent may land after the caller's delete; the
+        # flush deletes them again once it completes
+        inflight = [key for key in self._inflight if key[1] == ebook_id]
+        for key in inflight:
+            del self._inflight[key]
+        if inflight:
+            self._discarded.add(ebook_id)
+
+    async def flush(self) -> int:
+        """Write every pending bookmark; returns the number written"""
+        async with self._lock:
+            return await self._flush()
+
+    async def _flush(self) -> int:
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, {}
+        self._inflight = batch
+        ops = [
+            UpdateOne(
+                {"user_id": user_id, "ebook_id": ebook_id, "last_read": {"$not": {"$gt": last_read}}},
+                {"$set": {"page_number": page_number, "last_read": last_read}},
+                upsert=True
+            )
+            for (user_id, ebook_id), (page_number, last_read) in batch.items()
+        ]
+        try:
+            await bookmarks_collection.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            # Duplicate keys mean a newer bookmark is already stored
+            failed = [error for error in e.details.get("writeErrors", []) if error.get("code") != 11000]
+            if failed:
+                logger.error("%d bookmark write(s) failed: %s", len(failed), failed[0].get("errmsg"))
+        except PyMongoError:
+            # Put the batch back unless a newer save arrived meanwhile
+            for key, value in batch.items():
+                self._pending.setdefault(key, value)
+            raise
+        finally:
+            self._inflight = {}
+            discarded, self._discarded = self._discarded, set()
+            if discarded:
+                await bookmarks_collection.delete_many({"ebook_id": {"$in": sorted(discarded)}})
+        return len(ops)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.BOOKMARK_FLUSH_INTERVAL_MS / 1000)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Bookmark flush failed")
+
+    def start(self):
+        """Start the periodic flush"""
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the periodic flush and write what is left"""
+        if self._runner is not None:
+            self._runner.cancel()
+            self._runner = None
+        await self.flush()
+
+bookmark_buffer = BookmarkBuffer()
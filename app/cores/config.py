@@ -8,6 +8,13 @@ class Settings(BaseSettings):
     JWT_SECRET: str = "your-secret-key-change-in-production"
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440  # 24 hours
+    PASSWORD_HASH_WORKERS: int = 0  # bcrypt processes, 0 = one per CPU core
+    PASSWORD_HASH_QUEUE_SIZE: int = 64  # Calls allowed to wait for a free process
+    PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS: float = 5.0  # Wait for queue room before answering 503
+    PRINCIPAL_CACHE_SIZE: int = 10000  # Authenticated users kept in memory per worker
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60  # Upper bound on how stale a cached role/is_active can be
+    PRINCIPAL_INVALIDATION_POLL_MS: int = 1000  # How often workers pick up each other's invalidations
+    RESET_TOKEN_EXPIRE_MINUTES: int = 60
     
     # Email Settings (for password reset)
     EMAIL_HOST: str = "smtp.gmail.com"
@@ -19,14 +26,90 @@ class Settings(BaseSettings):
     # Pagination
     DEFAULT_PAGE_SIZE: int = 20
     MAX_PAGE_SIZE: int = 100
+    COUNT_CACHE_SECONDS: int = 30  # How long paginated totals are reused
     
     # Fine Calculation
     FINE_PER_DAY: float = 5.0  # Fine amount per day overdue
     MAX_BOOKS_PER_MEMBER: int = 5
     LOAN_PERIOD_DAYS: int = 14
     
+    # Catalogue search and suggestion indexes
+    SEARCH_INDEX_REFRESH_SECONDS: int = 300  # Full rebuild interval, 0 = build once
+    SEARCH_MAX_CANDIDATES: int = 1000  # Ranked hits checked against filters per MongoDB query
+    
+    # Semantic (vector) search
+    VECTOR_DIM: int = 256  # Embedding width; memory is books x VECTOR_DIM x 4 bytes
+    VECTOR_INDEX_REFRESH_SECONDS: int = 1800
+    VECTOR_IVF_MIN_ROWS: int = 50000  # Use the approximate IVF index above this, 0 = always exact
+    VECTOR_IVF_NPROBE: int = 8  # IVF cells scanned per query
+    
+    # Co-borrow recommendations
+    RECOMMENDATION_REFRESH_SECONDS: int = 3600
+    RECOMMENDATION_NEIGHBOURS: int = 50  # Similar books kept per book
+    RECOMMENDATION_RECENT_LOANS: int = 20  # Latest loans a member's picks are based on
+    RECOMMENDATION_POPULAR_POOL: int = 500  # Most borrowed books kept for cold-start top-up
+    
+    # Rebuilds that must run in one worker at a time (popularity seed, daily stats)
+    REFRESH_LEASE_SECONDS: int = 120  # Renewed while the rebuild runs; taken over if its worker dies
+    
+    # Popular books (rolling-window borrow counters)
+    POPULARITY_REFRESH_SECONDS: int = 300
+    POPULARITY_TOP_K: int = 100  # Books cached per window
+    
+    # Daily circulation rollup (daily_stats)
+    DAILY_STATS_REFRESH_SECONDS: int = 300
+    
+    # Background report jobs
+    REPORT_WORKERS: int = 2
+    REPORT_QUEUE_SIZE: int = 100  # Pending jobs before new ones are refused
+    REPORT_CACHE_SECONDS: int = 300  # How long finished results are reused
+    REPORT_JOB_LEASE_SECONDS: int = 120  # A running job is retried if its worker stops renewing this
+    REPORT_JOB_POLL_SECONDS: float = 1.0  # How often idle workers look for jobs queued by other workers
+    
+    # Raw data export
+    EXPORT_BATCH_SIZE: int = 1000  # Documents per cursor batch
+    
+    # Parquet snapshots for offline analytics
+    SNAPSHOT_DIR: str = "snapshots"
+    SNAPSHOT_BATCH_ROWS: int = 50000  # Rows per Parquet row group
+    
+    # Dashboard analytics engine (/ai/analytics)
+    ANALYTICS_REFRESH_SECONDS: int = 600
+    ANALYTICS_WINDOW_DAYS: int = 365  # Loans analysed, 0 = all history
+    ANALYTICS_BATCH_SIZE: int = 5000
+    
+    # File storage (e-books and covers)
+    STORAGE_BACKEND: str = "gridfs"  # "gridfs" or "local"; existing files stay where they were written
+    STORAGE_LOCAL_DIR: str = "uploads"  # Root of the content-addressed tree for the local backend
+    COVER_MAX_UPLOAD_MB: int = 5
+    EBOOK_MAX_UPLOAD_MB: int = 100  # Uploads are aborted once they pass this size
+    EBOOK_UPLOAD_CHUNK_BYTES: int = 261120  # Read/write unit; matches the GridFS chunk size (255 KiB)
+    
+    # E-book full-text search
+    FULLTEXT_WORKERS: int = 2  # Processes extracting text from uploaded e-books
+    FULLTEXT_SNIPPET_CHARS: int = 200
+    
+    # E-book bookmarks (write-behind buffer)
+    BOOKMARK_FLUSH_INTERVAL_MS: int = 2000
+    BOOKMARK_FLUSH_MAX_ENTRIES: int = 500  # Flush early once this many are pending
+    
+    # Expiring key-value store (reset tokens, chat conversations)
+    KV_BACKEND: str = "mongodb"  # "mongodb" (shared by all workers) or "memory" (single worker only)
+    KV_MEMORY_MAX_ENTRIES: int = 100000  # Least recently used keys are evicted past this
+    KV_MEMORY_SWEEP_SECONDS: int = 30  # How often expired keys are purged from memory
+    
+    # Health probes (/system/health/*)
+    HEALTH_LOOP_LAG_INTERVAL_MS: int = 500  # How often event loop lag is sampled
+    HEALTH_MAX_LOOP_LAG_MS: int = 1000  # A sample above this lag counts as slow
+    HEALTH_LOOP_LAG_SAMPLES: int = 3  # Liveness fails after this many slow samples in a row
+    HEALTH_PING_TIMEOUT_SECONDS: float = 2.0
+    HEALTH_READY_CACHE_SECONDS: int = 5  # Probes within this window reuse the last ping
+    HEALTH_DIAGNOSTICS_CACHE_SECONDS: int = 60
+    
     # AI Settings (optional)
     OPENAI_API_KEY: str = ""
+    CONVERSATION_TTL_SECONDS: int = 86400  # Idle time before a chat conversation is forgotten
+    CONVERSATION_MAX_TURNS: int = 50  # Older turns are dropped
     
     class Config:
         env_file = ".env"
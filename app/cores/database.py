@@ -1,9 +1,75 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from pymongo.errors import OperationFailure
 import motor.motor_asyncio
+import threading
 from app.cores.config import settings
 
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Client-side connection pool counters (shown by /system/health/deep)
+
+    The driver calls listeners from its own threads as well as the event
+    loop's, so every update and read holds a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.checked_out = 0
+        self.waiting = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
+
+    def snapshot(self) -> dict:
+        """Consistent copy of the counters"""
+        with self._lock:
+            return {
+                "open": self.open,
+                "checked_out": self.checked_out,
+                "waiting": self.waiting,
+                "checkout_failures": self.checkout_failures,
+                "pool_clears": self.pool_clears
+            }
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self.waiting += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.checked_out += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+pool_stats = PoolStats()
+
 # MongoDB Client
-client = AsyncIOMotorClient(settings.MONGO_URI)
+client = AsyncIOMotorClient(settings.MONGO_URI, event_listeners=[pool_stats])
 db = client["Library_Management_System"]
 
 # Collections
@@ -15,7 +81,38 @@ fines_collection = db["fines"]
 reservations_collection = db["reservations"]
 ebooks_collection = db["ebooks"]
 bookmarks_collection = db["bookmarks"]
+ebook_blobs_collection = db["ebook_blobs"]
+ebook_passages_collection = db["ebook_passages"]
+book_popularity_collection = db["book_popularity"]
+daily_stats_collection = db["daily_stats"]
 system_settings_collection = db["system_settings"]
+principal_invalidations_collection = db["principal_invalidations"]
+kv_store_collection = db["kv_store"]
+report_jobs_collection = db["report_jobs"]
+leases_collection = db["leases"]
 
 # GridFS for e-book file storage
 fs = motor.motor_asyncio.AsyncIOMotorGridFSBucket(db)
+
+# Flipped to False the first time the server rejects a transaction
+# (standalone mongod without a replica set)
+_transactions_supported = True
+
+async def run_in_transaction(operation):
+    """Run `operation(session)` inside a multi-document transaction.
+
+    The driver retries transient errors and unknown commit results. On a
+    standalone server the operation is called with ``session=None`` and is
+    responsible for compensating its own partial writes.
+    """
+    global _transactions_supported
+    if _transactions_supported:
+        try:
+            async with await client.start_session() as session:
+                return await session.with_transaction(operation)
+        except OperationFailure as e:
+            # IllegalOperation: transaction numbers need a replica set or mongos
+            if e.code != 20:
+                raise
+            _transactions_supported = False
+    return await operation(None)
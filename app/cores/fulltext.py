@@ -0,0 +1,149 @@
+from app.cores.config import settings
+from app.cores.database import ebook_blobs_collection, ebook_passages_collection, ebooks_collection
+from app.cores.blobs import blob_location
+from app.cores.search_index import stem, STOPWORDS
+from app.cores.storage import get_storage
+from app.utils.text_extraction import EXTRACTORS, extract_pages
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import List, Optional
+import asyncio
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"[A-Za-z0-9]+")
+
+def snippet(text: str, query: str, width: int = None) -> str:
+    """Window of `text` around the first word matching a query term"""
+    width = width or settings.FULLTEXT_SNIPPET_CHARS
+    terms = {stem(t) for t in _WORD_RE.findall(query.lower()) if t not in STOPWORDS}
+    position = 0
+    for match in _WORD_RE.finditer(text):
+        word = stem(match.group().lower())
+        # The light stemmer can disagree with MongoDB's ("whales" -> "whal"),
+        # so also accept a shared prefix of four letters or more
+        if word in terms or any(len(word) >= 4 and (t.startswith(word) or word.startswith(t)) for t in terms if len(t) >= 4):
+            position = match.start()
+            break
+    start = max(position - width // 2, 0)
+    end = min(start + width, len(text))
+    # Do not cut words in half
+    if start > 0:
+        start = text.find(" ", start) + 1 or start
+    if end < len(text):
+        cut = text.rfind(" ", start, end)
+        end = cut if cut > start else end
+    return ("..." if start > 0 else "") + text[start:end] + ("..." if end < len(text) else "")
+
+class EbookTextIndexer:
+    """Page-level full text of e-books in the ebook_passages collection.
+
+    Text is extracted per stored file (blob), so identical uploads are
+    indexed once. Extraction runs in a process pool of FULLTEXT_WORKERS so
+    parsing large PDFs never blocks the event loop; passages are searched
+    through a MongoDB text index. The blob records the outcome in
+    text_status: indexing, done, unsupported or failed.
+    """
+
+    def __init__(self):
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks = set()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Spawn fresh interpreters: forking a process that runs the
+            # MongoDB driver's threads can deadlock the children
+            self._pool = ProcessPoolExecutor(
+                max_workers=settings.FULLTEXT_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+            self._slots = asyncio.Semaphore(settings.FULLTEXT_WORKERS)
+        return self._pool
+
+    def schedule(self, digest: str, file_format: str):
+        """Index a newly stored file in the background"""
+        task = asyncio.create_task(self.index(digest, file_format))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _set_status(self, digest: str, text_status: str, **fields):
+        await ebook_blobs_collection.update_one(
+            {"_id": digest},
+            {"$set": {"text_status": text_status, "text_indexed_at": datetime.utcnow(), **fields}}
+        )
+
+    async def _local_copy(self, storage, location: str) -> str:
+        """Spool a stored file to a temporary file the worker can open"""
+        fd, path = tempfile.mkstemp(suffix=".ebook")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async for chunk in storage.read("ebooks", location):
+                    await asyncio.to_thread(f.write, chunk)
+        except BaseException:
+            os.unlink(path)
+            raise
+        return path
+
+    async def index(self, digest: str, file_format: str) -> int:
+        """Extract and store the passages of one blob; returns the page count"""
+        if file_format not in EXTRACTORS:
+            await self._set_status(digest, "unsupported", text_pages=0)
+            return 0
+        blob = await ebook_blobs_collection.find_one({"_id": digest})
+        if not blob:
+            return 0
+
+        executor = self._executor()
+        async with self._slots:
+            await self._set_status(digest, "indexing")
+            backend, location = blob_location(blob)
+            storage = get_storage(backend)
+            # Local files are read in place; anything else is spooled to disk
+            path = storage.path("ebooks", location) if backend == "local" else await self._local_copy(storage, location)
+            try:
+                pages = await asyncio.get_running_loop().run_in_executor(executor, extract_pages, path, file_format)
+            except Exception:
+                logger.exception("Text extraction failed for blob %s", digest)
+                await self._set_status(digest, "failed", text_pages=0)
+                return 0
+            finally:
+                if backend != "local":
+                    os.unlink(path)
+
+        await ebook_passages_collection.delete_many({"sha256": digest})
+        passages = [{"sha256": digest, "page": page, "text": text} for page, text in pages]
+        for start in range(0, len(passages), 500):
+            await ebook_passages_collection.insert_many(passages[start:start + 500], ordered=False)
+
+        if await ebook_blobs_collection.count_documents({"_id": digest}, limit=1) == 0:
+            # Deleted while we were extracting
+            await ebook_passages_collection.delete_many({"sha256": digest})
+            return 0
+        await self._set_status(digest, "done", text_pages=len(passages))
+        return len(passages)
+
+    async def backfill(self, reindex: bool = False) -> List[str]:
+        """Index every blob that has not been indexed yet (all of them with `reindex`)"""
+        query = {} if reindex else {"text_status": {"$nin": ["done", "unsupported"]}}
+        indexed = []
+        async for blob in ebook_blobs_collection.find(query, {"_id": 1}):
+            ebook = await ebooks_collection.find_one({"sha256": blob["_id"]}, {"format": 1})
+            if ebook:
+                await self.index(blob["_id"], ebook["format"])
+                indexed.append(blob["_id"])
+        return indexed
+
+    def shutdown(self):
+        """Cancel pending extractions and stop the worker processes"""
+        for task in self._tasks:
+            task.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+ebook_text_index = EbookTextIndexer()
@@ -0,0 +1,179 @@
+from app.cores.config import settings
+from app.cores.database import client, db, pool_stats
+from datetime import datetime
+from typing import Optional
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Collections counted by the deep diagnostics (estimated from metadata)
+COUNTED_COLLECTIONS = ["users", "members", "books", "transactions", "fines", "ebooks"]
+
+# Indexes created by init_db.py, by key
+EXPECTED_INDEXES = {
+    "users": [[("email", 1)]],
+    "principal_invalidations": [[("at", 1)]],
+    "kv_store": [[("expires_at", 1)]],
+    "leases": [[("expires_at", 1)]],
+    "books": [[("isbn", 1)], [("title", "text"), ("author", "text"), ("category", "text")], [("created_at", 1), ("_id", 1)]],
+    "members": [[("membership_start", 1), ("_id", 1)]],
+    "transactions": [
+        [("member_id", 1)], [("book_id", 1)],
+        [("borrow_date", -1), ("_id", -1)], [("member_id", 1), ("borrow_date", -1), ("_id", -1)],
+        [("status", 1), ("borrow_date", 1)], [("return_date", 1)], [("due_date", 1)]
+    ],
+    "fines": [
+        [("created_at", -1), ("_id", -1)], [("member_id", 1), ("created_at", -1), ("_id", -1)],
+        [("status", 1), ("created_at", 1)], [("paid_at", 1)], [("waived_at", 1)]
+    ],
+    "book_popularity": [[("book_id", 1), ("day", 1)], [("day", 1), ("count", -1)]],
+    "daily_stats": [[("date", 1), ("category", 1), ("membership_type", 1)]],
+    "ebooks": [[("sha256", 1)]],
+    "ebook_passages": [[("sha256", 1), ("page", 1)], [("text", "text")]],
+    "bookmarks": [[("user_id", 1), ("ebook_id", 1)]]
+}
+
+def index_name(keys) -> str:
+    """Default name MongoDB gives an index on `keys`"""
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+class HealthMonitor:
+    """Cheap health probes for load balancers and a cached deep check.
+
+    Liveness only looks at this process: a background task sleeps for
+    HEALTH_LOOP_LAG_INTERVAL_MS and records how late it wakes up, which is
+    how long the event loop was blocked. It reports "blocked" only after
+    HEALTH_LOOP_LAG_SAMPLES consecutive samples over HEALTH_MAX_LOOP_LAG_MS,
+    so one slow request does not get the process restarted. Readiness pings MongoDB at most
+    once per HEALTH_READY_CACHE_SECONDS (concurrent probes share the ping)
+    with a HEALTH_PING_TIMEOUT_SECONDS timeout. Diagnostics use metadata
+    only (estimated counts, listIndexes, client pool counters) and are
+    reused for HEALTH_DIAGNOSTICS_CACHE_SECONDS.
+    """
+
+    def __init__(self):
+        self.started_at = datetime.utcnow()
+        self.loop_lag_ms = 0.0
+        self.max_loop_lag_ms = 0.0
+        self.slow_samples = 0
+        self._ping: Optional[dict] = None
+        self._ping_at = 0.0
+        self._ping_lock: Optional[asyncio.Lock] = None
+        self._diagnostics: Optional[dict] = None
+        self._diagnostics_at = 0.0
+        self._diagnostics_lock: Optional[asyncio.Lock] = None
+        self._runner: Optional[asyncio.Task] = None
+
+    def liveness(self) -> dict:
+        """Process is up and the event loop is responsive; no I/O"""
+        return {
+            "status": "ok" if self.slow_samples < settings.HEALTH_LOOP_LAG_SAMPLES else "blocked",
+            "loop_lag_ms": round(self.loop_lag_ms, 1),
+            "slow_samples": self.slow_samples,
+            "max_loop_lag_ms": round(self.max_loop_lag_ms, 1),
+            "uptime_seconds": int((datetime.utcnow() - self.started_at).total_seconds())
+        }
+
+    async def _do_ping(self) -> dict:
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(db.command("ping"), settings.HEALTH_PING_TIMEOUT_SECONDS)
+            database = "healthy"
+        except asyncio.TimeoutError:
+            database = "timeout"
+        except Exception:
+            database = "unhealthy"
+        return {
+            "database": database,
+            "ping_ms": round((time.monotonic() - started) * 1000, 1),
+            "checked_at": datetime.utcnow()
+        }
+
+    async def readiness(self) -> dict:
+        """Cached result of a MongoDB ping"""
+        if self._ping is not None and time.monotonic() - self._ping_at < settings.HEALTH_READY_CACHE_SECONDS:
+            return self._ping
+        if self._ping_lock is None:
+            self._ping_lock = asyncio.Lock()
+        async with self._ping_lock:
+            # Another probe may have pinged while we waited
+            if self._ping is None or time.monotonic() - self._ping_at >= settings.HEALTH_READY_CACHE_SECONDS:
+                self._ping = await self._do_ping()
+                self._ping_at = time.monotonic()
+        return self._ping
+
+    async def _count(self, name: str):
+        try:
+            return await asyncio.wait_for(db[name].estimated_document_count(), settings.HEALTH_PING_TIMEOUT_SECONDS)
+        except Exception:
+            return None
+
+    async def _missing_indexes(self, name: str):
+        try:
+            existing = await asyncio.wait_for(db[name].index_information(), settings.HEALTH_PING_TIMEOUT_SECONDS)
+        except Exception:
+            return None
+        return [index_name(keys) for keys in EXPECTED_INDEXES[name] if index_name(keys) not in existing]
+
+    async def _do_diagnostics(self) -> dict:
+        ready = await self.readiness()
+        counts, missing = {}, {}
+        if ready["database"] == "healthy":
+            names = list(EXPECTED_INDEXES)
+            results = await asyncio.gather(
+                *(self._count(name) for name in COUNTED_COLLECTIONS),
+                *(self._missing_indexes(name) for name in names)
+            )
+            counts = dict(zip(COUNTED_COLLECTIONS, results[:len(COUNTED_COLLECTIONS)]))
+            missing = {name: result for name, result in zip(names, results[len(COUNTED_COLLECTIONS):]) if result != []}
+        return {
+            "status": "healthy" if ready["database"] == "healthy" and not missing else "degraded",
+            "liveness": self.liveness(),
+            "readiness": ready,
+            "collections": counts,
+            "missing_indexes": missing,
+            "connection_pool": {
+                "max_size": client.options.pool_options.max_pool_size,
+                **pool_stats.snapshot()
+            },
+            "checked_at": datetime.utcnow()
+        }
+
+    async def diagnostics(self) -> dict:
+        """Deep check, reused for HEALTH_DIAGNOSTICS_CACHE_SECONDS"""
+        if self._diagnostics is not None and time.monotonic() - self._diagnostics_at < settings.HEALTH_DIAGNOSTICS_CACHE_SECONDS:
+            return self._diagnostics
+        if self._diagnostics_lock is None:
+            self._diagnostics_lock = asyncio.Lock()
+        async with self._diagnostics_lock:
+            if self._diagnostics is None or time.monotonic() - self._diagnostics_at >= settings.HEALTH_DIAGNOSTICS_CACHE_SECONDS:
+                self._diagnostics = await self._do_diagnostics()
+                self._diagnostics_at = time.monotonic()
+        return self._diagnostics
+
+    async def _run(self):
+        interval = settings.HEALTH_LOOP_LAG_INTERVAL_MS / 1000
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(interval)
+            self.loop_lag_ms = max((time.monotonic() - started - interval) * 1000, 0.0)
+            self.max_loop_lag_ms = max(self.max_loop_lag_ms, self.loop_lag_ms)
+            if self.loop_lag_ms > settings.HEALTH_MAX_LOOP_LAG_MS:
+                self.slow_samples += 1
+                logger.warning("Event loop was blocked for %.0f ms", self.loop_lag_ms)
+            else:
+                self.slow_samples = 0
+
+    def start(self):
+        """Start measuring event loop lag"""
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._runner is not None:
+            self._runner.cancel()
+            self._runner = None
+
+health_monitor = HealthMonitor()
@@ -0,0 +1,205 @@
+from app.cores.config import settings
+from app.cores.database import report_jobs_collection
+from app.cores.loader import loader_scope
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+class JobQueueFull(Exception):
+    """REPORT_QUEUE_SIZE jobs are already waiting"""
+
+class ReportJobQueue:
+    """Background workers for long-running reports with a TTL result cache.
+
+    Jobs live in the report_jobs collection so any worker can run them and
+    any worker can answer a poll. A job is keyed by a hash of the report
+    name and normalized parameters (the document _id); submitting a report
+    that is already queued, running or finished within REPORT_CACHE_SECONDS
+    returns that job, so identical concurrent requests collapse into one
+    computation even across workers. Each worker runs REPORT_WORKERS loops
+    that claim queued jobs with findOneAndUpdate; a job whose worker died
+    is claimed again once its REPORT_JOB_LEASE_SECONDS lease runs out.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, Callable[..., Awaitable[dict]]] = {}
+        self._workers = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def register(self, report: str, run: Callable[..., Awaitable[dict]]):
+        """Make `run(**params)` available to jobs named `report` (call at import)"""
+        self._handlers[report] = run
+
+    @staticmethod
+    def _key(report: str, params: dict) -> str:
+        return hashlib.sha256(json.dumps([report, params], sort_keys=True, default=str).encode()).hexdigest()
+
+    @staticmethod
+    def _public(job: dict) -> dict:
+        return {key: job.get(key) for key in (
+            "job_id", "report", "params", "status", "created_at", "finished_at", "result", "error"
+        )}
+
+    @staticmethod
+    def _reusable(now: datetime, reuse_finished: bool) -> dict:
+        """Filter for jobs an identical submission should attach to"""
+        if not reuse_finished:
+            return {"status": {"$in": ["queued", "running"]}}
+        return {"$or": [
+            {"status": {"$in": ["queued", "running"]}},
+            {"status": "done", "expires_at": {"$gt": now}}
+        ]}
+
+    async def submit(self, report: str, params: dict, reuse_finished: bool = True) -> dict:
+        """Queue `report` with `params` unless an identical job is pending or cached.
+
+        With `reuse_finished` False only queued or running jobs are shared.
+        Raises JobQueueFull when the backlog is at REPORT_QUEUE_SIZE.
+        """
+        key = self._key(report, params)
+        for _ in range(3):
+            now = datetime.utcnow()
+            reusable = self._reusable(now, reuse_finished)
+            job = {
+                "job_id": uuid.uuid4().hex,
+                "report": report,
+                "params": params,
+                "status": "queued",
+                "created_at": now,
+                "finished_at": None,
+                "result": None,
+                "error": None,
+                "lease_until": None,
+                "expires_at": None
+            }
+            existing = await report_jobs_collection.find_one({"_id": key, **reusable})
+            if existing:
+                return self._public(existing)
+            if await report_jobs_collection.count_documents({"status": "queued"}) >= settings.REPORT_QUEUE_SIZE:
+                raise JobQueueFull()
+            try:
+                # Inserts the job unless an identical one is live; concurrent
+                # submitters all get back the one that won
+                stored = await report_jobs_collection.find_one_and_update(
+                    {"_id": key, **reusable},
+                    {"$setOnInsert": job},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                # A failed or expired job holds the key: replace it, unless
+                # another submitter got there first
+                stored = await report_jobs_collection.find_one_and_update(
+                    {"_id": key, "$nor": [reusable]},
+                    {"$set": job},
+                    return_document=ReturnDocument.AFTER
+                )
+                if stored is None:
+                    continue
+            if stored["job_id"] == job["job_id"] and self._wakeup is not None:
+                self._wakeup.set()
+            return self._public(stored)
+        raise RuntimeError("Could not submit report job")
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        """Current state of a job (with its result once done), or None"""
+        job = await report_jobs_collection.find_one({"job_id": job_id})
+        return self._public(job) if job else None
+
+    async def _claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await report_jobs_collection.find_one_and_update(
+            {"$or": [
+                {"status": "queued"},
+                {"status": "running", "lease_until": {"$lt": now}}
+            ]},
+            {"$set": {"status": "running", "lease_until": now + timedelta(seconds=settings.REPORT_JOB_LEASE_SECONDS)}},
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _renew(self, job: dict):
+        """Keep extending the lease while the job runs"""
+        while True:
+            await asyncio.sleep(settings.REPORT_JOB_LEASE_SECONDS / 3)
+            await report_jobs_collection.update_one(
+                {"_id": job["_id"], "job_id": job["job_id"]},
+                {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=settings.REPORT_JOB_LEASE_SECONDS)}}
+            )
+
+    async def _run(self, job: dict):
+        update = {}
+        renew = asyncio.create_task(self._renew(job))
+        try:
+            run = self._handlers[job["report"]]
+            # Workers outlive the request that started them; give each
+            # job its own batch loader
+            with loader_scope():
+                update["result"] = await run(**job["params"])
+            update["status"] = "done"
+        except Exception as e:
+            logger.exception("Report job %s failed", job["job_id"])
+            update["status"] = "failed"
+            update["error"] = getattr(e, "detail", None) or str(e)
+        finally:
+            renew.cancel()
+        now = datetime.utcnow()
+        update.update({
+            "finished_at": now,
+            "lease_until": None,
+            "expires_at": now + timedelta(seconds=settings.REPORT_CACHE_SECONDS)
+        })
+        # Only the worker holding the job records it (a replacement may exist)
+        held = {"_id": job["_id"], "job_id": job["job_id"], "status": "running"}
+        try:
+            await report_jobs_collection.update_one(held, {"$set": update})
+        except Exception as e:
+            # e.g. a result over the document size limit: record the failure instead
+            logger.exception("Could not save report job %s", job["job_id"])
+            update.update({"status": "failed", "result": None, "error": f"Could not save the result: {e}"})
+            await report_jobs_collection.update_one(held, {"$set": update})
+
+    async def _work(self):
+        while True:
+            try:
+                job = await self._claim()
+            except Exception:
+                logger.exception("Could not claim a report job")
+                job = None
+            if job is None:
+                # Jobs submitted here wake us at once; others are found by polling
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), settings.REPORT_JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            try:
+                await self._run(job)
+            except Exception:
+                # Keep the worker alive; the job is claimed again once its lease expires
+                logger.exception("Report job %s could not be recorded", job["job_id"])
+
+    def start(self):
+        """Start REPORT_WORKERS worker loops in this process"""
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._workers = [task for task in self._workers if not task.done()]
+        while len(self._workers) < settings.REPORT_WORKERS:
+            self._workers.append(asyncio.create_task(self._work()))
+
+    def stop(self):
+        """Cancel the workers (their jobs are picked up again after the lease)"""
+        for task in self._workers:
+            task.cancel()
+        self._workers = []
+
+report_jobs = ReportJobQueue()
@@ -0,0 +1,179 @@
+from app.cores.config import settings
+from app.cores.database import kv_store_collection
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Optional
+import asyncio
+import heapq
+import logging
+
+logger = logging.getLogger(__name__)
+
+class MongoKVStore:
+    """Expiring keys shared by every worker, in the kv_store collection.
+
+    Each key is a document {_id: "<namespace>:<key>", value, expires_at}.
+    A TTL index on expires_at deletes expired keys in the background and
+    reads ignore keys past their expiry until it does.
+    """
+
+    @staticmethod
+    def _id(namespace: str, key: str) -> str:
+        return f"{namespace}:{key}"
+
+    async def get(self, namespace: str, key: str) -> Optional[Any]:
+        doc = await kv_store_collection.find_one({
+            "_id": self._id(namespace, key),
+            "expires_at": {"$gt": datetime.utcnow()}
+        })
+        return doc["value"] if doc else None
+
+    async def set(self, namespace: str, key: str, value: Any, ttl_seconds: int):
+        await kv_store_collection.replace_one(
+            {"_id": self._id(namespace, key)},
+            {"value": value, "expires_at": datetime.utcnow() + timedelta(seconds=ttl_seconds)},
+            upsert=True
+        )
+
+    async def pop(self, namespace: str, key: str) -> Optional[Any]:
+        """Remove a key and return its value; only one caller ever gets it"""
+        doc = await kv_store_collection.find_one_and_delete({
+            "_id": self._id(namespace, key),
+            "expires_at": {"$gt": datetime.utcnow()}
+        })
+        return doc["value"] if doc else None
+
+    async def append(self, namespace: str, key: str, item: Any, ttl_seconds: int, max_items: int) -> list:
+        """Add to a list value, keeping the last `max_items`, and renew its TTL"""
+        for _ in range(3):
+            now = datetime.utcnow()
+            expires_at = now + timedelta(seconds=ttl_seconds)
+            try:
+                # Only a live key is extended; an absent one is created
+                doc = await kv_store_collection.find_one_and_update(
+                    {"_id": self._id(namespace, key), "expires_at": {"$gt": now}},
+                    {
+                        "$push": {"value": {"$each": [item], "$slice": -max_items}},
+                        "$set": {"expires_at": expires_at}
+                    },
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+                return doc["value"]
+            except DuplicateKeyError:
+                # An expired key the TTL monitor has not removed yet: start
+                # over instead of reviving its old value
+                doc = await kv_store_collection.find_one_and_update(
+                    {"_id": self._id(namespace, key), "expires_at": {"$lte": now}},
+                    {"$set": {"value": [item], "expires_at": expires_at}},
+                    return_document=ReturnDocument.AFTER
+                )
+                if doc is not None:
+                    return doc["value"]
+        raise RuntimeError(f"Could not append to {self._id(namespace, key)}")
+
+    async def delete(self, namespace: str, key: str):
+        await kv_store_collection.delete_one({"_id": self._id(namespace, key)})
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+class MemoryKVStore:
+    """Expiring keys in this process only (single-worker deployments and tests).
+
+    Holds at most KV_MEMORY_MAX_ENTRIES keys, evicting the least recently
+    used. Expired keys are dropped on access and swept every
+    KV_MEMORY_SWEEP_SECONDS, so idle keys do not linger.
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._expiry_heap = []
+        self._runner: Optional[asyncio.Task] = None
+
+    def _live(self, entry_key: tuple) -> Optional[tuple]:
+        entry = self._entries.get(entry_key)
+        if entry is None:
+            return None
+        if entry[0] <= datetime.utcnow():
+            del self._entries[entry_key]
+            return None
+        self._entries.move_to_end(entry_key)
+        return entry
+
+    def _store(self, entry_key: tuple, value: Any, ttl_seconds: int):
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl_seconds)
+        self._entries[entry_key] = (expires_at, value)
+        self._entries.move_to_end(entry_key)
+        heapq.heappush(self._expiry_heap, (expires_at, entry_key))
+        while len(self._entries) > settings.KV_MEMORY_MAX_ENTRIES:
+            self._entries.popitem(last=False)
+
+    async def get(self, namespace: str, key: str) -> Optional[Any]:
+        entry = self._live((namespace, key))
+        return entry[1] if entry else None
+
+    async def set(self, namespace: str, key: str, value: Any, ttl_seconds: int):
+        self._store((namespace, key), value, ttl_seconds)
+
+    async def pop(self, namespace: str, key: str) -> Optional[Any]:
+        """Remove a key and return its value; only one caller ever gets it"""
+        entry = self._live((namespace, key))
+        if entry is None:
+            return None
+        del self._entries[(namespace, key)]
+        return entry[1]
+
+    async def append(self, namespace: str, key: str, item: Any, ttl_seconds: int, max_items: int) -> list:
+        """Add to a list value, keeping the last `max_items`, and renew its TTL"""
+        entry = self._live((namespace, key))
+        items = (entry[1] if entry else []) + [item]
+        items = items[-max_items:]
+        self._store((namespace, key), items, ttl_seconds)
+        return items
+
+    async def delete(self, namespace: str, key: str):
+        self._entries.pop((namespace, key), None)
+
+    def sweep(self) -> int:
+        """Drop every expired key; returns how many were removed"""
+        now = datetime.utcnow()
+        removed = 0
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, entry_key = heapq.heappop(self._expiry_heap)
+            entry = self._entries.get(entry_key)
+            # Skip heap items for keys that were rewritten with a later expiry
+            if entry is not None and entry[0] <= now:
+                del self._entries[entry_key]
+                removed += 1
+        # Evicted and rewritten keys leave stale heap items behind
+        if len(self._expiry_heap) > 2 * len(self._entries) + 1000:
+            self._expiry_heap = [(entry[0], entry_key) for entry_key, entry in self._entries.items()]
+            heapq.heapify(self._expiry_heap)
+        return removed
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.KV_MEMORY_SWEEP_SECONDS)
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Key-value sweep failed")
+
+    def start(self):
+        """Start the periodic sweep"""
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._runner is not None:
+            self._runner.cancel()
+            self._runner = None
+
+# MongoDB is shared by every uvicorn worker; memory only works with one
+kv_store = MemoryKVStore() if settings.KV_BACKEND == "memory" else MongoKVStore()
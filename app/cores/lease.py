@@ -0,0 +1,70 @@
+from app.cores.database import leases_collection
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Optional
+import asyncio
+import uuid
+
+async def acquire_lease(name: str, seconds: int) -> Optional[str]:
+    """Take the named lease for `seconds`; returns a holder token, or None if it is held.
+
+    Leases are documents in the leases collection keyed by name, so two
+    workers racing for a free lease collide on the _id and only one wins.
+    """
+    now = datetime.utcnow()
+    token = uuid.uuid4().hex
+    try:
+        await leases_collection.find_one_and_update(
+            {"_id": name, "expires_at": {"$lte": now}},
+            {"$set": {"token": token, "expires_at": now + timedelta(seconds=seconds)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        return None
+    return token
+
+async def renew_lease(name: str, token: str, seconds: int) -> bool:
+    """Extend a lease we hold; False if it was lost (expired and taken over)"""
+    result = await leases_collection.update_one(
+        {"_id": name, "token": token},
+        {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=seconds)}}
+    )
+    return result.matched_count == 1
+
+async def release_lease(name: str, token: str):
+    await leases_collection.update_one(
+        {"_id": name, "token": token},
+        {"$set": {"expires_at": datetime.utcnow()}}
+    )
+
+async def lease_held(name: str) -> bool:
+    """Whether some worker currently holds the lease"""
+    return await leases_collection.count_documents(
+        {"_id": name, "expires_at": {"$gt": datetime.utcnow()}}, limit=1
+    ) == 1
+
+@asynccontextmanager
+async def lease(name: str, seconds: int):
+    """Hold the named lease for the duration of the block, renewing it.
+
+    Yields True if this worker got the lease, False if another holds it.
+    """
+    token = await acquire_lease(name, seconds)
+    if token is None:
+        yield False
+        return
+
+    async def renew():
+        while True:
+            await asyncio.sleep(seconds / 3)
+            await renew_lease(name, token, seconds)
+
+    renewer = asyncio.create_task(renew())
+    try:
+        yield True
+    finally:
+        renewer.cancel()
+        await release_lease(name, token)
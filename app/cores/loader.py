@@ -0,0 +1,52 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from bson import ObjectId
+from typing import Dict, Iterable, Optional
+
+class BatchLoader:
+    """Request-scoped batch loader for documents referenced by string IDs.
+
+    Controllers collect the IDs a page refers to and resolve them with one
+    `$in` query per collection. Results (including misses) are cached for
+    the rest of the request, so a document is fetched at most once.
+    Returned documents are shared; copy them before mutating.
+    """
+
+    def __init__(self):
+        self._cache: Dict[str, Dict[str, Optional[dict]]] = {}
+
+    async def load_many(self, collection, ids: Iterable[str]) -> Dict[str, dict]:
+        """Map each ID to its document, skipping IDs that do not exist"""
+        ids = [str(i) for i in ids if i is not None]
+        cache = self._cache.setdefault(collection.name, {})
+
+        missing = {i for i in ids if i not in cache and ObjectId.is_valid(i)}
+        if missing:
+            for i in missing:
+                cache[i] = None
+            async for doc in collection.find({"_id": {"$in": [ObjectId(i) for i in missing]}}):
+                cache[str(doc["_id"])] = doc
+
+        return {i: cache[i] for i in ids if cache.get(i) is not None}
+
+    async def load(self, collection, id: str) -> Optional[dict]:
+        """Single-ID convenience wrapper around load_many"""
+        return (await self.load_many(collection, [id])).get(str(id))
+
+_current_loader: ContextVar[Optional[BatchLoader]] = ContextVar("batch_loader", default=None)
+
+@contextmanager
+def loader_scope():
+    """Give everything running inside the block its own BatchLoader"""
+    token = _current_loader.set(BatchLoader())
+    try:
+        yield
+    finally:
+        _current_loader.reset(token)
+
+def get_loader() -> BatchLoader:
+    """Loader for the current request (a fresh one outside any scope)"""
+    loader = _current_loader.get()
+    if loader is None:
+        loader = BatchLoader()
+    return loader
@@ -0,0 +1,74 @@
+from app.cores.config import settings
+from app.utils.utils import hash_password, verify_password
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException, status
+from typing import List, Optional
+import asyncio
+import multiprocessing
+import os
+
+class PasswordHasher:
+    """bcrypt hashing and verification in a dedicated process pool.
+
+    One bcrypt call takes 100-300 ms of CPU; run inline it stalls every
+    request on the worker. Calls here run in PASSWORD_HASH_WORKERS
+    processes (one per core by default). At most PASSWORD_HASH_QUEUE_SIZE
+    calls wait for a free process; beyond that callers wait up to
+    PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS for room and then get a 503, so a
+    login storm sheds load instead of piling up.
+    """
+
+    def __init__(self):
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.workers = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self.workers = settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1
+            # Spawned, not forked: forking a process that runs the MongoDB
+            # driver's threads can deadlock the children
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            self._slots = asyncio.Semaphore(self.workers + settings.PASSWORD_HASH_QUEUE_SIZE)
+        return self._pool
+
+    async def _run(self, function, *args):
+        executor = self._executor()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), settings.PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please try again",
+                headers={"Retry-After": "1"}
+            )
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, function, *args)
+        finally:
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        """bcrypt hash of `password`"""
+        return await self._run(hash_password, password)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        """Whether `password` matches `password_hash`"""
+        return await self._run(verify_password, password, password_hash)
+
+    async def hash_many(self, passwords: List[str]) -> List[str]:
+        """Hash a batch in parallel on every worker (bulk imports)"""
+        executor = self._executor()
+        loop = asyncio.get_running_loop()
+        # Bulk work waits for its turn instead of timing out
+        async def one(password: str) -> str:
+            async with self._slots:
+                return await loop.run_in_executor(executor, hash_password, password)
+        return await asyncio.gather(*(one(password) for password in passwords))
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+password_hasher = PasswordHasher()
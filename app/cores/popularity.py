@@ -0,0 +1,166 @@
+from app.cores.config import settings
+from app.cores.lease import lease, lease_held
+from pymongo import UpdateOne
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Window name -> length in days (None = all time)
+WINDOWS = {
+    "7d": 7,
+    "30d": 30,
+    "365d": 365,
+    "all": None
+}
+
+# Daily buckets older than the longest window only feed the all-time counter
+RETENTION_DAYS = 365
+
+# Only one worker (or rebuild_popularity.py) rebuilds the counters at a time
+REBUILD_LEASE = "popularity_rebuild"
+
+def _day(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, moment.day)
+
+def _window_start(window: str, now: datetime) -> Optional[datetime]:
+    days = WINDOWS[window]
+    return None if days is None else _day(now) - timedelta(days=days - 1)
+
+def borrow_updates(book_id: str, borrow_date: datetime) -> List[UpdateOne]:
+    """Counter increments for one borrow: its daily bucket and the all-time total"""
+    return [
+        UpdateOne({"book_id": book_id, "day": _day(borrow_date)}, {"$inc": {"count": 1}}, upsert=True),
+        UpdateOne({"book_id": book_id, "day": None}, {"$inc": {"count": 1}}, upsert=True)
+    ]
+
+def transactions_pipeline(window: str, limit: int) -> list:
+    """Fallback: most borrowed books in a window straight from transactions"""
+    start = _window_start(window, datetime.utcnow())
+    pipeline = [{"$match": {"borrow_date": {"$gte": start}}}] if start else []
+    return pipeline + [
+        {"$group": {"_id": "$book_id", "borrow_count": {"$sum": 1}}},
+        {"$sort": {"borrow_count": -1, "_id": 1}},
+        {"$limit": limit}
+    ]
+
+async def rebuild_counters(popularity_collection, transactions_collection) -> int:
+    """Recompute the buckets from the transactions collection.
+
+    Callers hold the REBUILD_LEASE. Only history is rebuilt: loans borrowed
+    before the cut, the start of the day as of a minute ago, so every
+    increment they caused has landed. Daily buckets before the cut are
+    replaced; later ones only ever get live increments and are left alone.
+    Each all-time bucket is moved with $inc by the difference between the
+    recounted history and the history it held (all-time minus the later
+    daily buckets), so borrows counted during the rebuild stay counted
+    exactly once. Returns the number of books counted.
+    """
+    cut = _day(datetime.utcnow() - timedelta(minutes=1))
+    cutoff = cut - timedelta(days=RETENTION_DAYS)
+
+    totals: Dict[str, int] = {}
+    buckets = []
+    async for row in transactions_collection.aggregate([
+        {"$match": {"borrow_date": {"$type": "date", "$lt": cut}}},
+        {"$group": {
+            "_id": {
+                "book_id": "$book_id",
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$borrow_date"}}
+            },
+            "count": {"$sum": 1}
+        }}
+    ], allowDiskUse=True):
+        book_id = row["_id"].get("book_id")
+        if book_id is None:
+            continue
+        totals[book_id] = totals.get(book_id, 0) + row["count"]
+        day = datetime.strptime(row["_id"]["day"], "%Y-%m-%d")
+        if day >= cutoff:
+            buckets.append((book_id, day, row["count"]))
+
+    # History currently held by each all-time bucket
+    held: Dict[str, int] = {}
+    async for row in popularity_collection.aggregate([
+        {"$match": {"$or": [{"day": None}, {"day": {"$gte": cut}}]}},
+        {"$group": {
+            "_id": "$book_id",
+            "count": {"$sum": {"$cond": [{"$eq": ["$day", None]}, "$count", {"$multiply": ["$count", -1]}]}}
+        }}
+    ]):
+        held[row["_id"]] = row["count"]
+
+    await popularity_collection.delete_many({"day": {"$lt": cut}})
+    ops = [
+        UpdateOne({"book_id": book_id, "day": day}, {"$inc": {"count": count}}, upsert=True)
+        for book_id, day, count in buckets
+    ]
+    for book_id in set(totals) | set(held):
+        delta = totals.get(book_id, 0) - held.get(book_id, 0)
+        if delta:
+            ops.append(UpdateOne({"book_id": book_id, "day": None}, {"$inc": {"count": delta}}, upsert=True))
+    for start in range(0, len(ops), 1000):
+        await popularity_collection.bulk_write(ops[start:start + 1000], ordered=False)
+    await popularity_collection.delete_many({"day": None, "count": {"$lte": 0}})
+    return len(totals)
+
+class PopularityTracker:
+    """Most borrowed books over rolling windows, served from memory.
+
+    Borrows increment per-book daily buckets (plus an all-time bucket with
+    day=None) in the book_popularity collection. Every
+    POPULARITY_REFRESH_SECONDS the top POPULARITY_TOP_K books of each
+    window are summed from the buckets and cached, so reads never
+    aggregate over transactions.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._top: Dict[str, List[Tuple[str, int]]] = {}
+
+    def top(self, window: str = "all", limit: int = 10) -> Optional[List[Tuple[str, int]]]:
+        """(book_id, borrow_count) pairs, most borrowed first; None until refreshed"""
+        if not self.ready or limit > settings.POPULARITY_TOP_K:
+            return None
+        return self._top.get(window, [])[:limit]
+
+    async def refresh(self, popularity_collection, transactions_collection):
+        """Recompute the cached top lists and prune expired buckets"""
+        if not self.ready and await popularity_collection.estimated_document_count() == 0:
+            # First start on an existing database: one worker seeds from
+            # history while the others keep using the fallback
+            if await transactions_collection.estimated_document_count():
+                async with lease(REBUILD_LEASE, settings.REFRESH_LEASE_SECONDS) as held:
+                    if not held:
+                        return
+                    books = await rebuild_counters(popularity_collection, transactions_collection)
+                    logger.info("Seeded popularity counters for %d books", books)
+        if not self.ready and await lease_held(REBUILD_LEASE):
+            # Counters are being rebuilt; do not cache a partial ranking
+            return
+
+        now = datetime.utcnow()
+        limit = settings.POPULARITY_TOP_K
+        top = {}
+        for window in WINDOWS:
+            start = _window_start(window, now)
+            if start is None:
+                cursor = popularity_collection.find({"day": None}, {"book_id": 1, "count": 1})
+                rows = cursor.sort([("count", -1), ("book_id", 1)]).limit(limit)
+                top[window] = [(row["book_id"], row["count"]) async for row in rows]
+            else:
+                top[window] = [(row["_id"], row["count"]) async for row in popularity_collection.aggregate([
+                    {"$match": {"day": {"$gte": start}}},
+                    {"$group": {"_id": "$book_id", "count": {"$sum": "$count"}}},
+                    {"$sort": {"count": -1, "_id": 1}},
+                    {"$limit": limit}
+                ])]
+
+        self._top = top
+        self.ready = True
+        await popularity_collection.delete_many({
+            "day": {"$lt": _day(now) - timedelta(days=RETENTION_DAYS)}
+        })
+
+popularity = PopularityTracker()
@@ -0,0 +1,89 @@
+from app.cores.config import settings
+from app.cores.database import principal_invalidations_collection
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Re-read invalidations this far back on every poll to allow for clock skew
+# between workers; evicting an entry twice is harmless
+POLL_OVERLAP = timedelta(seconds=5)
+
+class PrincipalCache:
+    """Bounded TTL/LRU cache of authenticated users keyed by user ID.
+
+    get_current_user keeps the user document (without the password hash)
+    plus its member_id here, so most authenticated requests do not query
+    MongoDB. Entries expire after PRINCIPAL_CACHE_TTL_SECONDS; writes that
+    change a user call invalidate(), which evicts locally and records the
+    ID in principal_invalidations. Every worker polls that collection
+    every PRINCIPAL_INVALIDATION_POLL_MS and evicts the same IDs.
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._polled_at: Optional[datetime] = None
+        self._runner: Optional[asyncio.Task] = None
+
+    def get(self, user_id: str) -> Optional[dict]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, principal = entry
+        if expires_at <= time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return principal
+
+    def put(self, user_id: str, principal: dict):
+        self._entries[user_id] = (time.monotonic() + settings.PRINCIPAL_CACHE_TTL_SECONDS, principal)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > settings.PRINCIPAL_CACHE_SIZE:
+            self._entries.popitem(last=False)
+
+    async def invalidate(self, user_id: str):
+        """Evict a user here and tell the other workers to do the same"""
+        self._entries.pop(user_id, None)
+        await principal_invalidations_collection.insert_one({"user_id": user_id, "at": datetime.utcnow()})
+
+    async def invalidate_many(self, user_ids):
+        """invalidate() for a batch of users (scripts that rewrite many at once)"""
+        user_ids = [str(user_id) for user_id in user_ids]
+        for user_id in user_ids:
+            self._entries.pop(user_id, None)
+        if user_ids:
+            now = datetime.utcnow()
+            await principal_invalidations_collection.insert_many([{"user_id": user_id, "at": now} for user_id in user_ids])
+
+    async def poll(self):
+        """Apply invalidations recorded by other workers since the last poll"""
+        now = datetime.utcnow()
+        since = (self._polled_at or now) - POLL_OVERLAP
+        async for row in principal_invalidations_collection.find({"at": {"$gte": since}}, {"user_id": 1}):
+            self._entries.pop(row["user_id"], None)
+        self._polled_at = now
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.PRINCIPAL_INVALIDATION_POLL_MS / 1000)
+            try:
+                await self.poll()
+            except Exception:
+                logger.exception("Principal invalidation poll failed")
+
+    def start(self):
+        """Start listening for invalidations from other workers"""
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._runner is not None:
+            self._runner.cancel()
+            self._runner = None
+
+principal_cache = PrincipalCache()
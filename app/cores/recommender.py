@@ -0,0 +1,116 @@
+from app.cores.config import settings
+from scipy import sparse
+from typing import Dict, List, Set, Tuple
+import numpy as np
+import asyncio
+import heapq
+
+# Each older loan counts this much less than the one after it
+RECENCY_DECAY = 0.9
+
+def _fit(member_idx: np.ndarray, book_idx: np.ndarray, borrows: np.ndarray, n_members: int, n_books: int, n_neighbours: int):
+    """Top-N cosine co-borrow neighbours per book, plus books by popularity"""
+    # members x books, 1 where the member ever borrowed the book
+    loans = sparse.csr_matrix(
+        (np.ones(len(member_idx), dtype=np.float32), (member_idx, book_idx)),
+        shape=(n_members, n_books)
+    )
+    borrowers = np.asarray(loans.sum(axis=0), dtype=np.float32).ravel()
+
+    # books x books, number of members who borrowed both
+    co = (loans.T @ loans).tocsr()
+    co.setdiag(0)
+    co.eliminate_zeros()
+
+    scale = sparse.diags(1.0 / np.sqrt(np.maximum(borrowers, 1.0)))
+    co = (scale @ co @ scale).tocsr()
+
+    neighbours = []
+    for row in range(n_books):
+        start, end = co.indptr[row], co.indptr[row + 1]
+        cols, sims = co.indices[start:end], co.data[start:end]
+        if len(sims) > n_neighbours:
+            keep = np.argpartition(-sims, n_neighbours - 1)[:n_neighbours]
+            cols, sims = cols[keep], sims[keep]
+        order = np.argsort(-sims)
+        neighbours.append((cols[order], sims[order]))
+
+    popularity = np.bincount(book_idx, weights=borrows, minlength=n_books)
+    return neighbours, np.argsort(-popularity, kind="stable")
+
+class CoBorrowRecommender:
+    """Item-to-item recommendations from a sparse co-borrow matrix.
+
+    Books are similar when the same members borrowed them, scored by
+    cosine similarity over the member x book loan matrix. The top
+    RECOMMENDATION_NEIGHBOURS per book are precomputed every
+    RECOMMENDATION_REFRESH_SECONDS, so a member's recommendations are a
+    merge of a few short neighbour lists. Books without enough neighbours
+    are topped up from the most borrowed titles.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._neighbours: Dict[str, List[Tuple[str, float]]] = {}
+        self._popular: List[str] = []
+
+    def recommend(self, recent: List[str], exclude: Set[str], limit: int = 10) -> List[Tuple[str, float]]:
+        """Rank neighbours of `recent` loans (newest first), skipping `exclude`"""
+        scores: Dict[str, float] = {}
+        weight = 1.0
+        for book_id in recent:
+            for neighbour, similarity in self._neighbours.get(book_id, ()):
+                if neighbour not in exclude:
+                    scores[neighbour] = scores.get(neighbour, 0.0) + weight * similarity
+            weight *= RECENCY_DECAY
+
+        ranked = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        if len(ranked) < limit:
+            for book_id in self._popular:
+                if book_id not in exclude and book_id not in scores:
+                    ranked.append((book_id, 0.0))
+                    if len(ranked) == limit:
+                        break
+        return ranked
+
+    async def build(self, transactions_collection):
+        """Recompute neighbour lists from the transactions collection and swap in"""
+        members: Dict[str, int] = {}
+        books: Dict[str, int] = {}
+        member_idx, book_idx, borrows = [], [], []
+        async for row in transactions_collection.aggregate([
+            {"$group": {"_id": {"member": "$member_id", "book": "$book_id"}, "count": {"$sum": 1}}}
+        ], allowDiskUse=True):
+            member, book = row["_id"].get("member"), row["_id"].get("book")
+            if member is None or book is None:
+                continue
+            member_idx.append(members.setdefault(str(member), len(members)))
+            book_idx.append(books.setdefault(str(book), len(books)))
+            borrows.append(row["count"])
+
+        if not books:
+            self._neighbours, self._popular = {}, []
+            self.ready = True
+            return
+
+        # The matrix work is pure NumPy/SciPy; keep it off the event loop
+        neighbours, popular = await asyncio.to_thread(
+            _fit,
+            np.array(member_idx, dtype=np.int32),
+            np.array(book_idx, dtype=np.int32),
+            np.array(borrows, dtype=np.float64),
+            len(members),
+            len(books),
+            settings.RECOMMENDATION_NEIGHBOURS
+        )
+
+        book_ids = list(books)
+        self._neighbours = {
+            book_ids[row]: [(book_ids[col], float(sim)) for col, sim in zip(cols, sims)]
+            for row, (cols, sims) in enumerate(neighbours)
+            if len(cols)
+        }
+        self._popular = [book_ids[i] for i in popular[:settings.RECOMMENDATION_POPULAR_POOL]]
+        self.ready = True
+
+recommender = CoBorrowRecommender()
@@ -0,0 +1,187 @@
+from app.cores.database import (
+    transactions_collection, fines_collection, books_collection, members_collection,
+    daily_stats_collection, system_settings_collection
+)
+from app.cores.config import settings
+from app.cores.lease import lease
+from app.cores.loader import BatchLoader
+from pymongo import UpdateOne
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+MEASURES = ("borrows", "returns", "overdue", "fines_issued", "fines_paid", "fines_waived")
+
+# system_settings key holding the time the cube is complete up to
+WATERMARK_KEY = "daily_stats_rolled_up_to"
+
+# Re-roll a little before the watermark to catch writes committed late
+WATERMARK_OVERLAP = timedelta(hours=1)
+BACKFILL_CHUNK_DAYS = 31
+
+# Refreshes and backfills rewrite rows and delete stale ones; one at a time
+ROLLUP_LEASE = "daily_stats_rollup"
+
+def start_of_day(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, moment.day)
+
+# A loan goes overdue on its due date unless it was back by then
+WENT_OVERDUE = {"$or": [
+    {"$eq": [{"$ifNull": ["$return_date", None]}, None]},
+    {"$gt": ["$return_date", "$due_date"]}
+]}
+
+# (collection, event date field, measure, extra match, reference field, value)
+_EVENTS = [
+    (transactions_collection, "borrow_date", "borrows", {}, "book_id", {"$sum": 1}),
+    (transactions_collection, "return_date", "returns", {}, "book_id", {"$sum": 1}),
+    (transactions_collection, "due_date", "overdue", {}, "book_id", {"$sum": {"$cond": [WENT_OVERDUE, 1, 0]}}),
+    (fines_collection, "created_at", "fines_issued", {}, "transaction_id", {"$sum": "$amount"}),
+    (fines_collection, "paid_at", "fines_paid", {"status": "paid"}, "transaction_id", {"$sum": "$amount"}),
+    (fines_collection, "waived_at", "fines_waived", {"status": "waived"}, "transaction_id", {"$sum": "$amount"})
+]
+
+class CirculationRollup:
+    """Daily circulation cube in the daily_stats collection.
+
+    One row per day x book category x membership type holds borrows,
+    returns, loans that went overdue, fine amounts issued/paid/waived and
+    the IDs of members who borrowed that day. Every event is filed under
+    the day it happened, so a refresh only has to re-roll the days since
+    the last watermark. Reports sum rows instead of scanning transactions.
+    """
+
+    def __init__(self):
+        self.ready = False
+
+    async def rollup_days(self, start: datetime, end: datetime) -> int:
+        """Recompute the rows for whole days in [start, end); returns rows written"""
+        start, end = start_of_day(start), start_of_day(end)
+        run_at = datetime.utcnow()
+        loader = BatchLoader()
+        cells: Dict[Tuple[datetime, str, str], dict] = {}
+
+        for collection, field, measure, match, ref_field, value in _EVENTS:
+            # Overdue is only known once the due date has passed
+            upper = min(end, run_at) if measure == "overdue" else end
+            rows = await collection.aggregate([
+                {"$match": {field: {"$gte": start, "$lt": upper}, **match}},
+                {"$group": {
+                    "_id": {
+                        "day": {"$dateToString": {"format": "%Y-%m-%d", "date": f"${field}"}},
+                        "ref": f"${ref_field}",
+                        "member_id": "$member_id"
+                    },
+                    "value": value
+                }}
+            ], allowDiskUse=True).to_list(length=None)
+            if not rows:
+                continue
+
+            # Fines point at their transaction; follow it to the book
+            refs = [row["_id"].get("ref") for row in rows]
+            if ref_field == "transaction_id":
+                loans = await loader.load_many(transactions_collection, refs)
+                book_of = {ref: loan.get("book_id") for ref, loan in loans.items()}
+            else:
+                book_of = {ref: ref for ref in refs}
+            books = await loader.load_many(books_collection, [b for b in book_of.values() if b])
+            members = await loader.load_many(members_collection, [row["_id"].get("member_id") for row in rows])
+
+            for row in rows:
+                key = row["_id"]
+                book = books.get(str(book_of.get(key.get("ref"))), {})
+                member = members.get(str(key.get("member_id")), {})
+                cell = cells.setdefault((
+                    datetime.strptime(key["day"], "%Y-%m-%d"),
+                    book.get("category") or "Unknown",
+                    member.get("membership_type") or "unknown"
+                ), {**{m: 0 for m in MEASURES}, "borrower_ids": set()})
+                cell[measure] += row["value"]
+                if measure == "borrows" and key.get("member_id"):
+                    cell["borrower_ids"].add(str(key["member_id"]))
+
+        ops = []
+        for (day, category, membership_type), cell in cells.items():
+            borrowers = sorted(cell.pop("borrower_ids"))
+            ops.append(UpdateOne(
+                {"date": day, "category": category, "membership_type": membership_type},
+                {"$set": {
+                    **cell,
+                    "borrower_ids": borrowers,
+                    "unique_borrowers": len(borrowers),
+                    "refreshed_at": run_at
+                }},
+                upsert=True
+            ))
+        for i in range(0, len(ops), 1000):
+            await daily_stats_collection.bulk_write(ops[i:i + 1000], ordered=False)
+
+        # Cells whose events have all gone (deleted or edited) were not rewritten
+        await daily_stats_collection.delete_many({
+            "date": {"$gte": start, "$lt": end},
+            "refreshed_at": {"$lt": run_at}
+        })
+        return len(ops)
+
+    async def _set_watermark(self, moment: datetime):
+        await system_settings_collection.update_one(
+            {"key": WATERMARK_KEY},
+            {"$set": {
+                "key": WATERMARK_KEY,
+                "value": moment,
+                "description": "daily_stats rollup is complete up to this time",
+                "updated_at": datetime.utcnow()
+            }},
+            upsert=True
+        )
+
+    async def _backfill(self, since: Optional[datetime]) -> int:
+        now = datetime.utcnow()
+        if since is None:
+            first = await transactions_collection.find_one(
+                {"borrow_date": {"$type": "date"}}, {"borrow_date": 1}, sort=[("borrow_date", 1)]
+            )
+            since = first["borrow_date"] if first else now
+
+        written = 0
+        day, last = start_of_day(since), start_of_day(now) + timedelta(days=1)
+        while day < last:
+            chunk_end = min(day + timedelta(days=BACKFILL_CHUNK_DAYS), last)
+            written += await self.rollup_days(day, chunk_end)
+            day = chunk_end
+
+        await self._set_watermark(now)
+        self.ready = True
+        return written
+
+    async def backfill(self, since: Optional[datetime] = None) -> Optional[int]:
+        """Rebuild the cube from `since` (default: the first loan) up to now.
+
+        Returns the rows written, or None if another process holds the rollup lease.
+        """
+        async with lease(ROLLUP_LEASE, settings.REFRESH_LEASE_SECONDS) as held:
+            if not held:
+                return None
+            return await self._backfill(since)
+
+    async def refresh(self):
+        """Re-roll the days touched since the last watermark (backfills on first run).
+
+        Only the worker holding the rollup lease writes; the others just
+        check that the cube exists.
+        """
+        async with lease(ROLLUP_LEASE, settings.REFRESH_LEASE_SECONDS) as held:
+            setting = await system_settings_collection.find_one({"key": WATERMARK_KEY})
+            if not held:
+                self.ready = setting is not None
+                return
+            if not setting:
+                await self._backfill(None)
+                return
+
+            now = datetime.utcnow()
+            await self.rollup_days(setting["value"] - WATERMARK_OVERLAP, now + timedelta(days=1))
+            await self._set_watermark(now)
+            self.ready = True
+
+circulation_rollup = CirculationRollup()
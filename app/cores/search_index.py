@@ -0,0 +1,245 @@
+from app.cores.config import settings
+from bson import ObjectId
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import bisect
+import heapq
+import math
+import re
+
+# Field boosts: a hit in the title outweighs one buried in the description
+FIELD_WEIGHTS = {
+    "title": 3.0,
+    "author": 2.0,
+    "category": 1.5,
+    "publisher": 1.0,
+    "description": 1.0
+}
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has in is it its of on or that the to was were will with".split()
+)
+
+# Letters and digits in any script (accented and non-Latin titles included)
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+def stem(token: str) -> str:
+    """Light suffix-stripping stemmer (plurals and common verb endings)"""
+    if len(token) <= 3 or token.isdigit():
+        return token
+    for suffix, replacement in (("ies", "y"), ("ing", ""), ("ed", ""), ("es", ""), ("s", "")):
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            if suffix == "s" and token.endswith("ss"):
+                return token
+            return token[:-len(suffix)] + replacement
+    return token
+
+def tokenize(text: str) -> List[str]:
+    """Case-fold, split on non-alphanumerics, drop stopwords and stem"""
+    if not text:
+        return []
+    return [stem(t) for t in _TOKEN_RE.findall(str(text).casefold()) if t not in STOPWORDS]
+
+class CatalogueIndex:
+    """Inverted index over the books collection with BM25 ranking.
+
+    Postings map each stemmed term to {book_id: field-weighted term
+    frequency}. The index is built in the background at startup, kept in
+    sync by the book controller, and fully rebuilt every
+    SEARCH_INDEX_REFRESH_SECONDS to pick up writes made by other workers
+    or scripts. Until the first build finishes `ready` is False and callers
+    should fall back to their MongoDB query.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ready = False
+        self._reset()
+        self._building = False
+        self._pending = []
+
+    def _reset(self):
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._doc_terms: Dict[str, Dict[str, float]] = {}
+        self._doc_len: Dict[str, float] = {}
+        self._total_len = 0.0
+        self._vocab: List[str] = []
+
+    def __len__(self):
+        return len(self._doc_len)
+
+    @staticmethod
+    def _weighted_terms(book: dict) -> Dict[str, float]:
+        terms: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(book.get(field)):
+                terms[term] = terms.get(term, 0.0) + weight
+        return terms
+
+    def _add(self, book_id: str, terms: Dict[str, float], sort_vocab: bool = True):
+        self._doc_terms[book_id] = terms
+        length = sum(terms.values())
+        self._doc_len[book_id] = length
+        self._total_len += length
+        for term, tf in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                if sort_vocab:
+                    bisect.insort(self._vocab, term)
+            postings[book_id] = tf
+
+    def _remove(self, book_id: str):
+        terms = self._doc_terms.pop(book_id, None)
+        if terms is None:
+            return
+        self._total_len -= self._doc_len.pop(book_id)
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(book_id, None)
+            if not postings:
+                del self._postings[term]
+                i = bisect.bisect_left(self._vocab, term)
+                if i < len(self._vocab) and self._vocab[i] == term:
+                    del self._vocab[i]
+
+    def upsert(self, book: dict):
+        """Index (or re-index) a book document"""
+        book_id = str(book["_id"])
+        self._remove(book_id)
+        self._add(book_id, self._weighted_terms(book))
+        if self._building:
+            self._pending.append(("upsert", book))
+
+    def remove(self, book_id: str):
+        """Drop a book from the index"""
+        self._remove(str(book_id))
+        if self._building:
+            self._pending.append(("remove", str(book_id)))
+
+    def _expand(self, prefix: str, limit: int = 50) -> List[str]:
+        i = bisect.bisect_left(self._vocab, prefix)
+        matches = []
+        while i < len(self._vocab) and self._vocab[i].startswith(prefix) and len(matches) < limit:
+            matches.append(self._vocab[i])
+            i += 1
+        return matches
+
+    def match(self, query: str) -> Dict[str, float]:
+        """BM25 scores of the books matching every query term (unordered).
+
+        The last term also matches as a prefix, so partially typed queries
+        ("harry pot") still find their books.
+        """
+        terms = tokenize(query)
+        if not terms or not self._doc_len:
+            return {}
+
+        n = len(self._doc_len)
+        avg_len = self._total_len / n
+        raw_last = _TOKEN_RE.findall(query.lower())[-1]
+
+        groups = []
+        for term in dict.fromkeys(terms):
+            candidates = {term} if term in self._postings else set()
+            if term == terms[-1]:
+                candidates.update(self._expand(term))
+                if stem(raw_last) == term:
+                    candidates.update(self._expand(raw_last))
+
+            scores: Dict[str, float] = {}
+            for candidate in candidates:
+                postings = self._postings[candidate]
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for book_id, tf in postings.items():
+                    norm = tf + self.k1 * (1 - self.b + self.b * self._doc_len[book_id] / avg_len)
+                    score = idf * tf * (self.k1 + 1) / norm
+                    # Prefix expansions of one term do not add up
+                    if score > scores.get(book_id, 0.0):
+                        scores[book_id] = score
+            if not scores:
+                return {}
+            groups.append(scores)
+
+        # Intersect from the rarest term outwards
+        groups.sort(key=len)
+        totals = dict(groups[0])
+        for scores in groups[1:]:
+            totals = {book_id: s + scores[book_id] for book_id, s in totals.items() if book_id in scores}
+            if not totals:
+                return {}
+        return totals
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Rank books matching every query term, best first"""
+        return top_hits(self.match(query), limit)
+
+    async def build(self, collection):
+        """Rebuild the whole index from `collection` and swap it in"""
+        fresh = CatalogueIndex(self.k1, self.b)
+        self._building = True
+        self._pending = []
+        try:
+            projection = {field: 1 for field in FIELD_WEIGHTS}
+            count = 0
+            async for book in collection.find({}, projection):
+                fresh._add(str(book["_id"]), fresh._weighted_terms(book), sort_vocab=False)
+                count += 1
+                if count % 5000 == 0:
+                    await asyncio.sleep(0)
+            fresh._vocab = sorted(fresh._postings)
+
+            # Replay writes that arrived while the snapshot was being read
+            for op, payload in self._pending:
+                if op == "upsert":
+                    fresh.upsert(payload)
+                else:
+                    fresh.remove(payload)
+
+            self._postings = fresh._postings
+            self._doc_terms = fresh._doc_terms
+            self._doc_len = fresh._doc_len
+            self._total_len = fresh._total_len
+            self._vocab = fresh._vocab
+            self.ready = True
+        finally:
+            self._building = False
+            self._pending = []
+
+def top_hits(scores: Dict[str, float], limit: Optional[int] = None) -> List[Tuple[str, float]]:
+    """(book_id, score) pairs best first, only the first `limit` when given"""
+    if limit is not None:
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+async def find_ranked(collection, ranked: List[str], query: dict = None, skip: int = 0, limit: int = None,
+                      count_total: bool = True):
+    """Fetch documents for ranked IDs, optionally filtered, keeping rank order.
+
+    The filter is checked against every ranked ID, SEARCH_MAX_CANDIDATES
+    per query, so no match is lost however low it ranks. Without
+    `count_total` this stops once the requested page is filled.
+    Returns (documents, total matches after filtering, or None if not counted).
+    """
+    total = len(ranked)
+    if query:
+        matching = []
+        for start in range(0, len(ranked), settings.SEARCH_MAX_CANDIDATES):
+            batch = ranked[start:start + settings.SEARCH_MAX_CANDIDATES]
+            found = set()
+            async for doc in collection.find({**query, "_id": {"$in": [ObjectId(i) for i in batch]}}, {"_id": 1}):
+                found.add(str(doc["_id"]))
+            matching.extend(i for i in batch if i in found)
+            if not count_total and limit is not None and len(matching) >= skip + limit:
+                break
+        total = len(matching) if count_total else None
+        ranked = matching
+
+    page = ranked[skip:skip + limit] if limit is not None else ranked[skip:]
+    docs = {}
+    async for doc in collection.find({"_id": {"$in": [ObjectId(i) for i in page]}}):
+        docs[str(doc["_id"])] = doc
+    return [docs[i] for i in page if i in docs], total
+
+catalogue_index = CatalogueIndex()
@@ -0,0 +1,182 @@
+from app.cores.config import settings
+from app.cores.lease import lease
+from app.cores.database import (
+    books_collection, members_collection, transactions_collection, fines_collection
+)
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+import pyarrow as pa
+import pyarrow.parquet as pq
+import asyncio
+import json
+import os
+
+# Column kinds -> Arrow types. "id" and "cat" are dictionary-encoded
+_TYPES = {
+    "id": pa.dictionary(pa.int32(), pa.string()),
+    "cat": pa.dictionary(pa.int32(), pa.string()),
+    "str": pa.string(),
+    "ts": pa.timestamp("ms", tz="UTC"),
+    "float": pa.float64(),
+    "int": pa.int64(),
+    "bool": pa.bool_()
+}
+
+# Collection -> (collection, columns, event date fields for incremental runs).
+# Books and members are small dimension tables and are always written in
+# full; transactions and fines only export documents with an event since
+# the watermark.
+SNAPSHOT_TABLES = {
+    "books": (books_collection, {
+        "id": "id", "isbn": "str", "title": "str", "author": "str", "category": "cat",
+        "publisher": "cat", "publication_year": "int", "total_copies": "int",
+        "available_copies": "int", "created_at": "ts"
+    }, None),
+    "members": (members_collection, {
+        "id": "id", "user_id": "id", "membership_id": "str", "membership_type": "cat",
+        "membership_start": "ts", "membership_end": "ts", "max_books_allowed": "int",
+        "is_active": "bool", "current_borrowed": "int", "pending_fine_total": "float"
+    }, None),
+    "transactions": (transactions_collection, {
+        "id": "id", "member_id": "id", "book_id": "id", "borrow_date": "ts",
+        "due_date": "ts", "return_date": "ts", "status": "cat", "fine_amount": "float"
+    }, ["borrow_date", "return_date"]),
+    "fines": (fines_collection, {
+        "id": "id", "member_id": "id", "transaction_id": "id", "amount": "float",
+        "reason": "cat", "status": "cat", "created_at": "ts", "paid_at": "ts",
+        "waived_at": "ts", "payment_method": "cat"
+    }, ["created_at", "paid_at", "waived_at"])
+}
+
+WATERMARK_FILE = "_watermark.json"
+
+class SnapshotInProgress(Exception):
+    """Another export into the same directory holds its lease"""
+
+# Incremental runs start a little before the watermark to catch writes that
+# committed late; the duplicates collapse when readers dedupe by id
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+def _coerce(value, kind: str):
+    """Best-effort conversion of a stored value to the column kind (None if it does not fit)"""
+    if value is None:
+        return None
+    try:
+        if kind in ("id", "cat", "str"):
+            return str(value)
+        if kind == "ts":
+            if isinstance(value, datetime):
+                return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+            return None
+        if kind == "float":
+            return float(value)
+        if kind == "int":
+            return int(value)
+        if kind == "bool":
+            return bool(value)
+    except (TypeError, ValueError):
+        return None
+    return value
+
+def _record_batch(rows: List[dict], columns: Dict[str, str], snapshot_at: datetime) -> pa.RecordBatch:
+    arrays = []
+    for name, kind in columns.items():
+        values = [_coerce(row.get(name), kind) for row in rows]
+        if kind in ("id", "cat"):
+            arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, type=_TYPES[kind]))
+    arrays.append(pa.array([snapshot_at] * len(rows), type=_TYPES["ts"]))
+    return pa.RecordBatch.from_arrays(arrays, schema=_schema(columns))
+
+def _write_rows(writer: pq.ParquetWriter, rows: List[dict], columns: Dict[str, str], snapshot_at: datetime):
+    writer.write_batch(_record_batch(rows, columns, snapshot_at))
+
+def _schema(columns: Dict[str, str]) -> pa.Schema:
+    return pa.schema(
+        [(name, _TYPES[kind]) for name, kind in columns.items()] + [("snapshot_at", _TYPES["ts"])]
+    )
+
+def _read_watermarks(output_dir: str) -> dict:
+    path = os.path.join(output_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return {name: datetime.fromisoformat(value) for name, value in json.load(f).items()}
+
+def _write_watermarks(output_dir: str, watermarks: dict):
+    path = os.path.join(output_dir, WATERMARK_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump({name: value.isoformat() for name, value in watermarks.items()}, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+async def _export_table(name: str, output_dir: str, since: Optional[datetime], snapshot_at: datetime) -> dict:
+    collection, columns, event_fields = SNAPSHOT_TABLES[name]
+    query = {}
+    if since and event_fields:
+        query = {"$or": [{field: {"$gte": since - WATERMARK_OVERLAP}} for field in event_fields]}
+
+    # One hive-style partition per run: <table>/snapshot=<time>/part-0.parquet
+    partition = os.path.join(output_dir, name, f"snapshot={snapshot_at:%Y%m%dT%H%M%S%f}")
+    await asyncio.to_thread(os.makedirs, partition, exist_ok=True)
+    path = os.path.join(partition, "part-0.parquet")
+
+    # Arrow conversion and Parquet encoding are CPU-bound; keep them off the event loop
+    writer = await asyncio.to_thread(pq.ParquetWriter, path, _schema(columns), compression="zstd")
+    rows, count = [], 0
+    try:
+        cursor = collection.find(query).batch_size(settings.SNAPSHOT_BATCH_ROWS)
+        async for doc in cursor:
+            doc["id"] = str(doc.pop("_id"))
+            rows.append(doc)
+            if len(rows) >= settings.SNAPSHOT_BATCH_ROWS:
+                await asyncio.to_thread(_write_rows, writer, rows, columns, snapshot_at)
+                count += len(rows)
+                rows = []
+        if rows:
+            await asyncio.to_thread(_write_rows, writer, rows, columns, snapshot_at)
+            count += len(rows)
+    finally:
+        await asyncio.to_thread(writer.close)
+
+    return {
+        "rows": count,
+        "path": path,
+        "mode": "incremental" if since and event_fields else "full"
+    }
+
+async def export_snapshot(tables: List[str] = None, incremental: bool = True, output_dir: str = None) -> dict:
+    """Write collections to partitioned Parquet under `output_dir`.
+
+    Each run adds a snapshot=<time> partition per table. Incremental runs
+    of transactions and fines contain documents with any event (borrow,
+    return, fine issued/paid/waived) since that table's last watermark;
+    readers keep the row with the latest snapshot_at per id. Raises
+    SnapshotInProgress while another run writes to the same directory.
+    """
+    output_dir = os.path.abspath(output_dir or settings.SNAPSHOT_DIR)
+    tables = tables or list(SNAPSHOT_TABLES)
+
+    # Runs into one directory read and rewrite its watermark file; one at a time
+    async with lease(f"snapshot:{output_dir}", settings.REFRESH_LEASE_SECONDS) as held:
+        if not held:
+            raise SnapshotInProgress(f"A snapshot export into {output_dir} is already running")
+        await asyncio.to_thread(os.makedirs, output_dir, exist_ok=True)
+
+        watermarks = await asyncio.to_thread(_read_watermarks, output_dir)
+        # Whole milliseconds, as stored by MongoDB and written to Parquet
+        snapshot_at = datetime.utcnow().replace(tzinfo=timezone.utc)
+        snapshot_at = snapshot_at.replace(microsecond=snapshot_at.microsecond // 1000 * 1000)
+
+        results = {}
+        for name in tables:
+            since = watermarks.get(name) if incremental else None
+            results[name] = await _export_table(name, output_dir, since, snapshot_at)
+            watermarks[name] = snapshot_at
+            await asyncio.to_thread(_write_watermarks, output_dir, watermarks)
+
+    return {
+        "snapshot_at": snapshot_at,
+        "output_dir": output_dir,
+        "tables": results
+    }
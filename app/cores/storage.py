@@ -0,0 +1,318 @@
+from app.cores.config import settings
+from app.cores.database import fs
+from fastapi import HTTPException, status, UploadFile
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from bson import ObjectId
+from gridfs.errors import NoFile
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import AsyncIterator, Optional, Set, Tuple
+from urllib.parse import quote
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+# Stored objects are grouped by kind: e-book files and book covers
+NAMESPACES = ("ebooks", "covers")
+
+COVER_FORMATS = {
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "gif": "image/gif",
+    "webp": "image/webp"
+}
+
+# Covers are served from <prefix><backend>/<location>
+COVER_URL_PREFIX = "/books/covers/"
+
+_DIGEST_LOCATION = re.compile(r"[0-9a-f]{64}(\.[a-z0-9]{1,5})?")
+
+async def hash_upload(file: UploadFile, max_mb: int) -> Tuple[str, int]:
+    """SHA-256 and size of an upload, read in chunks; 413 past `max_mb`"""
+    max_bytes = max_mb * 1024 * 1024
+    too_large = HTTPException(
+        status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+        detail=f"File exceeds the {max_mb} MB upload limit"
+    )
+    if file.size is not None and file.size > max_bytes:
+        raise too_large
+
+    digest = hashlib.sha256()
+    size = 0
+    await file.seek(0)
+    while chunk := await file.read(settings.EBOOK_UPLOAD_CHUNK_BYTES):
+        size += len(chunk)
+        if size > max_bytes:
+            raise too_large
+        digest.update(chunk)
+    return digest.hexdigest(), size
+
+def content_disposition(filename: str, inline: bool = False) -> str:
+    ascii_name = filename.encode("ascii", "replace").decode().replace('"', "")
+    disposition = "inline" if inline else "attachment"
+    # Headers are latin-1; non-ASCII names go in the RFC 5987 filename*
+    return f'{disposition}; filename="{ascii_name}"; filename*=UTF-8\'\'{quote(filename)}'
+
+def _parse_range(range_header: str, length: int):
+    """(start, end) inclusive for a single "bytes=" range, None to serve the whole file.
+
+    Raises 416 when the range cannot be satisfied.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        # Other units and multipart ranges are not supported; send it all
+        return None
+
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else length - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(length - int(last), 0)
+            end = length - 1
+    except ValueError:
+        return None
+
+    if start >= length or start > end:
+        raise HTTPException(
+            status_code=status.HTTP_416_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{length}"}
+        )
+    return start, min(end, length - 1)
+
+def _not_found():
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Stored file not found"
+    )
+
+class GridFSStorage:
+    """Files in MongoDB GridFS; the location is the GridFS file ID"""
+
+    name = "gridfs"
+
+    async def write(self, namespace: str, file: UploadFile, digest: str, content_type: Optional[str] = None, extension: str = "") -> str:
+        await file.seek(0)
+        grid_in = fs.open_upload_stream(
+            digest,
+            chunk_size_bytes=settings.EBOOK_UPLOAD_CHUNK_BYTES,
+            metadata={"sha256": digest, "kind": namespace, "content_type": content_type}
+        )
+        try:
+            while chunk := await file.read(settings.EBOOK_UPLOAD_CHUNK_BYTES):
+                await grid_in.write(chunk)
+            await grid_in.close()
+        except BaseException:
+            # Drop the chunks written so far
+            await grid_in.abort()
+            raise
+        return str(grid_in._id)
+
+    async def delete(self, namespace: str, location: str):
+        try:
+            await fs.delete(ObjectId(location))
+        except NoFile:
+            pass
+
+    async def _open(self, location: str):
+        if not ObjectId.is_valid(location):
+            raise _not_found()
+        try:
+            return await fs.open_download_stream(ObjectId(location))
+        except NoFile:
+            raise _not_found()
+
+    async def read(self, namespace: str, location: str) -> AsyncIterator[bytes]:
+        """The stored bytes, one GridFS chunk at a time"""
+        grid_out = await self._open(location)
+        while chunk := await grid_out.readchunk():
+            yield chunk
+
+    @staticmethod
+    async def _stream(grid_out, start: int, length: int):
+        grid_out.seek(start)
+        remaining = length
+        while remaining > 0:
+            data = await grid_out.read(min(grid_out.chunk_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+    async def response(
+        self,
+        namespace: str,
+        location: str,
+        headers: dict,
+        media_type: Optional[str] = None,
+        range_header: Optional[str] = None,
+        if_range: Optional[str] = None
+    ) -> Response:
+        """Stream the file from GridFS, honouring a single byte range"""
+        grid_out = await self._open(location)
+        length = grid_out.length
+        headers = {
+            **headers,
+            "Accept-Ranges": "bytes",
+            "Last-Modified": format_datetime(grid_out.upload_date.replace(tzinfo=timezone.utc), usegmt=True)
+        }
+        media_type = media_type or (grid_out.metadata or {}).get("content_type") or "application/octet-stream"
+
+        byte_range = None
+        # If-Range: only honour the range if the client's copy is still current
+        if range_header and (not if_range or if_range.strip() in (headers.get("ETag"), headers["Last-Modified"])):
+            byte_range = _parse_range(range_header, length)
+
+        status_code = status.HTTP_200_OK
+        start, end = 0, length - 1
+        if byte_range:
+            start, end = byte_range
+            status_code = status.HTTP_206_PARTIAL_CONTENT
+            headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+        headers["Content-Length"] = str(end - start + 1)
+
+        return StreamingResponse(
+            self._stream(grid_out, start, end - start + 1),
+            status_code=status_code,
+            media_type=media_type,
+            headers=headers
+        )
+
+    async def sweep(self, namespace: str, referenced: Set[str], older_than: datetime) -> int:
+        """Delete files of `namespace` uploaded before `older_than` that are not referenced"""
+        query = {"uploadDate": {"$lt": older_than}}
+        if namespace == "ebooks":
+            # Files stored before namespaces existed are e-books
+            query["metadata.kind"] = {"$nin": [ns for ns in NAMESPACES if ns != namespace]}
+        else:
+            query["metadata.kind"] = namespace
+        deleted = 0
+        async for grid_file in fs.find(query):
+            if str(grid_file._id) not in referenced:
+                await self.delete(namespace, str(grid_file._id))
+                deleted += 1
+        return deleted
+
+class LocalStorage:
+    """Content-addressed files on local disk.
+
+    A file lives at <STORAGE_LOCAL_DIR>/<namespace>/<ab>/<cd>/<digest>[.ext],
+    so identical uploads share one file and the location is the file name.
+    Disk I/O runs in worker threads and downloads are served with
+    FileResponse, which servers supporting the ASGI pathsend extension
+    hand to sendfile.
+    """
+
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, namespace: str, location: str) -> str:
+        if namespace not in NAMESPACES or not _DIGEST_LOCATION.fullmatch(location):
+            raise _not_found()
+        return os.path.join(self.root, namespace, location[:2], location[2:4], location)
+
+    def _write_sync(self, source, path: str):
+        if os.path.exists(path):
+            # Same digest, same bytes
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        source.seek(0)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as target:
+                shutil.copyfileobj(source, target, settings.EBOOK_UPLOAD_CHUNK_BYTES)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    async def write(self, namespace: str, file: UploadFile, digest: str, content_type: Optional[str] = None, extension: str = "") -> str:
+        location = f"{digest}.{extension}" if extension else digest
+        await asyncio.to_thread(self._write_sync, file.file, self.path(namespace, location))
+        return location
+
+    async def delete(self, namespace: str, location: str):
+        try:
+            await asyncio.to_thread(os.remove, self.path(namespace, location))
+        except FileNotFoundError:
+            pass
+
+    async def read(self, namespace: str, location: str) -> AsyncIterator[bytes]:
+        """The stored bytes in EBOOK_UPLOAD_CHUNK_BYTES pieces"""
+        path = self.path(namespace, location)
+        try:
+            f = await asyncio.to_thread(open, path, "rb")
+        except FileNotFoundError:
+            raise _not_found()
+        try:
+            while chunk := await asyncio.to_thread(f.read, settings.EBOOK_UPLOAD_CHUNK_BYTES):
+                yield chunk
+        finally:
+            f.close()
+
+    async def response(
+        self,
+        namespace: str,
+        location: str,
+        headers: dict,
+        media_type: Optional[str] = None,
+        range_header: Optional[str] = None,
+        if_range: Optional[str] = None
+    ) -> Response:
+        """FileResponse for the file; Starlette handles Range and If-Range itself"""
+        path = self.path(namespace, location)
+        try:
+            stat_result = await asyncio.to_thread(os.stat, path)
+        except FileNotFoundError:
+            raise _not_found()
+        return FileResponse(path, headers=headers, media_type=media_type, stat_result=stat_result)
+
+    def _sweep_sync(self, namespace: str, referenced: Set[str], older_than: datetime) -> int:
+        deleted = 0
+        cutoff = older_than.replace(tzinfo=timezone.utc).timestamp()
+        for directory, _, names in os.walk(os.path.join(self.root, namespace)):
+            for name in names:
+                path = os.path.join(directory, name)
+                if name not in referenced and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    deleted += 1
+        return deleted
+
+    async def sweep(self, namespace: str, referenced: Set[str], older_than: datetime) -> int:
+        """Delete files of `namespace` written before `older_than` that are not referenced"""
+        return await asyncio.to_thread(self._sweep_sync, namespace, referenced, older_than)
+
+STORAGE_BACKENDS = {
+    "gridfs": GridFSStorage(),
+    "local": LocalStorage(settings.STORAGE_LOCAL_DIR)
+}
+
+def get_storage(name: Optional[str] = None):
+    """Backend by name; the configured STORAGE_BACKEND by default.
+
+    Records keep the name of the backend they were written to, so switching
+    the setting only affects new uploads.
+    """
+    return STORAGE_BACKENDS[name or settings.STORAGE_BACKEND]
+
+async def store_cover(file: UploadFile) -> str:
+    """Save a cover image in the configured backend and return its URL"""
+    extension = (file.filename or "").rsplit(".", 1)[-1].lower()
+    if extension not in COVER_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid cover image format. Allowed: {', '.join(COVER_FORMATS)}"
+        )
+    digest, _ = await hash_upload(file, settings.COVER_MAX_UPLOAD_MB)
+    storage = get_storage()
+    location = await storage.write("covers", file, digest, COVER_FORMATS[extension], extension)
+    return f"{COVER_URL_PREFIX}{storage.name}/{location}"
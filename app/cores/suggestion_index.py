@@ -0,0 +1,196 @@
+from typing import Dict, List, Tuple
+import bisect
+import heapq
+
+SUGGESTION_FIELDS = ("title", "author", "category")
+
+# Prefixes up to this length keep a precomputed top list; longer ones are
+# answered by scanning their (short) slice of the sorted key array
+SHORT_PREFIX = 4
+TOP_K = 10
+SCAN_LIMIT = 500
+
+class _PrefixField:
+    """Sorted, case-folded values of one book field with popularity scores"""
+
+    def __init__(self):
+        self.keys: List[str] = []
+        self.display: Dict[str, str] = {}
+        self.refs: Dict[str, int] = {}
+        self.score: Dict[str, int] = {}
+        self.top: Dict[str, List[str]] = {}
+
+    def _rank(self, key: str) -> Tuple[int, str]:
+        return (-self.score.get(key, 0), key)
+
+    def _offer(self, key: str):
+        for n in range(1, min(SHORT_PREFIX, len(key)) + 1):
+            top = self.top.setdefault(key[:n], [])
+            if key not in top:
+                top.append(key)
+            top.sort(key=self._rank)
+            del top[TOP_K:]
+
+    def _recompute(self, prefix: str):
+        i = bisect.bisect_left(self.keys, prefix)
+        j = bisect.bisect_left(self.keys, prefix + "\uffff")
+        top = heapq.nsmallest(TOP_K, self.keys[i:j], key=self._rank)
+        if top:
+            self.top[prefix] = top
+        else:
+            self.top.pop(prefix, None)
+
+    def add(self, value: str, score: int = 0, bulk: bool = False):
+        key = value.casefold()
+        if key in self.refs:
+            self.refs[key] += 1
+        else:
+            self.refs[key] = 1
+            self.display[key] = value
+            if not bulk:
+                bisect.insort(self.keys, key)
+        self.score[key] = self.score.get(key, 0) + score
+        if not bulk:
+            self._offer(key)
+
+    def finalize(self):
+        """Sort keys and precompute top lists after a bulk load"""
+        self.keys = sorted(self.refs)
+        by_prefix: Dict[str, List[str]] = {}
+        for key in self.keys:
+            for n in range(1, min(SHORT_PREFIX, len(key)) + 1):
+                by_prefix.setdefault(key[:n], []).append(key)
+        self.top = {
+            prefix: heapq.nsmallest(TOP_K, keys, key=self._rank)
+            for prefix, keys in by_prefix.items()
+        }
+
+    def remove(self, value: str, score: int = 0):
+        key = value.casefold()
+        if key not in self.refs:
+            return
+        self.score[key] = self.score.get(key, 0) - score
+        self.refs[key] -= 1
+        if self.refs[key] > 0:
+            return
+        del self.refs[key], self.display[key], self.score[key]
+        i = bisect.bisect_left(self.keys, key)
+        del self.keys[i]
+        for n in range(1, min(SHORT_PREFIX, len(key)) + 1):
+            if key in self.top.get(key[:n], ()):
+                self._recompute(key[:n])
+
+    def bump(self, value: str, amount: int = 1):
+        key = value.casefold()
+        if key in self.refs:
+            self.score[key] += amount
+            self._offer(key)
+
+    def lookup(self, prefix: str, limit: int) -> List[str]:
+        prefix = prefix.casefold()
+        if len(prefix) <= SHORT_PREFIX:
+            keys = self.top.get(prefix, [])[:limit]
+        else:
+            i = bisect.bisect_left(self.keys, prefix)
+            j = bisect.bisect_left(self.keys, prefix + "\uffff", i, min(i + SCAN_LIMIT, len(self.keys)))
+            keys = heapq.nsmallest(limit, self.keys[i:j], key=self._rank)
+        return [self.display[key] for key in keys]
+
+class SuggestionIndex:
+    """In-memory autocomplete over book titles, authors and categories.
+
+    Values match by case-folded prefix and are ranked by how often their
+    books have been borrowed. Built from MongoDB in the background and kept
+    in sync by the book and transaction controllers, so lookups never
+    touch the database.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._fields = {field: _PrefixField() for field in SUGGESTION_FIELDS}
+        self._books: Dict[str, Tuple[dict, int]] = {}
+        self._building = False
+        self._pending = []
+
+    def _add(self, book_id: str, values: dict, borrows: int, bulk: bool = False):
+        self._books[book_id] = (values, borrows)
+        for field, value in values.items():
+            self._fields[field].add(value, borrows, bulk)
+
+    def _remove(self, book_id: str) -> int:
+        values, borrows = self._books.pop(book_id, ({}, 0))
+        for field, value in values.items():
+            self._fields[field].remove(value, borrows)
+        return borrows
+
+    @staticmethod
+    def _values(book: dict) -> dict:
+        return {f: str(book[f]) for f in SUGGESTION_FIELDS if book.get(f)}
+
+    def upsert(self, book: dict):
+        """Index a new or edited book, keeping its borrow count"""
+        book_id = str(book["_id"])
+        borrows = self._remove(book_id)
+        self._add(book_id, self._values(book), borrows)
+        if self._building:
+            self._pending.append(("upsert", book))
+
+    def remove(self, book_id: str):
+        """Drop a deleted book"""
+        self._remove(str(book_id))
+        if self._building:
+            self._pending.append(("remove", str(book_id)))
+
+    def record_borrow(self, book_id: str):
+        """Raise the rank of a book's title, author and category by one borrow"""
+        book_id = str(book_id)
+        if book_id in self._books:
+            values, borrows = self._books[book_id]
+            self._books[book_id] = (values, borrows + 1)
+            for field, value in values.items():
+                self._fields[field].bump(value)
+        if self._building:
+            self._pending.append(("borrow", book_id))
+
+    def suggest(self, prefix: str, field: str, limit: int = 5) -> List[str]:
+        """Most borrowed values of `field` starting with `prefix`"""
+        return self._fields[field].lookup(prefix, limit)
+
+    async def build(self, books_collection, popularity_collection):
+        """Rebuild from the catalogue and all-time borrow counts, then swap in.
+
+        Counts come from the all-time book_popularity buckets (day=None),
+        so a rebuild does not scan loan history.
+        """
+        fresh = SuggestionIndex()
+        # Start logging before reading counts so no borrow slips between the two
+        self._building = True
+        self._pending = []
+        try:
+            borrows = {}
+            async for bucket in popularity_collection.find({"day": None}, {"book_id": 1, "count": 1}):
+                borrows[str(bucket["book_id"])] = bucket["count"]
+
+            projection = {field: 1 for field in SUGGESTION_FIELDS}
+            async for book in books_collection.find({}, projection):
+                book_id = str(book["_id"])
+                fresh._add(book_id, self._values(book), borrows.get(book_id, 0), bulk=True)
+            for field in fresh._fields.values():
+                field.finalize()
+
+            for op, payload in self._pending:
+                if op == "upsert":
+                    fresh.upsert(payload)
+                elif op == "remove":
+                    fresh.remove(payload)
+                else:
+                    fresh.record_borrow(payload)
+
+            self._fields = fresh._fields
+            self._books = fresh._books
+            self.ready = True
+        finally:
+            self._building = False
+            self._pending = []
+
+suggestion_index = SuggestionIndex()
@@ -0,0 +1,244 @@
+from app.cores.config import settings
+from app.cores.search_index import tokenize
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import asyncio
+import math
+import zlib
+
+# Fields embedded for semantic search, with their weight in the vector
+VECTOR_FIELDS = {
+    "title": 2.0,
+    "category": 1.0,
+    "description": 1.0
+}
+
+# Character trigrams give fuzzy matching on short fields only; long
+# descriptions contribute words and word pairs
+TRIGRAM_FIELDS = ("title", "category")
+MAX_FIELD_CHARS = 2000
+
+# Hash space for document-frequency counts (IDF)
+HASH_SPACE = 1 << 20
+
+def _hash(feature: str) -> int:
+    return zlib.crc32(feature.encode())
+
+def _features(text: str, trigrams: bool) -> Dict[int, float]:
+    """Hashed words, word bigrams and (optionally) character trigrams -> counts"""
+    words = tokenize(text[:MAX_FIELD_CHARS])
+    counts: Dict[int, float] = {}
+
+    def add(feature):
+        h = _hash(feature)
+        counts[h] = counts.get(h, 0.0) + 1.0
+
+    for i, word in enumerate(words):
+        add("w:" + word)
+        if i:
+            add("b:" + words[i - 1] + " " + word)
+        if trigrams and not word.isdigit():
+            padded = f" {word} "
+            for j in range(len(padded) - 2):
+                add("c:" + padded[j:j + 3])
+    return counts
+
+def document_features(book: dict) -> Dict[int, float]:
+    """Field-weighted, sublinear term frequencies of a book's hashed features"""
+    weighted: Dict[int, float] = {}
+    for field, weight in VECTOR_FIELDS.items():
+        for h, tf in _features(str(book.get(field) or ""), field in TRIGRAM_FIELDS).items():
+            weighted[h] = weighted.get(h, 0.0) + weight * (1.0 + math.log(tf))
+    return weighted
+
+def _train_ivf(matrix: np.ndarray) -> Tuple[np.ndarray, List[List[int]]]:
+    """Spherical k-means over a sample of rows, then assign every row to a cell"""
+    n = len(matrix)
+    n_cells = min(1024, max(1, int(math.sqrt(n))))
+    rng = np.random.default_rng(0)
+    sample = matrix[rng.choice(n, size=min(n, 20000), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=n_cells, replace=False)].copy()
+
+    for _ in range(10):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        moved = norms[:, 0] > 0
+        centroids[moved] = sums[moved] / norms[moved]
+
+    cells: List[List[int]] = [[] for _ in range(n_cells)]
+    for start in range(0, n, 10000):
+        block = np.argmax(matrix[start:start + 10000] @ centroids.T, axis=1)
+        for offset, cell in enumerate(block):
+            cells[cell].append(start + offset)
+    return centroids, cells
+
+class VectorIndex:
+    """Dense float32 matrix of hashed TF-IDF book embeddings.
+
+    Each hashed feature is folded into one of `dim` signed dimensions, so
+    the matrix stays N x dim regardless of vocabulary size. Rows are
+    L2-normalized and queries are scored with one matrix-vector product.
+    Above VECTOR_IVF_MIN_ROWS an inverted-file (IVF) index of k-means cells
+    narrows the scan to the VECTOR_IVF_NPROBE closest cells.
+    """
+
+    def __init__(self, dim: int = None):
+        self.dim = dim or settings.VECTOR_DIM
+        self.ready = False
+        self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+        self._size = 0
+        self._ids: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._df = np.zeros(HASH_SPACE, dtype=np.int32)
+        self._n_docs = 0
+        self._centroids: Optional[np.ndarray] = None
+        self._cells: List[List[int]] = []
+        self._building = False
+        self._pending = []
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _idf(self, buckets: np.ndarray) -> np.ndarray:
+        return np.log((self._n_docs + 1) / (self._df[buckets] + 1)) + 1.0
+
+    def _vectorize(self, features: Dict[int, float]) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if not features:
+            return vector
+        hashes = np.fromiter(features.keys(), dtype=np.int64, count=len(features))
+        weights = np.fromiter(features.values(), dtype=np.float64, count=len(features))
+        signs = np.where(hashes & 1, 1.0, -1.0)
+        values = weights * self._idf((hashes >> 1) % HASH_SPACE) * signs
+        np.add.at(vector, (hashes >> 1) % self.dim, values.astype(np.float32))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _count(self, features: Dict[int, float], delta: int):
+        if features:
+            buckets = (np.fromiter(features.keys(), dtype=np.int64, count=len(features)) >> 1) % HASH_SPACE
+            np.add.at(self._df, buckets, delta)
+        self._n_docs += delta
+
+    def _place(self, book_id: str, vector: np.ndarray):
+        row = self._rows.get(book_id)
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+            else:
+                if self._size == len(self._matrix):
+                    grown = np.zeros((max(1024, 2 * len(self._matrix)), self.dim), dtype=np.float32)
+                    grown[:self._size] = self._matrix[:self._size]
+                    self._matrix = grown
+                row = self._size
+                self._size += 1
+                self._ids.append(None)
+            self._rows[book_id] = row
+            self._ids[row] = book_id
+        self._matrix[row] = vector
+        if self._centroids is not None:
+            self._cells[int(np.argmax(self._centroids @ vector))].append(row)
+
+    def upsert(self, book: dict):
+        """Embed a new or edited book into its row"""
+        book_id = str(book["_id"])
+        features = document_features(book)
+        if book_id not in self._rows:
+            self._count(features, 1)
+        self._place(book_id, self._vectorize(features))
+        if self._building:
+            self._pending.append(("upsert", book))
+
+    def remove(self, book_id: str):
+        """Free a deleted book's row (stale IVF entries are skipped at query time)"""
+        book_id = str(book_id)
+        row = self._rows.pop(book_id, None)
+        if row is not None:
+            self._matrix[row] = 0.0
+            self._ids[row] = None
+            self._free.append(row)
+        if self._building:
+            self._pending.append(("remove", book_id))
+
+    def _embed_query(self, query: str) -> np.ndarray:
+        return self._vectorize(_features(query, trigrams=True))
+
+    def search(self, query: str, k: int = 20, exact: bool = False) -> List[Tuple[str, float]]:
+        """Top-k books by cosine similarity to the query, best first"""
+        q = self._embed_query(query)
+        if not self._size or not q.any():
+            return []
+
+        if self._centroids is not None and not exact:
+            nprobe = min(settings.VECTOR_IVF_NPROBE, len(self._centroids))
+            probe = np.argpartition(-(self._centroids @ q), nprobe - 1)[:nprobe]
+            rows = np.unique(np.fromiter(
+                (row for cell in probe for row in self._cells[cell]), dtype=np.int64
+            ))
+            scores = self._matrix[rows] @ q
+        else:
+            rows = None
+            scores = self._matrix[:self._size] @ q
+
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for i in top:
+            row = int(rows[i]) if rows is not None else int(i)
+            book_id = self._ids[row]
+            if book_id is not None and scores[i] > 0:
+                results.append((book_id, float(scores[i])))
+        return results
+
+    async def build(self, collection):
+        """Re-embed the whole catalogue and swap the new matrix in"""
+        fresh = VectorIndex(self.dim)
+        self._building = True
+        self._pending = []
+        try:
+            projection = {field: 1 for field in VECTOR_FIELDS}
+            docs = []
+            async for book in collection.find({}, projection):
+                features = document_features(book)
+                fresh._count(features, 1)
+                docs.append((str(book["_id"]), features))
+                if len(docs) % 500 == 0:
+                    await asyncio.sleep(0)
+
+            fresh._matrix = np.zeros((max(1024, len(docs)), self.dim), dtype=np.float32)
+            for i, (book_id, features) in enumerate(docs):
+                fresh._place(book_id, fresh._vectorize(features))
+                if i % 500 == 0:
+                    await asyncio.sleep(0)
+            del docs
+
+            if settings.VECTOR_IVF_MIN_ROWS and fresh._size >= settings.VECTOR_IVF_MIN_ROWS:
+                # k-means is pure NumPy; keep it off the event loop. Only this
+                # build touches `fresh`, and it is swapped in once training is done
+                fresh._centroids, fresh._cells = await asyncio.to_thread(
+                    _train_ivf, fresh._matrix[:fresh._size]
+                )
+
+            for op, payload in self._pending:
+                if op == "upsert":
+                    fresh.upsert(payload)
+                else:
+                    fresh.remove(payload)
+
+            self.__dict__.update({
+                key: value for key, value in fresh.__dict__.items()
+                if key not in ("_building", "_pending")
+            })
+            self.ready = True
+        finally:
+            self._building = False
+            self._pending = []
+
+vector_index = VectorIndex()
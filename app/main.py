@@ -1,15 +1,93 @@
-from fastapi import FastAPI
+import asyncio
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+from app.cores.config import settings
+from app.cores.database import books_collection, transactions_collection, book_popularity_collection
+from app.cores.background import refresh_periodically
+from app.cores.loader import loader_scope
+from app.cores.search_index import catalogue_index
+from app.cores.suggestion_index import suggestion_index
+from app.cores.vector_index import vector_index
+from app.cores.recommender import recommender
+from app.cores.popularity import popularity
+from app.cores.rollup import circulation_rollup
+from app.cores.jobs import report_jobs
+from app.cores.analytics import analytics_engine
+from app.cores.fulltext import ebook_text_index
+from app.cores.bookmark_buffer import bookmark_buffer
+from app.cores.principal_cache import principal_cache
+from app.cores.password_hasher import password_hasher
+from app.cores.kv_store import kv_store
+from app.cores.health import health_monitor
 from app.routers import (
     auth_routes, book_routes, member_routes, transaction_routes,
     fine_routes, reservation_routes, search_routes, ebook_routes,
     report_routes, system_routes, ai_routes
 )
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # In-memory indexes are built in the background; endpoints fall back
+    # to MongoDB queries until they are ready
+    background_tasks = [
+        asyncio.create_task(refresh_periodically(
+            "Catalogue search index",
+            lambda: catalogue_index.build(books_collection),
+            settings.SEARCH_INDEX_REFRESH_SECONDS
+        )),
+        asyncio.create_task(refresh_periodically(
+            "Suggestion index",
+            lambda: suggestion_index.build(books_collection, book_popularity_collection),
+            settings.SEARCH_INDEX_REFRESH_SECONDS
+        )),
+        asyncio.create_task(refresh_periodically(
+            "Vector index",
+            lambda: vector_index.build(books_collection),
+            settings.VECTOR_INDEX_REFRESH_SECONDS
+        )),
+        asyncio.create_task(refresh_periodically(
+            "Co-borrow recommender",
+            lambda: recommender.build(transactions_collection),
+            settings.RECOMMENDATION_REFRESH_SECONDS
+        )),
+        asyncio.create_task(refresh_periodically(
+            "Popular books",
+            lambda: popularity.refresh(book_popularity_collection, transactions_collection),
+            settings.POPULARITY_REFRESH_SECONDS
+        )),
+        asyncio.create_task(refresh_periodically(
+            "Daily stats rollup",
+            circulation_rollup.refresh,
+            settings.DAILY_STATS_REFRESH_SECONDS
+        )),
+        asyncio.create_task(refresh_periodically(
+            "Analytics engine",
+            analytics_engine.refresh,
+            settings.ANALYTICS_REFRESH_SECONDS
+        ))
+    ]
+    report_jobs.start()
+    bookmark_buffer.start()
+    principal_cache.start()
+    kv_store.start()
+    health_monitor.start()
+    yield
+    for task in background_tasks:
+        task.cancel()
+    report_jobs.stop()
+    principal_cache.stop()
+    kv_store.stop()
+    health_monitor.stop()
+    ebook_text_index.shutdown()
+    password_hasher.shutdown()
+    await bookmark_buffer.stop()
+
 app = FastAPI(
     title="Library Management System",
     description="Comprehensive Library Management System with 54 API endpoints",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # ✅ CORS CONFIG
@@ -21,6 +99,12 @@ app.add_middleware(
     allow_headers=["*"],  # Authorization, Content-Type, etc
 )
 
+# Request-scoped batch loader for list endpoints
+@app.middleware("http")
+async def batch_loader_scope(request: Request, call_next):
+    with loader_scope():
+        return await call_next(request)
+
 # Include all routers
 app.include_router(auth_routes.router)
 app.include_router(book_routes.router)
@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Query, Depends, File, UploadFile, Form
+from fastapi import APIRouter, Query, Depends, File, UploadFile, Form, Header
 from app.controllers.book_controller import (
     add_book, get_books, get_book_by_id, update_book, delete_book,
-    get_categories, get_authors, check_availability, upload_book_with_image
+    get_categories, get_authors, check_availability, upload_book_with_image, get_cover
 )
 from app.schemas.book_schema import BookCreate, BookUpdate
 from app.utils.auth import librarian_required, get_current_user
@@ -15,10 +15,12 @@ async def list_books(
     page_size: int = Query(20, ge=1, le=100),
     category: Optional[str] = None,
     author: Optional[str] = None,
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    include_total: bool = True
 ):
     """List all books with pagination and filters"""
-    return await get_books(page, page_size, category, author, search)
+    return await get_books(page, page_size, category, author, search, cursor, include_total)
 
 @router.get("/categories")
 async def fetch_categories():
@@ -30,6 +32,11 @@ async def fetch_authors():
     """Get all authors"""
     return await get_authors()
 
+@router.get("/covers/{backend}/{location}")
+async def fetch_cover(backend: str, location: str, if_none_match: Optional[str] = Header(None)):
+    """Get a book cover image"""
+    return await get_cover(backend, location, if_none_match)
+
 @router.get("/{book_id}")
 async def get_book(book_id: str):
     """Get a single book by ID"""
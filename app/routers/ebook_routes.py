@@ -1,5 +1,7 @@
-from fastapi import APIRouter, Depends, File, UploadFile, Form
-from app.controllers.ebook_controller import list_ebooks, upload_ebook, download_ebook, save_bookmark, get_bookmark
+from fastapi import APIRouter, Depends, File, UploadFile, Form, Header, Query
+from app.controllers.ebook_controller import (
+    list_ebooks, search_ebook_text, upload_ebook, download_ebook, delete_ebook, save_bookmark, get_bookmark
+)
 from app.utils.auth import librarian_required, member_required, get_current_user
 from typing import Optional
 
@@ -10,6 +12,16 @@ async def fetch_ebooks(category: Optional[str] = None):
     """List all e-books"""
     return await list_ebooks(category)
 
+@router.get("/search", dependencies=[Depends(member_required)])
+async def search_inside_ebooks(
+    q: str = Query(..., min_length=2),
+    ebook_id: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(get_current_user)
+):
+    """Search the text of e-books (optionally one e-book); hits give the page to open or bookmark"""
+    return await search_ebook_text(str(current_user["_id"]), q, ebook_id, limit)
+
 @router.post("/upload", dependencies=[Depends(librarian_required)])
 async def upload_new_ebook(
     title: str = Form(...),
@@ -20,10 +32,21 @@ async def upload_new_ebook(
     """Upload an e-book file (librarian/admin only)"""
     return await upload_ebook(title, author, category, file)
 
+@router.delete("/{ebook_id}", dependencies=[Depends(librarian_required)])
+async def remove_ebook(ebook_id: str):
+    """Delete an e-book (librarian/admin only)"""
+    return await delete_ebook(ebook_id)
+
 @router.get("/{ebook_id}/download", dependencies=[Depends(member_required)])
-async def download_ebook_file(ebook_id: str):
-    """Download an e-book file"""
-    return await download_ebook(ebook_id)
+async def download_ebook_file(
+    ebook_id: str,
+    inline: bool = False,
+    range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    if_range: Optional[str] = Header(None)
+):
+    """Download an e-book file (supports Range requests for resumable downloads and in-browser reading)"""
+    return await download_ebook(ebook_id, range, if_none_match, if_range, inline)
 
 @router.post("/{ebook_id}/bookmark", dependencies=[Depends(member_required)])
 async def save_reading_bookmark(
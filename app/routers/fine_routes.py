@@ -11,10 +11,12 @@ async def fetch_fines(
     member_id: Optional[str] = None,
     status: Optional[str] = None,
     page: int = Query(1, ge=1),
-    page_size: int = Query(20, ge=1, le=100)
+    page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    include_total: bool = True
 ):
     """List fines with filters (librarian/admin only)"""
-    return await list_fines(member_id, status, page, page_size)
+    return await list_fines(member_id, status, page, page_size, cursor, include_total)
 
 @router.post("/{fine_id}/pay", dependencies=[Depends(member_required)])
 async def pay_fine_endpoint(fine_id: str, payment_data: PayFineRequest):
@@ -12,10 +12,12 @@ router = APIRouter(prefix="/members", tags=["Members"])
 @router.get("/", dependencies=[Depends(librarian_required)])
 async def fetch_members(
     page: int = Query(1, ge=1),
-    page_size: int = Query(20, ge=1, le=100)
+    page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    include_total: bool = True
 ):
     """List all members (librarian/admin only)"""
-    return await list_members(page, page_size)
+    return await list_members(page, page_size, cursor, include_total)
 
 @router.post("/", dependencies=[Depends(librarian_required)])
 async def create_member(member: MemberCreate):
@@ -31,10 +33,12 @@ async def modify_member(member_id: str, member: MemberUpdate):
 async def search_member(
     q: str = Query(..., min_length=1),
     page: int = Query(1, ge=1),
-    page_size: int = Query(20, ge=1, le=100)
+    page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    include_total: bool = True
 ):
     """Search members by name, email, or membership ID (librarian/admin only)"""
-    return await search_members(q, page, page_size)
+    return await search_members(q, page, page_size, cursor, include_total)
 
 @router.get("/{member_id}/profile")
 async def get_profile(
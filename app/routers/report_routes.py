@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends, Query
 from app.controllers.report_controller import (
     borrowing_report, fines_report, popular_books_report,
-    generate_custom_report, export_report
+    generate_custom_report, export_report, export_dataset,
+    submit_report_job, get_report_job
 )
-from app.schemas.report_schema import ReportRequest
+from app.schemas.report_schema import ReportRequest, ReportJobRequest
 from app.utils.auth import librarian_required
 from datetime import datetime
 from typing import Optional
@@ -13,23 +14,38 @@ router = APIRouter(prefix="/reports", tags=["Reports"])
 @router.get("/borrowing", dependencies=[Depends(librarian_required)])
 async def get_borrowing_report(
     start_date: Optional[datetime] = None,
-    end_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None,
+    interval: Optional[str] = Query(None, pattern="^(daily|weekly|monthly)$")
 ):
     """Generate borrowing statistics report"""
-    return await borrowing_report(start_date, end_date)
+    return await borrowing_report(start_date, end_date, interval)
 
 @router.get("/fines", dependencies=[Depends(librarian_required)])
 async def get_fines_report(
     start_date: Optional[datetime] = None,
-    end_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None,
+    interval: Optional[str] = Query(None, pattern="^(daily|weekly|monthly)$")
 ):
     """Generate fines statistics report"""
-    return await fines_report(start_date, end_date)
+    return await fines_report(start_date, end_date, interval)
 
 @router.get("/popular-books", dependencies=[Depends(librarian_required)])
-async def get_popular_books(limit: int = Query(10, ge=1, le=50)):
+async def get_popular_books(
+    limit: int = Query(10, ge=1, le=50),
+    window: str = Query("all", pattern="^(7d|30d|365d|all)$")
+):
     """Generate popular books report"""
-    return await popular_books_report(limit)
+    return await popular_books_report(limit, window)
+
+@router.post("/jobs", dependencies=[Depends(librarian_required)])
+async def create_report_job(job_request: ReportJobRequest):
+    """Run a report in the background; poll the returned job for the result"""
+    return await submit_report_job(job_request)
+
+@router.get("/jobs/{job_id}", dependencies=[Depends(librarian_required)])
+async def fetch_report_job(job_id: str):
+    """Get report job status and result"""
+    return await get_report_job(job_id)
 
 @router.post("/custom", dependencies=[Depends(librarian_required)])
 async def create_custom_report(report_params: dict):
@@ -39,7 +55,18 @@ async def create_custom_report(report_params: dict):
 @router.post("/export", dependencies=[Depends(librarian_required)])
 async def export_report_data(
     report_data: dict,
-    format: str = Query("csv", regex="^(csv|json)$")
+    format: str = Query("csv", pattern="^(csv|json)$")
 ):
     """Export report in specified format"""
     return await export_report(report_data, format)
+
+@router.get("/export/{dataset}", dependencies=[Depends(librarian_required)])
+async def stream_dataset_export(
+    dataset: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False
+):
+    """Stream raw transactions, fines, members or books as CSV or NDJSON"""
+    return await export_dataset(dataset, start_date, end_date, format, gzip)
@@ -14,7 +14,7 @@ async def perform_advanced_search(search_params: AdvancedSearchRequest):
 @router.get("/suggestions")
 async def get_search_suggestions(
     q: str = Query(..., min_length=2),
-    type: str = Query("all", regex="^(all|titles|authors|categories)$")
+    type: str = Query("all", pattern="^(all|titles|authors|categories)$")
 ):
     """Get autocomplete suggestions"""
     return await get_suggestions(q, type)
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from app.controllers.system_controller import (
-    get_settings, update_settings, health_check, list_staff, add_staff
+    get_settings, update_settings, health_check, liveness_check, health_diagnostics,
+    list_staff, add_staff, create_snapshot, get_snapshot_job
 )
 from app.schemas.system_schema import SettingUpdate, StaffCreate
 from app.utils.auth import admin_required, librarian_required
+from typing import List, Optional
 
 router = APIRouter(prefix="/system", tags=["System"])
 
@@ -18,10 +20,21 @@ async def modify_settings(setting: SettingUpdate):
     return await update_settings(setting)
 
 @router.get("/health")
+@router.get("/health/ready")
 async def check_health():
-    """Check system health and database connectivity"""
+    """Readiness probe: database reachable (503 if not)"""
     return await health_check()
 
+@router.get("/health/live")
+async def check_liveness():
+    """Liveness probe: process up and event loop responsive"""
+    return await liveness_check()
+
+@router.get("/health/deep", dependencies=[Depends(admin_required)])
+async def check_health_deep():
+    """Detailed diagnostics, cached for a short while (admin only)"""
+    return await health_diagnostics()
+
 @router.get("/staff", dependencies=[Depends(admin_required)])
 async def fetch_staff():
     """List all staff members (admin only)"""
@@ -31,3 +44,16 @@ async def fetch_staff():
 async def create_staff(staff: StaffCreate):
     """Add a new staff member (admin only)"""
     return await add_staff(staff)
+
+@router.post("/snapshot", dependencies=[Depends(admin_required)])
+async def export_data_snapshot(
+    tables: Optional[List[str]] = Query(None),
+    full: bool = False
+):
+    """Export books, members, transactions and fines to Parquet in the background (admin only)"""
+    return await create_snapshot(tables, full)
+
+@router.get("/snapshot/{job_id}", dependencies=[Depends(admin_required)])
+async def fetch_snapshot_job(job_id: str):
+    """Get snapshot job status and result (admin only)"""
+    return await get_snapshot_job(job_id)
@@ -23,10 +23,12 @@ async def return_borrowed_book(return_data: ReturnRequest):
 async def get_history(
     member_id: Optional[str] = None,
     page: int = Query(1, ge=1),
-    page_size: int = Query(20, ge=1, le=100)
+    page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    include_total: bool = True
 ):
     """Get transaction history"""
-    return await get_transaction_history(member_id, page, page_size)
+    return await get_transaction_history(member_id, page, page_size, cursor, include_total)
 
 @router.get("/overdue", dependencies=[Depends(librarian_required)])
 async def get_overdue():
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import datetime
 
@@ -11,3 +11,11 @@ class ReportResponse(BaseModel):
     report_type: str
     generated_at: datetime
     data: dict
+
+class ReportJobRequest(BaseModel):
+    report: str  # borrowing, fines or popular-books
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    interval: Optional[str] = None  # daily, weekly or monthly
+    limit: int = Field(10, ge=1, le=50)  # popular-books only
+    window: str = "all"  # popular-books only: 7d, 30d, 365d or all
@@ -1,7 +1,8 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from app.utils.utils import decode_access_token
-from app.cores.database import users_collection
+from app.cores.database import users_collection, members_collection
+from app.cores.principal_cache import principal_cache
 from bson import ObjectId
 from typing import Optional
 
@@ -26,12 +27,22 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             detail="Invalid authentication credentials"
         )
     
-    user = await users_collection.find_one({"_id": ObjectId(user_id)})
+    user = principal_cache.get(user_id)
     if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found"
-        )
+        if not ObjectId.is_valid(user_id):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid authentication credentials"
+            )
+        user = await users_collection.find_one({"_id": ObjectId(user_id)}, {"password_hash": 0})
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found"
+            )
+        member = await members_collection.find_one({"user_id": user_id}, {"_id": 1})
+        user["member_id"] = str(member["_id"]) if member else None
+        principal_cache.put(user_id, user)
     
     if not user.get("is_active", True):
         raise HTTPException(
@@ -39,7 +50,8 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             detail="Inactive user"
         )
     
-    return user
+    # Callers get their own copy of the cached principal
+    return dict(user)
 
 async def get_current_active_user(current_user: dict = Depends(get_current_user)):
     """Get current active user"""
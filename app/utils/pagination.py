@@ -0,0 +1,72 @@
+from fastapi import HTTPException, status
+from bson import json_util
+from app.cores.config import settings
+from typing import Optional
+import base64
+import time
+
+# (collection name, serialized query) -> (expires_at, count)
+_count_cache = {}
+
+def encode_cursor(doc: dict, sort_field: str) -> str:
+    """Build an opaque cursor pointing just after `doc`"""
+    payload = json_util.dumps({"v": doc.get(sort_field), "id": doc["_id"]})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """Return (sort value, _id) from a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        return payload["v"], payload["id"]
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+def sort_spec(sort_field: str, direction: int = -1) -> list:
+    """Sort on the keyset field with _id as the tie-breaker"""
+    if sort_field == "_id":
+        return [("_id", direction)]
+    return [(sort_field, direction), ("_id", direction)]
+
+def keyset_query(query: dict, sort_field: str, direction: int, cursor: Optional[str]) -> dict:
+    """Restrict `query` to rows that sort after the cursor position"""
+    if not cursor:
+        return query
+
+    value, last_id = decode_cursor(cursor)
+    op = "$lt" if direction < 0 else "$gt"
+    if sort_field == "_id":
+        after = {"_id": {op: last_id}}
+    else:
+        after = {"$or": [
+            {sort_field: {op: value}},
+            {sort_field: value, "_id": {op: last_id}}
+        ]}
+
+    if not query:
+        return after
+    return {"$and": [query, after]}
+
+def next_cursor(rows: list, sort_field: str, page_size: int) -> Optional[str]:
+    """Cursor for the following page, or None when this page is the last"""
+    if len(rows) < page_size:
+        return None
+    return encode_cursor(rows[-1], sort_field)
+
+async def cached_count(collection, query: dict) -> int:
+    """count_documents with a short TTL cache for paginated totals"""
+    key = (collection.name, json_util.dumps(query, sort_keys=True))
+    now = time.monotonic()
+
+    cached = _count_cache.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    total = await collection.count_documents(query)
+    if len(_count_cache) >= 1024:
+        _count_cache.clear()
+    _count_cache[key] = (now + settings.COUNT_CACHE_SECONDS, total)
+    return total
@@ -0,0 +1,87 @@
+# Plain-text extraction from e-book files. These functions run in worker
+# processes, so they only take a file path and return plain data.
+from html.parser import HTMLParser
+from typing import List, Tuple
+from xml.etree import ElementTree
+import posixpath
+import re
+import zipfile
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def _clean(text: str) -> str:
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+def _pdf_pages(path: str) -> List[Tuple[int, str]]:
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    pages = []
+    for number, page in enumerate(reader.pages, start=1):
+        try:
+            text = _clean(page.extract_text() or "")
+        except Exception:
+            # One malformed page should not lose the rest of the book
+            text = ""
+        if text:
+            pages.append((number, text))
+    return pages
+
+class _HTMLText(HTMLParser):
+    """Collect the visible text of an XHTML document"""
+
+    _SKIP = {"script", "style", "head"}
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP:
+            self._skipping += 1
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP and self._skipping:
+            self._skipping -= 1
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self.parts.append(data)
+
+def _epub_pages(path: str) -> List[Tuple[int, str]]:
+    """EPUBs have no fixed pages: each spine document counts as one"""
+    ns = {
+        "container": "urn:oasis:names:tc:opendocument:xmlns:container",
+        "opf": "http://www.idpf.org/2007/opf"
+    }
+    with zipfile.ZipFile(path) as archive:
+        container = ElementTree.fromstring(archive.read("META-INF/container.xml"))
+        opf_path = container.find(".//container:rootfile", ns).get("full-path")
+        opf = ElementTree.fromstring(archive.read(opf_path))
+        base = posixpath.dirname(opf_path)
+
+        manifest = {
+            item.get("id"): posixpath.normpath(posixpath.join(base, item.get("href")))
+            for item in opf.iterfind(".//opf:manifest/opf:item", ns)
+        }
+        pages = []
+        for number, itemref in enumerate(opf.iterfind(".//opf:spine/opf:itemref", ns), start=1):
+            href = manifest.get(itemref.get("idref"))
+            if not href or href not in archive.namelist():
+                continue
+            parser = _HTMLText()
+            parser.feed(archive.read(href).decode("utf-8", errors="replace"))
+            text = _clean(" ".join(parser.parts))
+            if text:
+                pages.append((number, text))
+        return pages
+
+EXTRACTORS = {
+    "pdf": _pdf_pages,
+    "epub": _epub_pages
+}
+
+def extract_pages(path: str, file_format: str) -> List[Tuple[int, str]]:
+    """(page number, text) for every non-empty page of the file"""
+    return EXTRACTORS[file_format](path)
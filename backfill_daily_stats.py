@@ -0,0 +1,29 @@
+"""
+Rebuild the daily_stats circulation rollup from raw transactions and fines.
+
+The API server keeps the rollup current by re-rolling recent days. Run this
+for history: after bulk imports, manual edits, or to rebuild from scratch.
+
+Usage:
+    python backfill_daily_stats.py [--since YYYY-MM-DD]
+"""
+
+import argparse
+import asyncio
+from datetime import datetime
+from app.cores.rollup import circulation_rollup
+
+async def main():
+    parser = argparse.ArgumentParser(description='Backfill the daily_stats rollup')
+    parser.add_argument('--since', help='First day to rebuild (default: the first loan)')
+    args = parser.parse_args()
+    
+    since = datetime.strptime(args.since, "%Y-%m-%d") if args.since else None
+    rows = await circulation_rollup.backfill(since)
+    if rows is None:
+        print("The rollup is being refreshed by another process; try again shortly.")
+        return
+    print(f"Wrote {rows} daily_stats row(s).")
+
+if __name__ == "__main__":
+    asyncio.run(main())
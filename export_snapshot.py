@@ -0,0 +1,39 @@
+"""
+Export library collections to partitioned Parquet files for offline analytics.
+
+Each run writes <output>/<table>/snapshot=<time>/part-0.parquet with typed
+columns (UTC timestamps, dictionary-encoded IDs and categories). By default
+transactions and fines are exported incrementally since the last run's
+watermark; books and members are always written in full.
+
+Load a table with pandas, keeping the latest row per id:
+    df = pd.read_parquet("snapshots/transactions")
+    df = df.sort_values("snapshot_at").drop_duplicates("id", keep="last")
+
+Usage:
+    python export_snapshot.py [--tables transactions fines] [--full] [--output snapshots]
+"""
+
+import argparse
+import asyncio
+from app.cores.snapshot import SNAPSHOT_TABLES, SnapshotInProgress, export_snapshot
+
+async def main():
+    parser = argparse.ArgumentParser(description='Export collections to Parquet snapshots')
+    parser.add_argument('--tables', nargs='+', choices=list(SNAPSHOT_TABLES),
+                        help='Tables to export (default: all)')
+    parser.add_argument('--full', action='store_true', help='Ignore the watermark and export everything')
+    parser.add_argument('--output', help='Output directory (default: SNAPSHOT_DIR)')
+    args = parser.parse_args()
+    
+    try:
+        result = await export_snapshot(args.tables, incremental=not args.full, output_dir=args.output)
+    except SnapshotInProgress as e:
+        print(f"{e}; try again when it finishes.")
+        return
+    print(f"Snapshot {result['snapshot_at']:%Y-%m-%d %H:%M:%S} written to {result['output_dir']}")
+    for name, table in result['tables'].items():
+        print(f"  {name}: {table['rows']} row(s), {table['mode']}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,32 @@
+"""
+Garbage-collect deduplicated e-book storage.
+
+Recounts how many e-books reference each stored file, deletes files no
+e-book uses any more and removes orphaned stored files left behind by
+interrupted uploads. With --adopt-legacy, e-books uploaded before
+deduplication are hashed first and duplicate copies merged.
+
+Usage:
+    python gc_ebook_blobs.py [--adopt-legacy]
+"""
+
+import argparse
+import asyncio
+from app.cores.blobs import blob_store
+
+async def main():
+    parser = argparse.ArgumentParser(description='Garbage-collect deduplicated e-book storage')
+    parser.add_argument('--adopt-legacy', action='store_true', help='Hash and deduplicate e-books uploaded before deduplication')
+    args = parser.parse_args()
+    
+    if args.adopt_legacy:
+        adopted = await blob_store.adopt_legacy()
+        print(f"Adopted {adopted} legacy e-book(s).")
+    result = await blob_store.collect_garbage()
+    print(
+        f"Recounted {result['recounted']} blob(s), deleted {result['deleted_blobs']} unreferenced blob(s) "
+        f"and {result['deleted_orphan_files']} orphaned file(s)."
+    )
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -26,7 +26,8 @@ import argparse
 sys.path.insert(0, str(Path(__file__).parent))
 
 from app.cores.config import settings
-from app.utils.utils import hash_password
+from app.cores.password_hasher import password_hasher
+from app.cores.principal_cache import principal_cache
 from motor.motor_asyncio import AsyncIOMotorClient
 from app.controllers.member_controller import generate_membership_id
 
@@ -108,11 +109,14 @@ class ExcelImporter:
         """Clear existing data from collections"""
         if self.clear_existing:
             print("🗑️  Clearing existing data...")
+            # Running servers must drop cached logins of the users deleted here
+            cleared_users = await self.collections['users'].distinct("_id")
             await self.collections['books'].delete_many({})
             await self.collections['members'].delete_many({})
             await self.collections['users'].delete_many({})
             await self.collections['transactions'].delete_many({})
             await self.collections['reservations'].delete_many({})
+            await principal_cache.invalidate_many(cleared_users)
             print("✅ Existing data cleared")
     
     async def import_books(self, df: pd.DataFrame):
@@ -324,11 +328,17 @@ class ExcelImporter:
         # Create user_id mapping for members
         user_id_map = {}
         
+        # First pass: validate rows; passwords are hashed together afterwards
+        pending = []
+        pending_emails = set()
         for idx, row in df.iterrows():
             try:
                 email = str(row[actual_columns['email']]).strip().lower()
                 
-                # Check if user already exists
+                # Check if user already exists (or appears earlier in the sheet)
+                if email in pending_emails:
+                    print(f"   ⚠️  User with email {email} appears twice, using the first row...")
+                    continue
                 existing = await self.collections['users'].find_one({"email": email})
                 if existing:
                     user_id_map[email] = str(existing["_id"])
@@ -346,19 +356,31 @@ class ExcelImporter:
                 
                 user_doc = {
                     "email": email,
-                    "password_hash": hash_password(password),
                     "full_name": full_name,
                     "role": role,
                     "is_active": True,
                     "created_at": datetime.now(timezone.utc)
                 }
-                
+                pending.append((idx, user_doc, password))
+                pending_emails.add(email)
+                    
+            except Exception as e:
+                self.stats['users']['errors'] += 1
+                print(f"   ❌ Error importing row {idx + 1}: {str(e)}")
+        
+        # bcrypt is slow: hash every password in parallel on all cores
+        print(f"   🔐 Hashing {len(pending)} password(s)...")
+        hashes = await password_hasher.hash_many([password for _, _, password in pending])
+        
+        for count, ((idx, user_doc, _), password_hash) in enumerate(zip(pending, hashes), start=1):
+            try:
+                user_doc["password_hash"] = password_hash
                 result = await self.collections['users'].insert_one(user_doc)
-                user_id_map[email] = str(result.inserted_id)
+                user_id_map[user_doc["email"]] = str(result.inserted_id)
                 self.stats['users']['imported'] += 1
                 
-                if (idx + 1) % 10 == 0:
-                    print(f"   ✅ Imported {idx + 1}/{len(df)} users...")
+                if count % 10 == 0:
+                    print(f"   ✅ Imported {count}/{len(pending)} users...")
                     
             except Exception as e:
                 self.stats['users']['errors'] += 1
@@ -430,6 +452,8 @@ class ExcelImporter:
                 }
                 
                 await self.collections['members'].insert_one(member_doc)
+                # The user's cached principal has no member_id yet
+                await principal_cache.invalidate(user_id)
                 self.stats['members']['imported'] += 1
                 
                 if (idx + 1) % 10 == 0:
@@ -652,6 +676,27 @@ async def main():
             # Auto-detect
             await importer.auto_detect_and_import(sheets)
         
+        # Imported or cleared loans and members bypass the API, so rebuild the
+        # member counters (loans and pending fines) whenever any of them changed
+        loans_changed = importer.clear_existing or importer.stats['transactions']['imported'] > 0
+        if loans_changed or importer.stats['members']['imported'] > 0:
+            from app.controllers.transaction_controller import reconcile_member_counters
+            await reconcile_member_counters()
+        
+        # ...and popularity and the daily rollup when loans changed
+        if loans_changed:
+            from app.cores.database import book_popularity_collection, transactions_collection
+            from app.cores.lease import lease
+            from app.cores.popularity import rebuild_counters, REBUILD_LEASE
+            from app.cores.rollup import circulation_rollup
+            async with lease(REBUILD_LEASE, settings.REFRESH_LEASE_SECONDS) as held:
+                if held:
+                    await rebuild_counters(book_popularity_collection, transactions_collection)
+                else:
+                    print("⚠️  Popularity counters are being rebuilt elsewhere; run rebuild_popularity.py afterwards")
+            if await circulation_rollup.backfill() is None:
+                print("⚠️  The daily_stats rollup is busy in the server; run backfill_daily_stats.py afterwards")
+        
         # Print summary
         importer.print_summary()
         
@@ -662,6 +707,8 @@ async def main():
         print(f"\n❌ Import failed: {str(e)}")
         import traceback
         traceback.print_exc()
+    finally:
+        password_hasher.shutdown()
 
 
 if __name__ == "__main__":
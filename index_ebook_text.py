@@ -0,0 +1,29 @@
+"""
+Extract and index the text of stored e-books for in-book search.
+
+New uploads are indexed automatically. Run this for e-books uploaded
+before full-text search existed (after gc_ebook_blobs.py --adopt-legacy),
+to retry failed extractions, or with --reindex after changing the
+extractor.
+
+Usage:
+    python index_ebook_text.py [--reindex]
+"""
+
+import argparse
+import asyncio
+from app.cores.fulltext import ebook_text_index
+
+async def main():
+    parser = argparse.ArgumentParser(description='Index the text of stored e-books')
+    parser.add_argument('--reindex', action='store_true', help='Re-extract every e-book, not only new or failed ones')
+    args = parser.parse_args()
+    
+    try:
+        indexed = await ebook_text_index.backfill(args.reindex)
+    finally:
+        ebook_text_index.shutdown()
+    print(f"Indexed {len(indexed)} stored e-book file(s).")
+
+if __name__ == "__main__":
+    asyncio.run(main())
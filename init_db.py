@@ -21,18 +21,84 @@ async def test_connection():
         
         # User indexes
         await db.users.create_index("email", unique=True)
+        # Principal cache invalidations only need to outlive the poll interval
+        await db.principal_invalidations.create_index("at", expireAfterSeconds=3600)
         print("- User email index created")
         
+        # Key-value store: MongoDB drops keys once expires_at passes
+        await db.kv_store.create_index("expires_at", expireAfterSeconds=0)
+        print("- Key-value store TTL index created")
+        
         # Book indexes
         await db.books.create_index("isbn", unique=True)
         await db.books.create_index([("title", "text"), ("author", "text"), ("category", "text")])
+        # Raw exports stream in date order
+        await db.books.create_index([("created_at", 1), ("_id", 1)])
         print("- Book indexes created")
         
+        # Member indexes: raw exports stream in membership_start order
+        await db.members.create_index([("membership_start", 1), ("_id", 1)])
+        print("- Member indexes created")
+        
         # Transaction indexes
         await db.transactions.create_index("member_id")
         await db.transactions.create_index("book_id")
+        # Keyset pagination: sort field + _id tie-breaker
+        await db.transactions.create_index([("borrow_date", -1), ("_id", -1)])
+        await db.transactions.create_index([("member_id", 1), ("borrow_date", -1), ("_id", -1)])
+        # Open loans for reports; rollup scans by event date
+        await db.transactions.create_index([("status", 1), ("borrow_date", 1)])
+        await db.transactions.create_index("return_date")
+        await db.transactions.create_index("due_date")
         print("- Transaction indexes created")
         
+        # Fine indexes
+        await db.fines.create_index([("created_at", -1), ("_id", -1)])
+        await db.fines.create_index([("member_id", 1), ("created_at", -1), ("_id", -1)])
+        await db.fines.create_index([("status", 1), ("created_at", 1)])
+        await db.fines.create_index("paid_at", sparse=True)
+        await db.fines.create_index("waived_at", sparse=True)
+        print("- Fine indexes created")
+        
+        # Popularity counters: one bucket per book per day (day=None is all-time)
+        await db.book_popularity.create_index([("book_id", 1), ("day", 1)], unique=True)
+        await db.book_popularity.create_index([("day", 1), ("count", -1)])
+        print("- Popularity indexes created")
+        
+        # Daily circulation rollup: one row per day x category x membership type
+        await db.daily_stats.create_index(
+            [("date", 1), ("category", 1), ("membership_type", 1)], unique=True
+        )
+        print("- Daily stats indexes created")
+        
+        # E-book indexes (blobs are keyed by their SHA-256 digest)
+        await db.ebooks.create_index("sha256", sparse=True)
+        await db.ebook_passages.create_index([("sha256", 1), ("page", 1)])
+        await db.ebook_passages.create_index([("text", "text")], default_language="english")
+        print("- E-book indexes created")
+        
+        # Bookmarks: one per user per e-book (drop duplicates left by old races first)
+        async for group in db.bookmarks.aggregate([
+            {"$sort": {"last_read": -1}},
+            {"$group": {"_id": {"user_id": "$user_id", "ebook_id": "$ebook_id"}, "ids": {"$push": "$_id"}}},
+            {"$match": {"ids.1": {"$exists": True}}}
+        ], allowDiskUse=True):
+            await db.bookmarks.delete_many({"_id": {"$in": group["ids"][1:]}})
+        await db.bookmarks.create_index([("user_id", 1), ("ebook_id", 1)], unique=True)
+        print("- Bookmark indexes created")
+        
+        # Report jobs: polled by job_id, claimed oldest first, dropped after expiry
+        await db.report_jobs.create_index("job_id", unique=True)
+        await db.report_jobs.create_index([("status", 1), ("created_at", 1)])
+        await db.report_jobs.create_index("expires_at", expireAfterSeconds=0)
+        print("- Report job indexes created")
+        
+        # Leases: single-writer locks for background refreshes, dropped once expired
+        await db.leases.create_index("expires_at", expireAfterSeconds=0)
+        # Earlier versions kept leases in system_settings
+        await db.system_settings.delete_many({"_id": {"$regex": "^lease:"}})
+        print("- Lease indexes created")
+        
         print("Database initialized successfully!")
         
     except Exception as e:
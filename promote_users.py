@@ -2,15 +2,19 @@
 import asyncio
 from app.cores.database import users_collection
 from app.cores.config import settings
+from app.cores.principal_cache import principal_cache
 
 async def promote_users():
     print(f"Connecting to MongoDB at: {settings.MONGO_URI}")
     
     # Update users
+    promoted = [user["_id"] async for user in users_collection.find({"role": {"$ne": "admin"}}, {"_id": 1})]
     result = await users_collection.update_many(
-        {},
+        {"_id": {"$in": promoted}},
         {"$set": {"role": "admin"}}
     )
+    # Running servers must not keep serving the old role from their principal cache
+    await principal_cache.invalidate_many(promoted)
     print(f"Promoted {result.modified_count} users to admin.")
     
     # List users to verify
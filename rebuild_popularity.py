@@ -0,0 +1,26 @@
+"""
+Rebuild the rolling-window popularity counters from the transactions collection.
+
+Borrows made through the API keep the daily buckets up to date. Run this
+after bulk imports, manual edits, or if the counters look off.
+
+Usage:
+    python rebuild_popularity.py
+"""
+
+import asyncio
+from app.cores.config import settings
+from app.cores.database import book_popularity_collection, transactions_collection
+from app.cores.lease import lease
+from app.cores.popularity import rebuild_counters, REBUILD_LEASE
+
+async def main():
+    async with lease(REBUILD_LEASE, settings.REFRESH_LEASE_SECONDS) as held:
+        if not held:
+            print("A rebuild is already running in another process; try again later.")
+            return
+        books = await rebuild_counters(book_popularity_collection, transactions_collection)
+    print(f"Rebuilt popularity counters for {books} book(s).")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,24 @@
+"""
+Rebuild the denormalized circulation counters on member documents.
+
+current_borrowed and pending_fine_total are maintained by the borrow, return
+and fine endpoints. Run this after bulk imports or manual database edits.
+
+Usage:
+    python reconcile_counters.py [--member <member_id>]
+"""
+
+import argparse
+import asyncio
+from app.controllers.transaction_controller import reconcile_member_counters
+
+async def main():
+    parser = argparse.ArgumentParser(description='Rebuild member circulation counters')
+    parser.add_argument('--member', help='Reconcile a single member (by member ID)')
+    args = parser.parse_args()
+    
+    result = await reconcile_member_counters(args.member)
+    print(f"Reconciled counters for {result['members_updated']} member(s).")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -54,6 +54,8 @@ async def seed_members():
         }
         
         await members_coll.insert_one(member_doc)
+        # Tell running servers the user's cached principal has no member_id yet
+        await db.principal_invalidations.insert_one({"user_id": str(user_id), "at": datetime.utcnow()})
         count += 1
         
     print(f"Successfully created {count} new member profiles.")
@@ -0,0 +1,36 @@
+import requests
+import time
+import uuid
+
+from test_helpers import BASE_URL, login_admin
+
+def test_latest_page_wins():
+    headers = login_admin()
+    # Any valid ObjectId: bookmarks do not look the e-book up
+    ebook_id = uuid.uuid4().hex[:24]
+
+    res = requests.get(f"{BASE_URL}/ebooks/{ebook_id}/bookmark", headers=headers)
+    assert res.json()["page_number"] == 1
+
+    # Rapid page turns are coalesced; reads see the latest one at once
+    for page in range(2, 22):
+        res = requests.post(f"{BASE_URL}/ebooks/{ebook_id}/bookmark", params={"page_number": page}, headers=headers)
+        assert res.status_code == 200, res.text
+    res = requests.get(f"{BASE_URL}/ebooks/{ebook_id}/bookmark", headers=headers)
+    print(f"Bookmark after page turns: {res.json()}")
+    assert res.json()["page_number"] == 21
+
+    # ...and after the buffer has been flushed
+    time.sleep(3)
+    res = requests.get(f"{BASE_URL}/ebooks/{ebook_id}/bookmark", headers=headers)
+    assert res.json()["page_number"] == 21
+
+def test_invalid_ebook_id_is_rejected():
+    res = requests.post(f"{BASE_URL}/ebooks/not-an-id/bookmark", params={"page_number": 3}, headers=login_admin())
+    print(f"Status Code: {res.status_code}")
+    assert res.status_code == 400
+
+if __name__ == "__main__":
+    test_latest_page_wins()
+    test_invalid_ebook_id_is_rejected()
+    print("Bookmark tests passed")
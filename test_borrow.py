@@ -0,0 +1,91 @@
+import requests
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from test_helpers import BASE_URL, login_admin
+
+def create_member(headers, tag):
+    res = requests.post(f"{BASE_URL}/auth/register", json={
+        "email": f"borrower_{tag}@test.com",
+        "password": "password123",
+        "full_name": f"Borrower {tag}",
+        "role": "member"
+    })
+    assert res.status_code == 201, res.text
+    res = requests.post(f"{BASE_URL}/members/", json={
+        "user_id": res.json()["user_id"],
+        "phone": "555-0100",
+        "address": "1 Test Street"
+    }, headers=headers)
+    assert res.status_code == 200, res.text
+    return res.json()["member_id"]
+
+def create_book(headers, tag, copies=1):
+    res = requests.post(f"{BASE_URL}/books/", json={
+        "title": f"Borrow Race {tag}",
+        "author": "Test Author",
+        "isbn": f"979-{tag}",
+        "category": "Testing",
+        "total_copies": copies
+    }, headers=headers)
+    assert res.status_code == 200, res.text
+    return res.json()["book_id"]
+
+def test_last_copy_is_lent_once():
+    headers = login_admin()
+    tag = str(int(time.time() * 1000))
+    book_id = create_book(headers, tag)
+    members = [create_member(headers, f"{tag}_{i}") for i in range(5)]
+
+    # Five desks race for the only copy
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        responses = list(pool.map(
+            lambda member_id: requests.post(f"{BASE_URL}/transactions/borrow", json={
+                "member_id": member_id,
+                "book_id": book_id
+            }, headers=headers),
+            members
+        ))
+    codes = sorted(res.status_code for res in responses)
+    print(f"Status codes: {codes}")
+    assert codes == [200, 400, 400, 400, 400]
+
+    res = requests.get(f"{BASE_URL}/books/{book_id}/availability", headers=headers)
+    assert res.json()["available_copies"] == 0, res.text
+
+def test_member_counters_follow_borrow_and_return():
+    headers = login_admin()
+    tag = str(int(time.time() * 1000))
+    book_id = create_book(headers, tag, copies=2)
+    member_id = create_member(headers, tag)
+
+    res = requests.post(f"{BASE_URL}/transactions/borrow", json={"member_id": member_id, "book_id": book_id}, headers=headers)
+    assert res.status_code == 200, res.text
+    transaction_id = res.json()["transaction_id"]
+
+    eligibility = requests.get(f"{BASE_URL}/transactions/eligibility/{member_id}", headers=headers).json()
+    print(f"After borrow: {eligibility}")
+    assert eligibility["current_books_borrowed"] == 1
+
+    # Concurrent returns of one loan check it in once
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        responses = list(pool.map(
+            lambda _: requests.post(f"{BASE_URL}/transactions/return", json={"transaction_id": transaction_id}, headers=headers),
+            range(3)
+        ))
+    codes = sorted(res.status_code for res in responses)
+    print(f"Status codes: {codes}")
+    assert codes == [200, 400, 400]
+
+    eligibility = requests.get(f"{BASE_URL}/transactions/eligibility/{member_id}", headers=headers).json()
+    print(f"After return: {eligibility}")
+    assert eligibility["current_books_borrowed"] == 0
+    assert eligibility["is_eligible"]
+
+    res = requests.get(f"{BASE_URL}/books/{book_id}/availability", headers=headers)
+    assert res.json()["available_copies"] == 2, res.text
+
+if __name__ == "__main__":
+    test_last_copy_is_lent_once()
+    test_member_counters_follow_borrow_and_return()
+    print("Borrow tests passed")
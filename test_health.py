@@ -0,0 +1,29 @@
+import requests
+
+from test_helpers import BASE_URL, login_admin
+
+def test_shallow_probes():
+    res = requests.get(f"{BASE_URL}/system/health/live")
+    print(f"Liveness: {res.status_code} {res.json()}")
+    assert res.status_code == 200
+    assert res.json()["status"] == "ok"
+    assert "slow_samples" in res.json()
+
+    res = requests.get(f"{BASE_URL}/system/health/ready")
+    print(f"Readiness: {res.status_code} {res.json()}")
+    assert res.status_code == 200
+    assert res.json()["database"] == "healthy"
+
+def test_deep_probe_is_admin_only():
+    assert requests.get(f"{BASE_URL}/system/health/deep").status_code in (401, 403)
+
+    res = requests.get(f"{BASE_URL}/system/health/deep", headers=login_admin())
+    assert res.status_code == 200, res.text
+    pool = res.json()["connection_pool"]
+    print(f"Connection pool: {pool}")
+    assert {"max_size", "open", "checked_out", "waiting", "checkout_failures", "pool_clears"} <= set(pool)
+
+if __name__ == "__main__":
+    test_shallow_probes()
+    test_deep_probe_is_admin_only()
+    print("Health tests passed")
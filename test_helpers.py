@@ -0,0 +1,19 @@
+import requests
+
+BASE_URL = "http://localhost:3000"
+
+def login_admin():
+    """Register a temporary admin (might fail if it exists), log in and return auth headers"""
+    user_data = {
+        "email": "temp_admin@test.com",
+        "password": "password123",
+        "full_name": "Temp Admin",
+        "role": "admin"
+    }
+    requests.post(f"{BASE_URL}/auth/register", json=user_data)
+    login_res = requests.post(f"{BASE_URL}/auth/login", json={
+        "email": user_data["email"],
+        "password": user_data["password"]
+    })
+    assert login_res.status_code == 200, login_res.text
+    return {"Authorization": f"Bearer {login_res.json()['access_token']}"}
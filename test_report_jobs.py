@@ -0,0 +1,47 @@
+import requests
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from test_helpers import BASE_URL, login_admin
+
+def test_identical_jobs_are_coalesced():
+    headers = login_admin()
+    # Unique parameters so a cached job from an earlier run is not reused
+    payload = {"report": "borrowing", "start_date": f"2001-01-01T00:00:{int(time.time()) % 60:02d}", "interval": "monthly"}
+
+    # Identical concurrent submissions must share one job
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        responses = list(pool.map(
+            lambda _: requests.post(f"{BASE_URL}/reports/jobs", json=payload, headers=headers),
+            range(10)
+        ))
+    assert all(res.status_code == 200 for res in responses), [res.text for res in responses]
+    job_ids = {res.json()["job_id"] for res in responses}
+    print(f"Job IDs returned: {job_ids}")
+    assert len(job_ids) == 1
+
+    # Poll until the job finishes
+    job_id = job_ids.pop()
+    for _ in range(60):
+        job = requests.get(f"{BASE_URL}/reports/jobs/{job_id}", headers=headers).json()
+        if job["status"] in ("done", "failed"):
+            break
+        time.sleep(0.5)
+    print(f"Job status: {job['status']}")
+    assert job["status"] == "done", job
+    assert job["result"] is not None
+
+    # A finished job is reused while it is cached
+    res = requests.post(f"{BASE_URL}/reports/jobs", json=payload, headers=headers)
+    assert res.json()["job_id"] == job_id
+
+def test_job_limit_is_bounded():
+    headers = login_admin()
+    res = requests.post(f"{BASE_URL}/reports/jobs", json={"report": "popular-books", "limit": 500}, headers=headers)
+    print(f"Status Code: {res.status_code}")
+    assert res.status_code == 422
+
+if __name__ == "__main__":
+    test_identical_jobs_are_coalesced()
+    test_job_limit_is_bounded()
+    print("Report job tests passed")
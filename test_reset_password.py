@@ -0,0 +1,48 @@
+import requests
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from test_helpers import BASE_URL
+
+def test_reset_token_is_single_use():
+    email = f"reset_{int(time.time() * 1000)}@test.com"
+    res = requests.post(f"{BASE_URL}/auth/register", json={
+        "email": email,
+        "password": "password123",
+        "full_name": "Reset Test",
+        "role": "member"
+    })
+    assert res.status_code == 201, res.text
+
+    res = requests.post(f"{BASE_URL}/auth/forgot-password", json={"email": email})
+    token = res.json()["reset_token"]
+
+    # Concurrent resets with the same token: only one may succeed
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        responses = list(pool.map(
+            lambda i: requests.post(f"{BASE_URL}/auth/reset-password", json={
+                "token": token,
+                "new_password": f"newpassword{i}"
+            }),
+            range(5)
+        ))
+    codes = sorted(res.status_code for res in responses)
+    print(f"Status codes: {codes}")
+    assert codes == [200, 400, 400, 400, 400]
+
+    # The winning password works and the old one no longer does
+    winner = next(i for i, res in enumerate(responses) if res.status_code == 200)
+    res = requests.post(f"{BASE_URL}/auth/login", json={"email": email, "password": f"newpassword{winner}"})
+    assert res.status_code == 200, res.text
+    res = requests.post(f"{BASE_URL}/auth/login", json={"email": email, "password": "password123"})
+    assert res.status_code == 401
+
+def test_unknown_reset_token_is_rejected():
+    res = requests.post(f"{BASE_URL}/auth/reset-password", json={"token": "not-a-token", "new_password": "whatever"})
+    print(f"Status Code: {res.status_code}")
+    assert res.status_code == 400
+
+if __name__ == "__main__":
+    test_reset_token_is_single_use()
+    test_unknown_reset_token_is_rejected()
+    print("Password reset tests passed")
@@ -0,0 +1,78 @@
+import requests
+import time
+
+from test_helpers import BASE_URL, login_admin
+
+def test_advanced_search_matches_substrings():
+    headers = login_admin()
+    tag = str(int(time.time()))
+    book_payload = {
+        "title": f"Zqxpotterz Chronicles {tag}",
+        "author": "Test Author",
+        "isbn": f"978-{tag}",
+        "category": "Fiction",
+        "publisher": "Test Pub",
+        "publication_year": 2024,
+        "total_copies": 1,
+        "description": "A test book"
+    }
+    res = requests.post(f"{BASE_URL}/books/", json=book_payload, headers=headers)
+    assert res.status_code == 200, res.text
+
+    # Title filters are substring matches, not whole words or prefixes
+    res = requests.post(f"{BASE_URL}/search/advanced", json={"title": f"otterz chronicles {tag}"})
+    titles = [book["title"] for book in res.json()["books"]]
+    print(f"Found: {titles}")
+    assert book_payload["title"] in titles
+
+def test_ranked_listing_pages_with_cursor():
+    headers = login_admin()
+    tag = f"zq{int(time.time())}"
+    for i in range(2):
+        res = requests.post(f"{BASE_URL}/books/", json={
+            "title": f"Paging {tag} {i}",
+            "author": "Test Author",
+            "isbn": f"{tag}-{i}",
+            "category": "Fiction",
+            "publisher": "Test Pub",
+            "publication_year": 2024,
+            "total_copies": 1,
+            "description": "A test book"
+        }, headers=headers)
+        assert res.status_code == 200, res.text
+
+    first = requests.get(f"{BASE_URL}/books/", params={"search": tag, "page_size": 1}).json()
+    assert first["total"] == 2 and first["next_cursor"], first
+
+    # The cursor continues the ranking exactly like page 2 does
+    second = requests.get(f"{BASE_URL}/books/", params={"search": tag, "page_size": 1, "cursor": first["next_cursor"]}).json()
+    page_two = requests.get(f"{BASE_URL}/books/", params={"search": tag, "page_size": 1, "page": 2}).json()
+    print(f"Page 1: {first['books'][0]['title']}, page 2: {second['books'][0]['title']}")
+    assert [book["id"] for book in second["books"]] == [book["id"] for book in page_two["books"]]
+    assert first["books"][0]["id"] != second["books"][0]["id"]
+
+def test_non_ascii_titles_are_found():
+    headers = login_admin()
+    tag = str(int(time.time()))
+    titles = [f"Crème Brûlée Cookbook {tag}", f"Война и мир {tag}"]
+    for i, title in enumerate(titles):
+        res = requests.post(f"{BASE_URL}/books/", json={
+            "title": title,
+            "author": "Test Author",
+            "isbn": f"977-{tag}-{i}",
+            "category": "Fiction",
+            "total_copies": 1
+        }, headers=headers)
+        assert res.status_code == 200, res.text
+
+    for query, title in [("brûlée", titles[0]), ("Война", titles[1])]:
+        res = requests.get(f"{BASE_URL}/books/", params={"search": query, "page_size": 100})
+        found = [book["title"] for book in res.json()["books"]]
+        print(f"'{query}' found: {found}")
+        assert title in found
+
+if __name__ == "__main__":
+    test_advanced_search_matches_substrings()
+    test_ranked_listing_pages_with_cursor()
+    test_non_ascii_titles_are_found()
+    print("Search tests passed")
@@ -0,0 +1,45 @@
+import requests
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from test_helpers import BASE_URL, login_admin
+
+def test_snapshot_runs_as_one_background_job():
+    headers = login_admin()
+
+    # Concurrent requests join the same running export
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        responses = list(pool.map(
+            lambda _: requests.post(f"{BASE_URL}/system/snapshot", headers=headers),
+            range(5)
+        ))
+    assert all(res.status_code == 200 for res in responses), [res.text for res in responses]
+    job_ids = {res.json()["job_id"] for res in responses}
+    print(f"Job IDs returned: {job_ids}")
+    assert len(job_ids) == 1
+
+    job_id = job_ids.pop()
+    for _ in range(60):
+        job = requests.get(f"{BASE_URL}/system/snapshot/{job_id}", headers=headers).json()
+        if job["status"] in ("done", "failed"):
+            break
+        time.sleep(0.5)
+    print(f"Job status: {job['status']}")
+    assert job["status"] == "done", job
+    assert set(job["result"]["tables"]) == {"books", "members", "transactions", "fines"}
+
+    # Snapshot jobs are not served as report jobs, and finished ones are not reused
+    assert requests.get(f"{BASE_URL}/reports/jobs/{job_id}", headers=headers).status_code == 404
+    res = requests.post(f"{BASE_URL}/system/snapshot", headers=headers)
+    assert res.json()["job_id"] != job_id
+
+def test_snapshot_rejects_unknown_tables():
+    headers = login_admin()
+    res = requests.post(f"{BASE_URL}/system/snapshot", params={"tables": "nope"}, headers=headers)
+    print(f"Status Code: {res.status_code}")
+    assert res.status_code == 400
+
+if __name__ == "__main__":
+    test_snapshot_runs_as_one_background_job()
+    test_snapshot_rejects_unknown_tables()
+    print("Snapshot tests passed")